@@ -0,0 +1,183 @@
+import functools
+import math
+import threading
+
+from Money import Money
+
+# Change is paid out of a cassette of coins and bills.  Finding the fewest pieces with limited
+# counts of each denomination is a bounded change-making problem; the solver searches counts from
+# the largest denomination down and prunes with two tables:
+#
+#   fewest[i][a]  fewest pieces making `a` units from denominations i.. if every count were unlimited
+#   reach[i]      bitset of the amounts the pieces on hand in denominations i.. can make exactly
+#
+# `fewest` depends only on the denominations, so it is built once, shared by every cassette with
+# the same denominations and stays valid as the cassette empties and refills.  `reach` is the
+# bounded DP over the current counts; unless the greedy choice already meets the unbounded
+# optimum, it is rebuilt for the solve with a few big-integer shifts per denomination (counts are
+# split into powers of two), which also answers infeasible amounts before any search.  The search
+# then only enters branches that can still be completed, skips states already explored with no
+# more pieces used, and stops as soon as it meets the unbounded optimum.  Amounts are in units of
+# the greatest common divisor of the denominations.
+
+DEFAULT_DENOMINATIONS = {'20.00': 0, '10.00': 0, '5.00': 0, '1.00': 0, '0.25': 0, '0.10': 0, '0.05': 0}
+DEFAULT_MAX_CHANGE = Money.of('100.00')
+UNREACHABLE = math.inf
+
+
+@functools.lru_cache(maxsize=32)
+def fewest_tables(values, size):
+    """fewest[i][a] for amounts below `size`, `values` being the denominations largest first."""
+    tables = [[0] + [UNREACHABLE] * (size - 1)]  # No denominations: only zero is reachable
+    for value in reversed(values):
+        table = list(tables[-1])
+        for amount in range(value, size):
+            if table[amount - value] + 1 < table[amount]:
+                table[amount] = table[amount - value] + 1
+        tables.append(table)
+    return tuple(reversed(tables))
+
+
+class CashCassette:
+    """Coin and bill counts for one machine, paying change in the fewest pieces the counts allow."""
+
+    def __init__(self, counts=None, max_change=DEFAULT_MAX_CHANGE):
+        counts = DEFAULT_DENOMINATIONS if counts is None else counts
+        self._lock = threading.Lock()
+        self._counts = {}
+        for denomination, count in counts.items():
+            self._add(Money.of(denomination), count)
+        self.max_change = Money.of(max_change)
+        self._build_tables()
+
+    def _add(self, denomination, count):
+        if denomination <= 0:
+            raise ValueError(f"Denomination must be positive, got {denomination}")
+        if count < 0:
+            raise ValueError(f"Count must not be negative, got {count}")
+        self._counts[denomination.cents] = self._counts.get(denomination.cents, 0) + count
+
+    def _build_tables(self):
+        self.denominations = sorted(self._counts, reverse=True)  # In cents, largest first
+        self.unit = math.gcd(*self.denominations) if self.denominations else 1
+        self._values = [cents // self.unit for cents in self.denominations]
+        self._fewest = fewest_tables(tuple(self._values), self.max_change.cents // self.unit + 1)
+
+    def load(self, denomination, count):
+        """Add `count` pieces of `denomination`, e.g. when the cash box is serviced."""
+        with self._lock:
+            denomination = Money.of(denomination)
+            known = denomination.cents in self._counts
+            self._add(denomination, count)
+            if not known:
+                self._build_tables()
+
+    def contents(self):
+        """{denomination: count}, largest denomination first."""
+        with self._lock:
+            return {Money(cents): self._counts[cents] for cents in self.denominations}
+
+    def total(self):
+        with self._lock:
+            return Money(sum(cents * count for cents, count in self._counts.items()))
+
+    def solve(self, amount):
+        """Fewest pieces paying exactly `amount` from the current counts, as a list of counts per
+        denomination (largest first), or None if no combination of the pieces on hand adds up to it.
+        """
+        cents = Money.of(amount).cents
+        if cents == 0:
+            return [0] * len(self.denominations)
+        if cents < 0 or cents % self.unit or cents > self.max_change.cents:
+            return None
+        target = cents // self.unit
+        values = self._values
+        counts = [self._counts[denomination] for denomination in self.denominations]
+        fewest = self._fewest
+        if fewest[0][target] == UNREACHABLE:
+            return None
+        greedy, remaining = [], target
+        for value, count in zip(values, counts):
+            take = min(count, remaining // value)
+            greedy.append(take)
+            remaining -= take * value
+        if remaining == 0 and sum(greedy) == fewest[0][target]:
+            return greedy  # The usual case for a stocked cassette: nothing can beat the unbounded optimum
+        limit = (1 << (target + 1)) - 1
+        reach = [0] * len(values) + [1]  # Bit a of reach[i] is set if pieces from i on can make a units
+        for index in range(len(values) - 1, -1, -1):
+            reachable, value, left, chunk = reach[index + 1], values[index], counts[index], 1
+            while left and reachable != limit:
+                take = min(chunk, left)
+                reachable = (reachable | (reachable << (value * take))) & limit
+                left -= take
+                chunk *= 2
+            reach[index] = reachable
+        if not reach[0] >> target & 1:
+            return None
+        best = [UNREACHABLE, None]
+        chosen = [0] * len(values)
+        explored = {}  # (index, remaining) -> fewest pieces used when the state was searched
+
+        def search(index, remaining, used):
+            if remaining == 0:
+                best[0], best[1] = used, list(chosen)
+                return
+            if not reach[index] >> remaining & 1 or used + fewest[index][remaining] >= best[0]:
+                return
+            if explored.get((index, remaining), UNREACHABLE) <= used:
+                return  # Searched before with no more pieces used; it cannot do better now
+            explored[index, remaining] = used
+            value = values[index]
+            for take in range(min(counts[index], remaining // value), -1, -1):
+                chosen[index] = take
+                search(index + 1, remaining - take * value, used + take)
+                if best[0] == fewest[0][target]:
+                    break  # Matches the unbounded optimum, nothing can beat it
+            chosen[index] = 0
+
+        search(0, target, 0)
+        return best[1]
+
+    def round_down(self, amount):
+        """Split `amount` into (the largest part payable in these denominations, the remainder)."""
+        cents = Money.of(amount).cents
+        payable = cents - cents % self.unit if cents > 0 else 0
+        return Money(payable), Money(cents - payable)
+
+    def can_pay(self, amount):
+        return self.solve(amount) is not None
+
+    def dispense(self, amount, paid=None):
+        """Take exact change for `amount` out of the cassette.
+
+        `paid` is cash the customer inserted, credited first so it can be given back as change; the
+        cassette does not see individual pieces, so it is counted as the fewest pieces of these
+        denominations (any remainder below the smallest one is kept aside and never paid out).
+        Returns {denomination: count} of the pieces paid out, or None (leaving the counts untouched,
+        payment included) if exact change is impossible.
+        """
+        with self._lock:
+            credit = self._split(Money.of(paid).cents) if paid else {}
+            for cents, count in credit.items():
+                self._counts[cents] += count
+            pieces = self.solve(amount)
+            if pieces is None:
+                for cents, count in credit.items():
+                    self._counts[cents] -= count
+                return None
+            paid_out = {}
+            for cents, count in zip(self.denominations, pieces):
+                if count:
+                    self._counts[cents] -= count
+                    paid_out[Money(cents)] = count
+            return paid_out
+
+    def _split(self, cents):
+        # Greedy decomposition of an inserted amount into {denomination cents: count}
+        split = {}
+        for denomination in self.denominations:
+            count, cents = divmod(cents, denomination)
+            if count:
+                split[denomination] = count
+        return split
@@ -0,0 +1,210 @@
+import bisect
+import difflib
+import functools
+import threading
+
+from Money import Money
+
+SORT_ORDERS = ('slot', 'name', 'price')
+SLOTS_PER_ROW = 10
+DEFAULT_ALIASES = {'coke': 'coca-cola'}
+_IGNORED_CHARACTERS = str.maketrans('', '', ' -_\t')
+
+
+def normalize(text):
+    """Lookup key for a name: case, spaces, hyphens and underscores do not matter."""
+    return text.lower().translate(_IGNORED_CHARACTERS)
+
+
+def slot_code(slot):
+    """Label of the `slot`-th position: A1..A10 for the first row, B1.. for the next, then AA1 after Z."""
+    row, column = divmod(slot, SLOTS_PER_ROW)
+    letters = ''
+    row += 1
+    while row:
+        row, remainder = divmod(row - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return f"{letters}{column + 1}"
+
+
+@functools.lru_cache(maxsize=65536)
+def display_name(item):
+    # Modify item name for correct capitalization
+    if '-' in item:
+        return item.replace('-', ' ').title().replace(' ', '-')
+    return ' '.join(word.capitalize() for word in item.split())
+
+
+class Catalog:
+    """Sorted index of in-stock items, updated from Machine events instead of rescanning the inventory.
+
+    Items keep the slot they were first seen in, so the default order matches the inventory order.
+    Stock changes made without an event are caught when a page is rendered: entries found sold
+    out are dropped from the index then.  The catalog also indexes every item by normalized name,
+    alias and slot code so customer input resolves with a single dict lookup.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = {normalize(alias): item for alias, item in (aliases or DEFAULT_ALIASES).items()}
+        self._inventory = None
+        self._slots = {}
+        self._by_name = {}
+        self._by_code = {}
+        self._sorted_names = []
+        self._keys = {}  # item -> (slot key, name key, price key) currently in the index; all end in item
+        self._orders = {order: [] for order in SORT_ORDERS}
+        self._priced = None  # (version, price, sorted keys, {item: key}) of the dynamic price order, see page()
+        self._lock = threading.Lock()
+
+    def __call__(self, event, details):
+        # Machine listener entry point
+        with self._lock:
+            if event == 'reset':
+                self._rebuild(details['inventory'])
+            elif 'item' in details and self._inventory is not None:
+                self._update(details['item'])
+
+    def _rebuild(self, inventory):
+        # Sort each index once; bisect.insort per item (as _update does) would make this quadratic
+        self._inventory = inventory
+        self._slots = {}
+        self._by_name = {}
+        self._by_code = {}
+        self._keys = {}
+        for item, details in list(inventory.items()):
+            slot = self._slots[item] = len(self._slots)
+            self._by_name.setdefault(normalize(item), item)
+            self._by_code[slot_code(slot).lower()] = item  # Codes hold no separators to strip
+            if details['quantity'] > 0:
+                self._keys[item] = ((slot, item), (display_name(item), slot, item),
+                                    (Money.of(details['price_dollars']).cents, slot, item))
+        self._sorted_names = sorted(self._by_name)
+        self._orders = {order: sorted(keys[position] for keys in self._keys.values())
+                        for position, order in enumerate(SORT_ORDERS)}
+        self._priced = None
+
+    def _register(self, item):
+        slot = self._slots[item] = len(self._slots)
+        key = normalize(item)
+        if key not in self._by_name:
+            self._by_name[key] = item
+            bisect.insort(self._sorted_names, key)
+        self._by_code[slot_code(slot).lower()] = item  # Codes hold no separators to strip
+        return slot
+
+    def _update(self, item):
+        details = self._inventory.get(item)
+        if details is not None and item not in self._slots:
+            self._register(item)
+        if details is not None and details['quantity'] > 0:
+            slot = self._slots[item]
+            keys = ((slot, item), (display_name(item), slot, item),
+                    (Money.of(details['price_dollars']).cents, slot, item))
+        else:
+            keys = None
+        if self._priced is not None:
+            self._update_priced(item, keys is not None)
+        old_keys = self._keys.get(item)
+        if keys == old_keys:
+            return
+        if old_keys is not None:
+            for order, key in zip(SORT_ORDERS, old_keys):
+                entries = self._orders[order]
+                del entries[bisect.bisect_left(entries, key)]
+            del self._keys[item]
+        if keys is not None:
+            for order, key in zip(SORT_ORDERS, keys):
+                bisect.insort(self._orders[order], key)
+            self._keys[item] = keys
+
+    def _update_priced(self, item, in_stock):
+        # A stock change can move the item's dynamic price, so its key is recomputed on every event
+        _, price, entries, keys = self._priced
+        old_key = keys.pop(item, None)
+        if old_key is not None:
+            del entries[bisect.bisect_left(entries, old_key)]
+        if in_stock:
+            key = keys[item] = (price(item).cents, self._slots[item], item)
+            bisect.insort(entries, key)
+
+    def _priced_order(self, price, version):
+        if version is None or self._priced is None or self._priced[0] != version:
+            keys = {item: (price(item).cents, slot, item) for slot, item in self._orders['slot']}
+            self._priced = (version, price, sorted(keys.values()), keys)
+        return self._priced[2]
+
+    def count(self, inventory):
+        with self._lock:
+            if inventory is not self._inventory:
+                self._rebuild(inventory)
+            return len(self._keys)
+
+    def page(self, inventory, page=0, size=None, sort='slot', descending=False, price=None, price_version=None):
+        """Return [(item, display name, price)] for one page of in-stock items of `inventory`.
+
+        `price`, if given, maps an item to the Money it currently sells for (e.g. a PricingEngine's
+        dynamic price); it is then shown, and 'price' order sorts on it rather than on the indexed
+        inventory price.  That order is sorted once and then kept up to date from events for as long
+        as `price_version` (e.g. PricingEngine.version) stays the same; without one, every page sorts
+        every in-stock item.
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        with self._lock:
+            if inventory is not self._inventory:
+                self._rebuild(inventory)
+            while True:
+                entries = self._orders[sort]
+                if price is None:
+                    self._priced = None  # Fixed prices again; stop tracking the dynamic ones
+                elif sort == 'price':
+                    entries = self._priced_order(price, price_version)
+                if size is None:
+                    keys = entries[::-1] if descending else entries
+                elif descending:
+                    end = len(entries) - page * size
+                    keys = entries[max(end - size, 0):max(end, 0)][::-1]
+                else:
+                    keys = entries[page * size:(page + 1) * size]
+                rows = [(key[-1], inventory.get(key[-1])) for key in keys]
+                stale = [item for item, details in rows if details is None or details['quantity'] <= 0]
+                if not stale:
+                    return [(item, display_name(item),
+                             Money.of(details['price_dollars']) if price is None else price(item))
+                            for item, details in rows]
+                for item in stale:
+                    self._update(item)
+
+    def _ensure_current(self, inventory):
+        if inventory is not self._inventory:
+            with self._lock:
+                if inventory is not self._inventory:
+                    self._rebuild(inventory)
+
+    def add_alias(self, alias, item):
+        self.aliases[normalize(alias)] = item
+
+    def slot_code_of(self, inventory, item):
+        self._ensure_current(inventory)
+        slot = self._slots.get(item)
+        return None if slot is None else slot_code(slot)
+
+    def resolve(self, inventory, text):
+        """Item named, aliased or slot-coded by `text`, or None; stock is not checked."""
+        self._ensure_current(inventory)
+        key = normalize(text)
+        return self._by_name.get(key) or self.aliases.get(key) or self._by_code.get(key)
+
+    def suggest(self, inventory, text, limit=3):
+        """Items whose names start with, or else resemble, `text`."""
+        self._ensure_current(inventory)
+        key = normalize(text)
+        names = self._sorted_names
+        matches = []
+        index = bisect.bisect_left(names, key) if key else len(names)
+        while index < len(names) and names[index].startswith(key) and len(matches) < limit:
+            matches.append(names[index])
+            index += 1
+        if not matches:
+            matches = difflib.get_close_matches(key, names, n=limit)
+        return [self._by_name[match] for match in matches]
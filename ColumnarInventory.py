@@ -0,0 +1,231 @@
+import mmap
+import struct
+import threading
+import zlib
+
+from Money import Money
+
+# Fixed-capacity inventory laid out as columns in one (optionally file-backed) memory map:
+#
+#   header | quantity int64[capacity] | price cents int64[capacity] | names bytes[capacity][width] | hash int32[table]
+#
+# The name -> row hash table lives in the map as well, so a worker process that opens the file
+# read-only can look SKUs up without building any per-SKU Python objects.  Rows are only ever
+# appended (reset() empties the store and starts over); a single process owns writes while any
+# number of processes map the file read-only.  Within the writing process, appends are serialized
+# by a store-wide lock, since callers such as Administrator.restock only hold the item's stripe.
+
+MAGIC = b'VMCI'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIII')  # magic, version, capacity, count, name width, hash table size
+HEADER_SIZE = 64
+COUNT_OFFSET = 12
+EMPTY = -1
+
+
+class Row:
+    """View of one SKU that reads and writes the columns in place, like the {'quantity', 'price_dollars'} dicts."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        if key == 'quantity':
+            return self._store._quantity[self._index]
+        if key == 'price_dollars':
+            return Money(self._store._price[self._index])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'quantity':
+            self._store._quantity[self._index] = value
+        elif key == 'price_dollars':
+            self._store._price[self._index] = Money.of(value).cents
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {'quantity': self['quantity'], 'price_dollars': self['price_dollars']}
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class ColumnarInventory:
+    """Array-backed drop-in for Machine.inventory, for catalogs too large for a dict of dicts."""
+
+    def __init__(self, buffer, readonly=False):
+        magic, version, capacity, _, name_width, table_size = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a columnar inventory file")
+        self.capacity = capacity
+        self.name_width = name_width
+        self.readonly = readonly
+        self._buffer = buffer
+        self._table_mask = table_size - 1
+        view = memoryview(buffer)
+        offset = HEADER_SIZE
+        self._quantity = view[offset:offset + 8 * capacity].cast('q')
+        offset += 8 * capacity
+        self._price = view[offset:offset + 8 * capacity].cast('q')
+        offset += 8 * capacity
+        self._names = view[offset:offset + name_width * capacity]
+        offset += name_width * capacity
+        self._table = view[offset:offset + 4 * table_size].cast('i')
+        self._lock = threading.Lock()  # Guards row allocation
+
+    @staticmethod
+    def layout(capacity, name_width):
+        """Return (hash table size, total bytes) for a store of `capacity` rows."""
+        table_size = 1
+        while table_size < 2 * capacity:  # Keep the load factor at or below one half
+            table_size *= 2
+        return table_size, HEADER_SIZE + (16 + name_width) * capacity + 4 * table_size
+
+    @classmethod
+    def create(cls, capacity, path=None, name_width=32):
+        """Create an empty store, in anonymous memory or backed by the file at `path`."""
+        table_size, size = cls.layout(capacity, name_width)
+        if path is None:
+            buffer = mmap.mmap(-1, size)
+        else:
+            with open(path, 'w+b') as f:
+                f.truncate(size)
+                buffer = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(buffer, 0, MAGIC, VERSION, capacity, 0, name_width, table_size)
+        table_offset = size - 4 * table_size
+        buffer[table_offset:size] = b'\xff' * (4 * table_size)  # Every slot starts as EMPTY
+        return cls(buffer)
+
+    @classmethod
+    def open(cls, path, readonly=False):
+        """Map an existing store; read-only maps can be shared by many processes without copying."""
+        with open(path, 'rb' if readonly else 'r+b') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        return cls(buffer, readonly)
+
+    @classmethod
+    def from_mapping(cls, inventory, capacity=None, path=None, name_width=32):
+        store = cls.create(capacity or len(inventory), path, name_width)
+        for name, details in inventory.items():
+            store[name] = details
+        return store
+
+    def __len__(self):
+        return struct.unpack_from('<I', self._buffer, COUNT_OFFSET)[0]
+
+    def _name_at(self, index):
+        start = index * self.name_width
+        return bytes(self._names[start:start + self.name_width]).rstrip(b'\0')
+
+    def _find(self, encoded):
+        # Returns (hash slot, row index); the row index is EMPTY when the name is absent
+        slot = zlib.crc32(encoded) & self._table_mask
+        while True:
+            index = self._table[slot]
+            if index == EMPTY or self._name_at(index) == encoded:
+                return slot, index
+            slot = (slot + 1) & self._table_mask
+
+    def get(self, name, default=None):
+        encoded = name.encode()
+        if len(encoded) > self.name_width:
+            return default
+        index = self._find(encoded)[1]
+        return default if index == EMPTY else Row(self, index)
+
+    def __getitem__(self, name):
+        row = self.get(name)
+        if row is None:
+            raise KeyError(name)
+        return row
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __setitem__(self, name, details):
+        if self.readonly:
+            raise TypeError("Inventory is mapped read-only")
+        encoded = name.encode()
+        if len(encoded) > self.name_width:
+            raise ValueError(f"Item name longer than {self.name_width} bytes: {name}")
+        slot, index = self._find(encoded)
+        if index != EMPTY:
+            row = Row(self, index)
+            row['quantity'] = details['quantity']
+            row['price_dollars'] = details['price_dollars']
+            return
+        with self._lock:
+            slot, index = self._find(encoded)  # Another thread may have added it meanwhile
+            if index == EMPTY:
+                index = len(self)
+                if index >= self.capacity:
+                    raise ValueError(f"Inventory is full ({self.capacity} items)")
+                start = index * self.name_width
+                self._names[start:start + len(encoded)] = encoded
+            row = Row(self, index)
+            row['quantity'] = details['quantity']
+            row['price_dollars'] = details['price_dollars']
+            if self._table[slot] == EMPTY:
+                # Publish the row only after its columns are written
+                self._table[slot] = index
+                struct.pack_into('<I', self._buffer, COUNT_OFFSET, index + 1)
+
+    def check_additions(self, names):
+        """Reasons the new items `names` cannot all be added, so a batch can be refused before any write."""
+        errors = [f"{name}: item name longer than {self.name_width} bytes"
+                  for name in names if len(name.encode()) > self.name_width]
+        free = self.capacity - len(self)
+        if len(names) > free:
+            errors.append(f"Inventory is full: {len(names)} new items but room for {free}")
+        return errors
+
+    def reset(self, inventory):
+        """Replace every row with the items of `inventory`, keeping the same backing memory."""
+        if self.readonly:
+            raise TypeError("Inventory is mapped read-only")
+        if len(inventory) > self.capacity:
+            raise ValueError(f"Inventory is full ({self.capacity} items)")
+        with self._lock:
+            struct.pack_into('<I', self._buffer, COUNT_OFFSET, 0)
+            for slot in range(len(self._table)):
+                self._table[slot] = EMPTY
+            self._names[:] = bytes(len(self._names))
+        for name, details in inventory.items():
+            self[name] = details
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._name_at(index).decode()
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [Row(self, index) for index in range(len(self))]
+
+    def items(self):
+        for index in range(len(self)):
+            yield self._name_at(index).decode(), Row(self, index)
+
+    def flush(self):
+        self._buffer.flush()
+
+    def close(self):
+        for view in (self._quantity, self._price, self._names, self._table):
+            view.release()
+        self._buffer.close()
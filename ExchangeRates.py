@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import threading
+
+from Money import RateTable
+
+# Exchange rates live in a JSON file mapping each currency to the dollar value of one unit and
+# the number of digits of its minor unit:
+#
+#   {"shekels": {"rate": "0.29", "digits": 2}, "yen": {"rate": "0.0067", "digits": 0}, ...}
+#
+# A RateWatcher polls the file and, when it changes, installs a freshly built RateTable on the
+# machine in one assignment.  Tables are never modified after that, so a Client that pinned the
+# table at the start of its transaction keeps converting at the same rates until it finishes.
+
+DEFAULT_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'default_rates.json')
+
+
+def load_rates(path=DEFAULT_RATES_PATH):
+    """Read a rates file into a RateTable, raising ValueError naming every bad entry."""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"cannot read {path}: {str(e)}") from None
+    if not isinstance(data, dict) or not data:
+        raise ValueError(f"{path} must map currency names to rates")
+    table, errors = RateTable(), []
+    for currency, entry in data.items():
+        try:
+            if isinstance(entry, dict):
+                table.set_rate(currency.strip().lower(), entry['rate'], int(entry.get('digits', 2)))
+            else:
+                table.set_rate(currency.strip().lower(), entry)
+        except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+            errors.append(f"{currency}: {str(e) or type(e).__name__}")
+    if errors:
+        raise ValueError(f"invalid rates in {path}: {'; '.join(errors)}")
+    return table
+
+
+class RateWatcher:
+    """Reload `path` into `machine.rates` whenever the file changes; a bad file keeps the old rates."""
+
+    def __init__(self, machine, path=DEFAULT_RATES_PATH, interval=1.0):
+        self.path = path
+        self.machine = machine
+        self.interval = interval
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Reload if the file changed since the last check; returns True if new rates were installed."""
+        try:
+            status = os.stat(self.path)
+        except OSError as e:
+            logging.error(f"Error in reading exchange rates: {str(e)}")
+            return False
+        signature = (status.st_mtime_ns, status.st_size)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            self.machine.rates = load_rates(self.path)
+        except ValueError as e:
+            logging.error(f"Error in reloading exchange rates: {str(e)}")
+            return False
+        return True
+
+    def start(self):
+        self.check()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,272 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+import Snapshot
+from Money import Money
+from Pricing import PricingEngine
+from Planogram import load_inventory, DEFAULT_INVENTORY_PATH
+from VendingMachine import Machine, Administrator, PurchaseResult
+
+try:
+    from RestockPlanner import RestockPlanner
+except ImportError:  # NumPy is not installed; fleets still run, without restock planning
+    RestockPlanner = None
+
+# A fleet spreads many independent Machine instances over worker processes.  Machine ids are
+# 0..machines-1 and machine i lives on shard i % workers, so routing needs no lookup table.
+# Each worker owns its machines outright; the parent only sends commands and merges views.
+# Machines are built on first use, from the fleet snapshot if one was given, else from the template.
+
+
+class Shard:
+    """The machines owned by one worker process, plus running sales totals for them."""
+
+    def __init__(self, machine_ids, inventory_path=DEFAULT_INVENTORY_PATH, stripes=4, snapshot_path=None):
+        self.machine_ids = machine_ids
+        self.template = load_inventory(inventory_path)
+        self.stripes = stripes
+        self.snapshot = None
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self.snapshot = Snapshot.SnapshotFile(snapshot_path)
+        self.machines = {}  # Built so far
+        self.sales = {}  # item -> [units, revenue in cents]
+        self.planner = RestockPlanner() if RestockPlanner is not None else None
+        self.pricing = None
+
+    def machine(self, machine_id):
+        machine = self.machines.get(machine_id)
+        if machine is None:
+            machine = Machine({name: dict(details) for name, details in self.template.items()}, self.stripes,
+                              pricing=self.pricing)
+            if self.snapshot is not None and machine_id in self.snapshot:
+                self.snapshot.restore(machine_id, machine)
+            machine.subscribe(self._record)
+            if self.planner is not None:
+                self.planner.attach(machine, machine_id)
+            self.machines[machine_id] = machine
+        return machine
+
+    def _record(self, event, details):
+        if event == 'vend':
+            totals = self.sales.setdefault(details['item'], [0, 0])
+            totals[0] += details['quantity']
+            totals[1] += details['price'].cents * details['quantity']
+
+    def purchase(self, machine_id, item, amount, currency):
+        result = self.machine(machine_id).purchase(item, amount, currency)
+        return result.status, result.item, result.price.cents, result.balance.cents, result.change.cents
+
+    def purchases(self, commands):
+        purchase = self.purchase
+        return [purchase(*command) for command in commands]
+
+    def restock(self, machine_id, item, quantity, price):
+        return Administrator(self.machine(machine_id)).restock(item, quantity, price)
+
+    def stock(self):
+        return {machine_id: {item: details['quantity'] for item, details in self.machine(machine_id).inventory.items()}
+                for machine_id in self.machine_ids}
+
+    def sales_totals(self):
+        return self.sales
+
+    def planner_state(self):
+        return self.planner.state()
+
+    def set_pricing(self, rules):
+        self.pricing = PricingEngine(rules) if rules else None
+        for machine in self.machines.values():
+            machine.pricing = self.pricing
+
+    def reprice(self):
+        # Machines not built yet are priced when first used
+        return 0 if self.pricing is None else self.pricing.reprice(self.machines.values())
+
+    def snapshot_records(self):
+        """(records, encoded rate tables) of every machine; untouched machines reuse their snapshot record."""
+        records, tables = {}, Snapshot.RateTables()
+        for machine_id in self.machine_ids:
+            if machine_id not in self.machines and self.snapshot is not None and machine_id in self.snapshot:
+                records[machine_id] = tables.adopt(self.snapshot.record(machine_id), self.snapshot.tables)
+            else:
+                records[machine_id] = Snapshot.encode_machine(self.machine(machine_id), tables)
+        return records, tables.tables
+
+
+def shard_worker(connection, machine_ids, inventory_path, stripes, snapshot_path):
+    shard = Shard(machine_ids, inventory_path, stripes, snapshot_path)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        operation, args = message
+        try:
+            connection.send(('ok', getattr(shard, operation)(*args)))
+        except Exception as e:
+            connection.send(('error', e))
+    connection.close()
+
+
+class Fleet:
+    """Thousands of machines sharded over a pool of worker processes."""
+
+    def __init__(self, machines, workers=None, inventory_path=DEFAULT_INVENTORY_PATH, stripes=4, snapshot_path=None):
+        workers = max(1, min(workers or os.cpu_count() or 1, machines))
+        self.machine_count = machines
+        self._connections = []
+        self._processes = []
+        for shard in range(workers):
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=shard_worker, daemon=True,
+                                              args=(child_end, range(shard, machines, workers), inventory_path,
+                                                    stripes, snapshot_path))
+            process.start()
+            child_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def shard_of(self, machine_id):
+        if not 0 <= machine_id < self.machine_count:
+            raise ValueError(f"Unknown machine id: {machine_id}")
+        return machine_id % len(self._connections)
+
+    def _send(self, shard, operation, *args):
+        self._connections[shard].send((operation, args))
+
+    def _receive(self, shard):
+        status, value = self._connections[shard].recv()
+        if status == 'error':
+            raise value
+        return value
+
+    def _call(self, shard, operation, *args):
+        self._send(shard, operation, *args)
+        return self._receive(shard)
+
+    def _broadcast(self, operation, *args):
+        for shard in range(len(self._connections)):
+            self._send(shard, operation, *args)
+        return [self._receive(shard) for shard in range(len(self._connections))]
+
+    def purchase(self, machine_id, item, amount, currency='dollars'):
+        return to_result(self._call(self.shard_of(machine_id), 'purchase', machine_id, item, amount, currency))
+
+    def run_sessions(self, sessions):
+        """Run (machine_id, item, amount, currency) purchases; all shards work on their share at once."""
+        batches = [[] for _ in self._connections]
+        positions = [[] for _ in self._connections]
+        for position, session in enumerate(sessions):
+            shard = self.shard_of(session[0])
+            batches[shard].append(session)
+            positions[shard].append(position)
+        for shard, batch in enumerate(batches):
+            if batch:
+                self._send(shard, 'purchases', batch)
+        results = [None] * sum(len(batch) for batch in batches)
+        for shard, batch in enumerate(batches):
+            if batch:
+                for position, result in zip(positions[shard], self._receive(shard)):
+                    results[position] = to_result(result)
+        return results
+
+    def restock(self, machine_id, item, quantity, price=None):
+        return self._call(self.shard_of(machine_id), 'restock', machine_id, item, quantity, price)
+
+    def stock_view(self):
+        """Return (per-machine stock, fleet-wide stock per item)."""
+        machines, totals = {}, {}
+        for shard_stock in self._broadcast('stock'):
+            machines.update(shard_stock)
+            for stock in shard_stock.values():
+                for item, quantity in stock.items():
+                    totals[item] = totals.get(item, 0) + quantity
+        return machines, totals
+
+    def sales_view(self):
+        """Return {item: (units sold, revenue)} across the whole fleet."""
+        totals = {}
+        for shard_sales in self._broadcast('sales_totals'):
+            for item, (units, cents) in shard_sales.items():
+                previous = totals.get(item, (0, 0))
+                totals[item] = (previous[0] + units, previous[1] + cents)
+        return {item: (units, Money(cents)) for item, (units, cents) in totals.items()}
+
+    def restock_plan(self, horizon=24 * 3600.0, cover=3 * 24 * 3600.0, par_level=None):
+        """One refill list for the whole fleet, computed in a single batch over every shard's counters."""
+        if RestockPlanner is None:
+            raise RuntimeError("Restock planning requires NumPy")
+        return RestockPlanner.combine(self._broadcast('planner_state')).plan(horizon, cover, par_level)
+
+    def set_pricing(self, rules):
+        """Price every machine with these Pricing rules from now on; an empty list restores fixed prices."""
+        self._broadcast('set_pricing', list(rules))
+
+    def reprice(self):
+        """Recompute all prices, each shard in one vectorized pass; returns how many prices were set."""
+        return sum(self._broadcast('reprice'))
+
+    def save_snapshot(self, path):
+        """Write the state of every machine to one snapshot file, which Fleet(snapshot_path=...) starts from."""
+        records, tables = {}, Snapshot.RateTables()
+        for shard_records, shard_tables in self._broadcast('snapshot_records'):
+            for machine_id, record in shard_records.items():
+                records[machine_id] = tables.adopt(record, shard_tables)
+        Snapshot.write_snapshot(path, records, tables)
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
+
+
+def to_result(values):
+    status, item, price, balance, change = values
+    return PurchaseResult(status, item, Money(price), Money(balance), Money(change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate purchases across a sharded fleet of machines.")
+    parser.add_argument('--machines', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--sessions', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--snapshot', help="Start from this fleet snapshot if it exists and save to it afterwards")
+    args = parser.parse_args()
+    items = list(load_inventory())
+    generator = random.Random(args.seed)
+    sessions = [(generator.randrange(args.machines), generator.choice(items), '10', 'dollars')
+                for _ in range(args.sessions)]
+    started = time.perf_counter()
+    with Fleet(args.machines, args.workers, snapshot_path=args.snapshot) as fleet:
+        ready = time.perf_counter()
+        results = fleet.run_sessions(sessions)
+        elapsed = time.perf_counter() - ready
+        sales = fleet.sales_view()
+        if args.snapshot:
+            fleet.save_snapshot(args.snapshot)
+    sold = sum(1 for result in results if result.success)
+    print(f"{args.machines} machines on {args.workers} workers, started in {ready - started:.2f}s")
+    print(f"{args.sessions} sessions in {elapsed:.2f}s ({args.sessions / elapsed:,.0f} sessions/sec), {sold} vends")
+    for item, (units, revenue) in sorted(sales.items()):
+        print(f"- {item}: {units} units, ${revenue:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+# A hold is a Reservation (see VendingMachine.Machine.reserve) that stays off the shelf while its
+# customer is still paying, and goes back on the shelf by itself if the customer walks away.
+#
+# Deadlines live in a min-heap, so placing or renewing a hold costs O(log n) and expiring costs
+# O(log n) per hold that actually expired; nothing ever scans the live holds.  A hold that is taken
+# for a sale, released or renewed is only dropped from the index, and its heap entry is discarded
+# when it reaches the top (or when the heap is compacted).  Expired units are put back through
+# Machine.release, outside the book's lock, so listeners see the usual 'release' event.
+
+DEFAULT_HOLD_SECONDS = 120.0
+
+
+class HoldBook:
+    """Time-limited reservations on one machine."""
+
+    def __init__(self, machine, ttl=DEFAULT_HOLD_SECONDS, clock=time.monotonic):
+        self.machine = machine
+        self.ttl = ttl
+        self.clock = clock
+        self._heap = []  # [deadline, sequence, reservation]; reservation is None once superseded
+        self._entries = {}  # reservation -> its live heap entry
+        self._sequence = itertools.count()  # Breaks deadline ties so reservations are never compared
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, reservation):
+        return reservation in self._entries
+
+    def _push(self, reservation, deadline):
+        # Caller holds self._lock
+        entry = [deadline, next(self._sequence), reservation]
+        self._entries[reservation] = entry
+        heapq.heappush(self._heap, entry)
+
+    def hold(self, item_name, quantity=1, ttl=None):
+        """Reserve `quantity` units for `ttl` seconds (default self.ttl).
+
+        Returns the Reservation, or None if out of stock.
+        """
+        self.expire()  # Stale holds may be sitting on the units asked for
+        reservation = self.machine.reserve(item_name, quantity)
+        if reservation is not None:
+            with self._lock:
+                self._push(reservation, self.clock() + (self.ttl if ttl is None else ttl))
+        return reservation
+
+    def renew(self, reservation, ttl=None):
+        """Restart the countdown of a held reservation; returns False if it is no longer held."""
+        with self._lock:
+            entry = self._entries.get(reservation)
+            if entry is None:
+                return False
+            entry[2] = None
+            self._push(reservation, self.clock() + (self.ttl if ttl is None else ttl))
+            self._compact()
+            return True
+
+    def _compact(self):
+        # Caller holds self._lock.  Superseded entries wait for their deadline to be popped; when they
+        # outnumber the live ones, rebuild the heap so memory stays proportional to the live holds.
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap[:] = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+
+    def take(self, reservation):
+        """Remove a held reservation from the book so it cannot expire; returns False if it already has.
+
+        The caller then owns the reservation and must commit or release it.
+        """
+        with self._lock:
+            entry = self._entries.pop(reservation, None)
+            if entry is None:
+                return False
+            entry[2] = None
+            self._compact()
+        return True
+
+    def release(self, reservation):
+        """Put a held reservation back on the shelf now; returns False if it was not held."""
+        return self.take(reservation) and self.machine.release(reservation)
+
+    def expire(self, now=None):
+        """Release every hold whose deadline has passed; returns the number released."""
+        now = self.clock() if now is None else now
+        heap, expired = self._heap, []
+        with self._lock:
+            while heap and heap[0][0] <= now:
+                reservation = heapq.heappop(heap)[2]
+                if reservation is not None:
+                    del self._entries[reservation]
+                    expired.append(reservation)
+        return sum(1 for reservation in expired if self.machine.release(reservation))
+
+    def discard_all(self):
+        """Forget every hold without restocking, for when the shelf itself was reset."""
+        with self._lock:
+            held = list(self._entries)
+            self._entries.clear()
+            self._heap.clear()
+        for reservation in held:
+            reservation.state = reservation.RELEASED
+
+    def held(self):
+        """{item: units} currently held."""
+        with self._lock:
+            reservations = list(self._entries)
+        totals = {}
+        for reservation in reservations:
+            totals[reservation.item] = totals.get(reservation.item, 0) + reservation.quantity
+        return totals
+
+    def next_deadline(self):
+        """Clock time at which the earliest live hold expires, or None."""
+        with self._lock:
+            while self._heap and self._heap[0][2] is None:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def start(self, interval=1.0):
+        """Expire holds every `interval` seconds from a daemon thread, so idle machines free their stock too."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sweep, args=(interval,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _sweep(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.expire()
+            except Exception as e:
+                logging.error(f"Error in expiring holds: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
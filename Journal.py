@@ -0,0 +1,301 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from Money import Money
+from VendingMachine import Machine
+
+# The journal is a JSON-lines file with one event per line, appended in the order Machine.notify
+# reports them.  An append returns only once its record has been written and fsynced, so a sale the
+# customer was told about survives a crash.  Concurrent appends share one write + fsync (group
+# commit): the caller that finds no commit in progress writes out every pending record, and the
+# callers that arrive meanwhile gather into the next commit.  A commit may also wait up to
+# `flush_interval` seconds for `batch_size` records before writing.
+#
+# The journal keeps its own copy of the inventory, updated record by record as they are appended,
+# so a snapshot always matches the offset it is written with.  Every `snapshot_every` records it
+# writes one and starts a new segment: the snapshot names the segment's generation, the segment
+# starts with a 'begin' record, and the old segment is archived as `path.<generation>`.  Recovery
+# therefore only replays the current segment, while the archives keep the full sales history.
+
+JOURNALED_EVENTS = ('vend', 'refund', 'refill', 'reset')
+SNAPSHOT_EVERY = 10000
+
+
+def encode_inventory(inventory):
+    return {name: {'quantity': details['quantity'], 'price_dollars': str(Money.of(details['price_dollars']))}
+            for name, details in inventory.items()}
+
+
+def decode_inventory(data):
+    return {name: {'quantity': details['quantity'], 'price_dollars': Money.of(details['price_dollars'])}
+            for name, details in data.items()}
+
+
+def encode_event(event, details):
+    record = {'event': event, 'ts': time.time()}
+    for key, value in details.items():
+        if key == 'inventory':
+            value = encode_inventory(value)
+        elif isinstance(value, Money):
+            value = str(value)
+        record[key] = value
+    return record
+
+
+def encode_line(record):
+    return json.dumps(record, separators=(',', ':')).encode() + b'\n'
+
+
+def begin_line(generation):
+    # No timestamp: a segment recreated after a crash must start with the same bytes the snapshot counted
+    return encode_line({'event': 'begin', 'generation': generation})
+
+
+def apply_event(inventory, record):
+    """Replay one journal record onto `inventory`; returns the (possibly replaced) inventory."""
+    event = record['event']
+    if event == 'reset':
+        return decode_inventory(record['inventory'])
+    if event == 'vend':
+        inventory[record['item']]['quantity'] -= record.get('quantity', 1)
+    elif event == 'refill':
+        details = inventory.setdefault(record['item'], {'quantity': 0, 'price_dollars': Money(0)})
+        details['quantity'] += record['quantity']
+        if record.get('price') is not None:
+            details['price_dollars'] = Money.of(record['price'])
+    return inventory
+
+
+def snapshot_path_for(path):
+    return path + '.snapshot'
+
+
+def archive_path_for(path, generation):
+    return f"{path}.{generation}"
+
+
+def segments(path):
+    """Archived segments of the journal at `path` oldest first, then the journal itself."""
+    archived = [name for name in glob.glob(glob.escape(path) + '.*') if name[len(path) + 1:].isdigit()]
+    archived.sort(key=lambda name: int(name[len(path) + 1:]))
+    return archived + [path] if os.path.exists(path) else archived
+
+
+def read_snapshot(snapshot_path):
+    """(generation, offset, inventory) saved in a snapshot file, or (0, 0, None) if there is none."""
+    if not os.path.exists(snapshot_path):
+        return 0, 0, None
+    with open(snapshot_path, 'r') as f:
+        snapshot = json.load(f)
+    return snapshot.get('generation', 0), snapshot['offset'], decode_inventory(snapshot['inventory'])
+
+
+def journal_generation(path):
+    """Generation named by the 'begin' record of a journal; journals without one are generation 0."""
+    with open(path, 'rb') as f:
+        line = f.readline()
+    try:
+        record = json.loads(line) if line.endswith(b'\n') else None
+    except json.JSONDecodeError:
+        record = None
+    return record['generation'] if record is not None and record['event'] == 'begin' else 0
+
+
+def recover(path, snapshot_path=None):
+    """Rebuild the inventory from the latest snapshot plus the journal tail.
+
+    Returns (inventory, length) where inventory is None if there is no history and length is the
+    size of the intact part of the journal; anything after it is a torn write from a crash.
+    """
+    generation, offset, inventory = read_snapshot(snapshot_path or snapshot_path_for(path))
+    if not os.path.exists(path):
+        return inventory, 0
+    if journal_generation(path) != generation:
+        return inventory, 0  # A snapshot was written but its new segment never replaced the journal
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                record = json.loads(line) if line.endswith(b'\n') else None
+            except json.JSONDecodeError:
+                record = None
+            if record is None:
+                logging.error(f"Ignoring torn journal record at offset {offset} of {path}")
+                break
+            if inventory is None and record['event'] != 'reset':
+                raise ValueError(f"Journal {path} does not start with a reset event")
+            inventory = apply_event(inventory, record)
+            offset += len(line)
+    return inventory, offset
+
+
+def write_durably(path, data):
+    """Replace `path` with `data` so that a crash leaves either the old or the new contents."""
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def sync_directory(path):
+    descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class Journal:
+    """Durable log of a machine's stock changes, recovered from `path` when it is opened.
+
+    `state` is the inventory the snapshot plus every appended record add up to.
+    """
+
+    def __init__(self, path, batch_size=64, flush_interval=0.0, snapshot_path=None, machine=Machine,
+                 snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.machine = machine
+        self.snapshot_path = snapshot_path or snapshot_path_for(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.state, length = recover(path, self.snapshot_path)
+        self.generation = read_snapshot(self.snapshot_path)[0]
+        if os.path.exists(path) and os.path.getsize(path):
+            stale = journal_generation(path)
+            if stale != self.generation:
+                os.replace(path, archive_path_for(path, stale))  # Finish the interrupted rotation
+            elif os.path.getsize(path) > length:
+                os.truncate(path, length)  # Drop a torn tail so new records start on a clean line
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0 and self.generation:
+            self._write([begin_line(self.generation)])
+        self._pending = []
+        self._appended = 0  # Records appended so far; the first one is record 1
+        self._durable = 0  # Records written and fsynced so far
+        self._committing = False
+        self._since_snapshot = 0
+        self._lock = threading.Condition()
+
+    def __call__(self, event, details):
+        # Machine listener entry point; reservations are transient and only their outcome is journaled
+        if event in JOURNALED_EVENTS:
+            self.append(encode_event(event, details))
+
+    def append(self, record):
+        """Journal `record`; returns once it is on disk."""
+        line = encode_line(record)
+        with self._lock:
+            self._pending.append(line)
+            if self.state is not None or record['event'] == 'reset':
+                self.state = apply_event(self.state, record)
+            self._appended += 1
+            ticket = self._appended
+            if len(self._pending) >= self.batch_size:
+                self._lock.notify_all()  # A commit gathering a batch can stop waiting
+            while self._durable < ticket:
+                if self._committing:
+                    self._lock.wait()
+                else:
+                    self._commit(gather=True)
+            if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+                try:
+                    self._rotate()
+                except OSError as e:
+                    logging.error(f"Error in snapshotting journal: {str(e)}")  # The record itself is durable
+
+    def flush(self):
+        """Wait until every appended record is on disk."""
+        with self._lock:
+            self._drain()
+
+    def _drain(self):
+        # Caller holds self._lock
+        while self._committing or self._pending:
+            if self._committing:
+                self._lock.wait()
+            else:
+                self._commit(gather=False)
+
+    def _commit(self, gather):
+        # Caller holds self._lock and no commit is in progress.  The lock is released while writing,
+        # so records appended meanwhile gather into the next commit instead of waiting behind a lock.
+        self._committing = True
+        if gather and self.flush_interval > 0:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and time.monotonic() < deadline:
+                self._lock.wait(deadline - time.monotonic())
+        lines, self._pending = self._pending, []
+        last = self._appended
+        written = False
+        self._lock.release()
+        try:
+            self._write(lines)
+            written = True
+        finally:
+            self._lock.acquire()
+            self._committing = False
+            if written:
+                self._durable = last
+                self._since_snapshot += len(lines)
+            else:
+                self._pending[:0] = lines  # Retried by the next commit
+            self._lock.notify_all()
+
+    def _write(self, lines):
+        self._file.write(b''.join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def snapshot(self):
+        """Snapshot the journaled stock and start a new segment, archiving the current one."""
+        with self._lock:
+            self._rotate()
+
+    def _rotate(self):
+        # Caller holds self._lock.  Write the new segment first, then the snapshot that points into
+        # it, then swap the segments: a crash before the snapshot is replaced keeps the old pair, and
+        # a crash after it leaves a stale journal that the next Journal archives (see __init__).
+        self._drain()
+        if self.state is None:
+            return
+        generation = self.generation + 1
+        begin = begin_line(generation)
+        segment = self.path + '.next'
+        write_durably(segment, begin)
+        snapshot = {'generation': generation, 'offset': len(begin), 'inventory': encode_inventory(self.state)}
+        write_durably(self.snapshot_path, json.dumps(snapshot).encode())
+        os.replace(self.path, archive_path_for(self.path, self.generation))
+        os.replace(segment, self.path)
+        sync_directory(self.path)
+        self._file.close()
+        self._file = open(self.path, 'ab')
+        self.generation = generation
+        self._since_snapshot = 0
+
+    def close(self):
+        with self._lock:
+            self._drain()
+            self._file.close()
+
+
+def open_journal(path, batch_size=64, flush_interval=0.0, machine=Machine, snapshot_every=SNAPSHOT_EVERY):
+    """Restore the machine's inventory from `path` and keep journaling every later event to it."""
+    journal = Journal(path, batch_size, flush_interval, machine=machine, snapshot_every=snapshot_every)
+    if journal.state is None:
+        journal.append(encode_event('reset', {'inventory': machine.inventory}))  # Base state for replay
+    else:
+        machine.inventory = {name: dict(details) for name, details in journal.state.items()}
+    machine.subscribe(journal)
+    return journal
+
+
+def close_journal(journal):
+    journal.machine.unsubscribe(journal)
+    journal.close()
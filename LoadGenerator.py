@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+
+from VendingMachine import Administrator
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = math.ceil(fraction * len(samples))
+    return samples[min(len(samples), max(rank, 1)) - 1]
+
+
+async def open_connection(host, port, path):
+    if path:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def request(reader, writer, message, latencies):
+    started = time.perf_counter()
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    latencies.append(time.perf_counter() - started)
+    return response
+
+
+async def restock(host, port, path, item, quantity):
+    reader, writer = await open_connection(host, port, path)
+    latencies = []
+    await request(reader, writer, {'op': 'login', 'password': Administrator.PASSWORD}, latencies)
+    await request(reader, writer, {'op': 'refill', 'item': item, 'quantity': quantity, 'price': 2.0}, latencies)
+    await request(reader, writer, {'op': 'quit'}, latencies)
+    writer.close()
+
+
+async def customer_session(host, port, path, item, latencies, outcomes):
+    reader, writer = await open_connection(host, port, path)
+    try:
+        await request(reader, writer, {'op': 'currency', 'currency': 'dollars'}, latencies)
+        await request(reader, writer, {'op': 'insert', 'amount': 10}, latencies)
+        await request(reader, writer, {'op': 'select', 'item': item}, latencies)
+        response = await request(reader, writer, {'op': 'buy'}, latencies)
+        outcomes[response.get('status', 'error')] = outcomes.get(response.get('status', 'error'), 0) + 1
+        await request(reader, writer, {'op': 'quit'}, latencies)
+    finally:
+        writer.close()
+
+
+async def run_load(host='127.0.0.1', port=8765, path=None, sessions=1000, concurrency=100, item='snickers'):
+    """Run `sessions` customer sessions, `concurrency` at a time, and return throughput statistics."""
+    await restock(host, port, path, item, sessions)
+    latencies = []
+    outcomes = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await customer_session(host, port, path, item, latencies, outcomes)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'sessions': sessions,
+        'elapsed': elapsed,
+        'sessions_per_sec': sessions / elapsed if elapsed else 0.0,
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'outcomes': outcomes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent customer sessions against VendingServer.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', dest='path', help="Connect to this Unix socket instead of TCP")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--item', default='snickers')
+    args = parser.parse_args()
+    stats = asyncio.run(run_load(args.host, args.port, args.path, args.sessions, args.concurrency, args.item))
+    print(f"{stats['sessions']} sessions in {stats['elapsed']:.2f}s "
+          f"({stats['sessions_per_sec']:.0f} sessions/sec, {stats['requests']} requests)")
+    print(f"Request latency: p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms")
+    print(f"Outcomes: {stats['outcomes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import bisect
+import contextlib
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from VendingMachine import Machine, Client, Administrator, hybridmethod
+
+# Metrics are off unless an Instrumentation is installed.  Installing it swaps timing wrappers in
+# for the purchase-flow methods and subscribes a listener to the machine; uninstalling puts the
+# original functions back, so a disabled build runs exactly the code it would without this module.
+# Stock gauges are read from the inventory when metrics are rendered, never on the hot path.
+
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# (class, attribute) of every timed operation; interactive ones include the customer's think time
+INSTRUMENTED = (
+    (Client, 'select_item'),
+    (Client, 'insert_cash'),
+    (Client, 'checkout'),
+    (Machine, 'confirm_purchase'),
+    (Machine, 'vend'),
+    (Administrator, 'restock'),
+    (Administrator, 'reset_inventory'),
+    (Administrator, 'apply_planogram'),
+)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}  # label values tuple -> total
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labels, key, value) for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """A value that goes up and down; `collect` (returning {label values: value}) is called at render time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        if self.collect is not None:
+            values = self.collect()
+            with self._lock:
+                self.values = dict(values)
+        return super().samples()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values tuple -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self.series.items())
+        labels = self.labels + ('le',)
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                samples.append((self.name + '_bucket', labels, key + (bound,), cumulative))
+            samples.append((self.name + '_sum', self.labels, key, values[-1]))
+            samples.append((self.name + '_count', self.labels, key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, values, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels, values)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to `path` atomically, e.g. for the node exporter's textfile collector."""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+    def write_every(self, path, interval=15.0):
+        """Rewrite `path` every `interval` seconds from a daemon thread; set the returned event to stop."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write(path)
+                except OSError as e:
+                    logging.error(f"Error in writing metrics: {str(e)}")
+
+        threading.Thread(target=loop, daemon=True).start()
+        return stop
+
+    def serve(self, host='127.0.0.1', port=9105):
+        """Serve GET /metrics from a daemon thread; returns the server (call .shutdown() to stop)."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class ErrorCounter(logging.Handler):
+    """Counts the errors the menus log instead of raising."""
+
+    def __init__(self, counter):
+        super().__init__(logging.ERROR)
+        self.counter = counter
+
+    def emit(self, record):
+        self.counter.inc(1, record.module)
+
+
+class Instrumentation:
+    """Purchase-flow metrics for one machine; use install()/uninstall() or as a context manager."""
+    _active = None
+
+    def __init__(self, machine=Machine, registry=None):
+        self.machine = machine
+        self.registry = Registry() if registry is None else registry
+        register = self.registry.register
+        self.latency = register(Histogram('vending_operation_seconds', "Time spent in purchase-flow operations.",
+                                          ('operation',)))
+        self.failures = register(Counter('vending_operation_exceptions_total',
+                                         "Operations that raised an exception.", ('operation',)))
+        self.logged_errors = register(Counter('vending_logged_errors_total', "Errors logged and handled.",
+                                              ('module',)))
+        self.vends = register(Counter('vending_vends_total', "Units sold.", ('item',)))
+        self.revenue = register(Counter('vending_revenue_dollars_total', "Dollar value of units sold.", ('item',)))
+        self.refills = register(Counter('vending_refills_total', "Units added by refills.", ('item',)))
+        self.refunds = register(Counter('vending_refunds_total', "Balances refunded to customers."))
+        self.stock = register(Gauge('vending_stock_units', "Units on the shelf.", ('item',), self._collect_stock))
+        self._originals = []
+        self._error_handler = ErrorCounter(self.logged_errors)
+
+    def _collect_stock(self):
+        return {(item,): details['quantity'] for item, details in list(self.machine.inventory.items())}
+
+    def _listener(self, event, details):
+        if event == 'vend':
+            self.vends.inc(details['quantity'], details['item'])
+            self.revenue.inc(float(details['price']) * details['quantity'], details['item'])
+        elif event == 'refill':
+            self.refills.inc(details['quantity'], details['item'])
+        elif event == 'refund':
+            self.refunds.inc()
+
+    def _timed(self, function, operation):
+        observe, failed, clock = self.latency.observe, self.failures.inc, time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            except BaseException:
+                failed(1, operation)
+                raise
+            finally:
+                observe(clock() - started, operation)
+        return wrapper
+
+    def install(self):
+        if Instrumentation._active is not None:
+            raise RuntimeError("Instrumentation is already installed")
+        Instrumentation._active = self
+        for owner, name in INSTRUMENTED:
+            original = owner.__dict__[name]
+            self._originals.append((owner, name, original))
+            if isinstance(original, hybridmethod):
+                setattr(owner, name, hybridmethod(self._timed(original.function, name)))
+            else:
+                setattr(owner, name, self._timed(original, name))
+        self.machine.subscribe(self._listener)
+        logging.getLogger().addHandler(self._error_handler)
+        return self
+
+    def uninstall(self):
+        if Instrumentation._active is not self:
+            return
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+        self.machine.unsubscribe(self._listener)
+        logging.getLogger().removeHandler(self._error_handler)
+        Instrumentation._active = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """Run the block under cProfile, dumping pstats data to `path` if given; yields the profiler."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
@@ -0,0 +1,215 @@
+import math
+from decimal import Decimal, DecimalException, ROUND_HALF_UP
+from fractions import Fraction
+
+
+MAX_WHOLE_DIGITS = 15  # Amounts of 10**15 or more are typos or attacks, not money
+
+
+def to_decimal(value):
+    """Parse an int, float, str or Decimal into a finite Decimal, raising ValueError otherwise."""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+    except (DecimalException, ArithmeticError):
+        raise ValueError(f"Invalid amount: {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    if amount and amount.adjusted() >= MAX_WHOLE_DIGITS:
+        raise ValueError(f"Amount too large: {value!r}")
+    return amount
+
+
+def to_minor_units(value, digits):
+    """Round `value` half-up to an integer count of 10**-digits units."""
+    # Fast paths for whole numbers and plain "12.34" strings, which is what customers type
+    if (isinstance(value, int) and not isinstance(value, bool)
+            and -10 ** MAX_WHOLE_DIGITS < value < 10 ** MAX_WHOLE_DIGITS):
+        return value * 10 ** digits
+    if type(value) is str:
+        whole, _, fraction = value.partition('.')
+        if (whole.isascii() and whole.isdigit() and len(whole) <= MAX_WHOLE_DIGITS and len(fraction) <= digits
+                and (not fraction or fraction.isascii() and fraction.isdigit())):
+            return int(whole) * 10 ** digits + int(fraction.ljust(digits, '0') or 0)
+    try:
+        return int(to_decimal(value).scaleb(digits).to_integral_value(ROUND_HALF_UP))
+    except (DecimalException, ArithmeticError):  # e.g. an exponent too small for the context
+        raise ValueError(f"Invalid amount: {value!r}") from None
+
+
+class Money:
+    """An exact amount of the base currency (dollars) stored as an integer number of cents."""
+
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        self.cents = cents
+
+    @staticmethod
+    def of(value):
+        """Coerce a Money, int, float, str or Decimal dollar amount into Money."""
+        if isinstance(value, Money):
+            return value
+        return Money(to_minor_units(value, 2))
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        return NotImplemented
+
+    def __radd__(self, other):
+        if other == 0:  # Lets sum() start from its default of 0
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money(self.cents * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def _compare_key(self, other):
+        # Cents of `other` on the same scale; plain numbers are read as dollars and compared exactly.
+        # Floats are read through their shortest repr, as Money.of reads them, so Money.of(0.1) == 0.1;
+        # such a Money does not hash like the float, since the float's exact binary value differs.
+        if isinstance(other, Money):
+            return other.cents
+        if isinstance(other, float):
+            return Fraction(Decimal(repr(other))) * 100 if math.isfinite(other) else other
+        if isinstance(other, (int, Decimal, Fraction)) and not isinstance(other, bool):
+            return Fraction(other) * 100
+        return NotImplemented
+
+    def __eq__(self, other):
+        key = self._compare_key(other)
+        return key if key is NotImplemented else self.cents == key
+
+    def __lt__(self, other):
+        key = self._compare_key(other)
+        return key if key is NotImplemented else self.cents < key
+
+    def __le__(self, other):
+        key = self._compare_key(other)
+        return key if key is NotImplemented else self.cents <= key
+
+    def __gt__(self, other):
+        key = self._compare_key(other)
+        return key if key is NotImplemented else self.cents > key
+
+    def __ge__(self, other):
+        key = self._compare_key(other)
+        return key if key is NotImplemented else self.cents >= key
+
+    def __hash__(self):
+        return hash(Fraction(self.cents, 100))  # Consistent with equality against plain numbers
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec or '.2f')
+
+    def __str__(self):
+        return format(self, '.2f')
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+CONVERSION_CACHE_SIZE = 4096  # Distinct amounts remembered per currency before starting over
+
+
+class RateTable:
+    """Conversion factors into dollar cents, reduced to integer fractions once when a rate is set.
+
+    `to_money` is then a single multiply and floor-divide on integers with no float rounding.
+    """
+
+    def __init__(self, rates=None):
+        self._factors = {}
+        self._converted = {}  # currency -> {cents: Decimal}, filled by convert()
+        for currency, (rate, digits) in (rates or {}).items():
+            self.set_rate(currency, rate, digits)
+
+    def set_rate(self, currency, rate, digits=2):
+        """`rate` is the dollar value of one unit of `currency`, whose minor unit is 10**-digits."""
+        factor = Fraction(to_decimal(rate)) * 100 / 10 ** digits  # dollar cents per minor unit
+        if factor <= 0:
+            raise ValueError(f"Exchange rate for {currency} must be positive")
+        self._factors[currency] = (factor.numerator, factor.denominator, digits)
+        self._converted.pop(currency, None)
+
+    def factors(self):
+        """{currency: (numerator, denominator, digits)}, the exact state needed to rebuild the table."""
+        return dict(self._factors)
+
+    def set_factor(self, currency, numerator, denominator, digits):
+        """Restore a conversion factor as returned by factors()."""
+        if numerator <= 0 or denominator <= 0:
+            raise ValueError(f"Exchange rate for {currency} must be positive")
+        self._factors[currency] = (numerator, denominator, digits)
+        self._converted.pop(currency, None)
+
+    def __contains__(self, currency):
+        return currency in self._factors
+
+    def __iter__(self):
+        return iter(self._factors)
+
+    def to_money(self, amount, currency):
+        """Convert `amount` of `currency` into dollars, rounding half-up to the cent."""
+        try:
+            numerator, denominator, digits = self._factors[currency]
+        except KeyError:
+            raise ValueError(f"Unsupported currency: {currency}") from None
+        minor = to_minor_units(amount, digits) * numerator
+        if minor < 0:
+            return Money(-((-minor + denominator // 2) // denominator))
+        return Money((minor + denominator // 2) // denominator)
+
+    def from_money(self, money, currency):
+        """Express `money` in `currency` as a Decimal rounded half-up to its minor unit."""
+        try:
+            numerator, denominator, digits = self._factors[currency]
+        except KeyError:
+            raise ValueError(f"Unsupported currency: {currency}") from None
+        scaled = Money.of(money).cents * denominator
+        minor = (abs(scaled) + numerator // 2) // numerator
+        return Decimal(minor if scaled >= 0 else -minor).scaleb(-digits)
+
+    def convert(self, money, currency):
+        """from_money() memoized per amount, for price lists rendered over and over in one currency."""
+        cents = Money.of(money).cents
+        converted = self._converted.get(currency)
+        if converted is None or len(converted) > CONVERSION_CACHE_SIZE:
+            converted = self._converted[currency] = {}
+        amount = converted.get(cents)
+        if amount is None:
+            amount = converted[cents] = self.from_money(Money(cents), currency)
+        return amount
+
+
+DEFAULT_RATES = {
+    # currency: (dollar value of one unit, minor unit digits)
+    'dollars': ('1', 2),
+    'shekels': ('0.29', 2),
+    'euros': ('1.08', 2),
+    'pounds': ('1.27', 2),
+    'yen': ('0.0067', 0),
+}
@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+
+from Money import Money
+
+# A planogram lists stock changes for many items at once, one row per item:
+#
+#   CSV   item,quantity,price          header row required, price may be left empty
+#   JSONL {"item": ..., "quantity": ..., "price": ...} per line
+#   JSON  a list of such objects, or an inventory mapping {"item": {"quantity": ..., "price_dollars": ...}}
+#
+# `quantity` is added to the current stock.  `price` is required for items that are not currently
+# stocked and replaces the current price of items that are.
+
+DEFAULT_INVENTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'default_inventory.json')
+MAX_ERRORS = 20
+
+
+class PlanogramError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def load_inventory(path=DEFAULT_INVENTORY_PATH):
+    """Read an inventory mapping file into the {'quantity', 'price_dollars'} dicts Machine uses."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {name: {'quantity': int(details['quantity']), 'price_dollars': Money.of(details['price_dollars'])}
+            for name, details in data.items()}
+
+
+def iter_raw_rows(path):
+    """Yield (line number, raw row dict) from a CSV, JSON-lines or JSON planogram."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', newline='') as f:
+        if extension == '.csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif extension == '.jsonl':
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+        elif extension == '.json':
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = [{'item': name, 'quantity': details.get('quantity'), 'price': details.get('price_dollars')}
+                        for name, details in data.items()]
+            for number, row in enumerate(data, 1):
+                yield number, row
+        else:
+            raise PlanogramError([f"Unsupported planogram format: {extension or path}"])
+
+
+def parse_row(row):
+    """Validate one raw row into (item, quantity, price or None)."""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object with item, quantity and price")
+    item = str(row.get('item') or '').strip().lower()
+    if not item:
+        raise ValueError("missing item name")
+    try:
+        quantity = int(str(row.get('quantity')).strip())
+    except ValueError:
+        raise ValueError(f"invalid quantity {row.get('quantity')!r}") from None
+    if quantity < 0:
+        raise ValueError(f"negative quantity {quantity}")
+    price = row.get('price')
+    if price is None or str(price).strip() == '':
+        return item, quantity, None
+    price = Money.of(price)
+    if price <= 0:
+        raise ValueError(f"price must be positive, got {price}")
+    return item, quantity, price
+
+
+def load_planogram(path):
+    """Read and validate every row, raising PlanogramError listing the bad rows if any are invalid."""
+    rows, errors = [], []
+    try:
+        for number, raw in iter_raw_rows(path):
+            try:
+                rows.append(parse_row(raw))
+            except ValueError as e:
+                errors.append(f"row {number}: {str(e)}")
+                if len(errors) >= MAX_ERRORS:
+                    break
+    except (OSError, json.JSONDecodeError, csv.Error) as e:
+        raise PlanogramError([f"cannot read {path}: {str(e)}"]) from None
+    if errors:
+        raise PlanogramError(errors)
+    return rows
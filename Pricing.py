@@ -0,0 +1,242 @@
+import math
+import threading
+import time
+import weakref
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is not installed; single-item pricing still works, batch repricing does not
+    np = None
+
+from Money import Money
+
+# Dynamic prices are the inventory's base price multiplied by the factor of every rule that
+# currently applies to the item, rounded half-up to the cent.  A rule is a factor plus a condition
+# on the time or on the item's stock.  Rules are compiled per item once (which rules can ever
+# apply to it), and each computed price is cached together with the range of inputs it stays
+# valid for: the base price, a [low, high) band of stock levels and a time at which some rule may
+# switch.  A purchase only recomputes a price when one of those inputs has moved outside its range.
+#
+# reprice() computes every price of many machines at once with NumPy and swaps each machine's
+# cache for a new one in a single assignment, so purchases never wait for it.
+#
+# version() tells price-sorted views (see Catalog.page) when they must re-sort: it changes after
+# reprice() and once the clock passes the earliest time a cached price may switch.  Prices that
+# move with stock need no version, since every stock change reaches the catalog as an event.
+
+
+class Rule:
+    """Multiply the price of `items` (every item if None) by `factor` whenever the rule is active."""
+
+    def __init__(self, factor, items=None):
+        if factor <= 0:
+            raise ValueError(f"Price factor must be positive, got {factor}")
+        self.factor = float(factor)
+        self.items = None if items is None else frozenset(items)
+
+    def covers(self, item):
+        return self.items is None or item in self.items
+
+    def active(self, stock, now):
+        return True
+
+    def active_mask(self, stock, now):
+        return np.ones(len(stock), dtype=bool)
+
+    def stock_threshold(self):
+        """Stock level at which the rule switches, or None if stock does not matter."""
+        return None
+
+    def next_change(self, now):
+        """First time after `now` at which the rule may switch, or math.inf."""
+        return math.inf
+
+
+class TimeOfDayRule(Rule):
+    """Active from `start_hour` up to `end_hour` local time, e.g. TimeOfDayRule(16, 18, 0.8) for a happy hour.
+
+    A window may wrap past midnight (start_hour > end_hour).
+    """
+
+    def __init__(self, start_hour, end_hour, factor, items=None):
+        super().__init__(factor, items)
+        self.start = start_hour * 3600
+        self.end = end_hour * 3600
+
+    @staticmethod
+    def seconds_into_day(now):
+        local = time.localtime(now)
+        return local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec + (now % 1)
+
+    def active(self, stock, now):
+        seconds = self.seconds_into_day(now)
+        if self.start <= self.end:
+            return self.start <= seconds < self.end
+        return seconds >= self.start or seconds < self.end
+
+    def active_mask(self, stock, now):
+        return np.full(len(stock), self.active(None, now))
+
+    def next_change(self, now):
+        seconds = self.seconds_into_day(now)
+        waits = [(boundary - seconds) % 86400 or 86400 for boundary in (self.start, self.end)]
+        return now + min(waits)
+
+
+class StockRule(Rule):
+    """Active while stock is below `threshold` (scarcity pricing) or, with below=False, at or above it."""
+
+    def __init__(self, threshold, factor, items=None, below=True):
+        super().__init__(factor, items)
+        self.threshold = threshold
+        self.below = below
+
+    def active(self, stock, now):
+        return (stock < self.threshold) == self.below
+
+    def active_mask(self, stock, now):
+        return (stock < self.threshold) == self.below
+
+    def stock_threshold(self):
+        return self.threshold
+
+
+class Promotion(Rule):
+    """Active between the `starts` and `ends` timestamps (either may be None for open-ended)."""
+
+    def __init__(self, factor, items=None, starts=None, ends=None):
+        super().__init__(factor, items)
+        self.starts = -math.inf if starts is None else starts
+        self.ends = math.inf if ends is None else ends
+
+    def active(self, stock, now):
+        return self.starts <= now < self.ends
+
+    def active_mask(self, stock, now):
+        return np.full(len(stock), self.active(None, now))
+
+    def next_change(self, now):
+        return min((boundary for boundary in (self.starts, self.ends) if boundary > now), default=math.inf)
+
+
+class PricingEngine:
+    """Evaluates `rules` (applied in order) for any number of machines; set machine.pricing to use it."""
+
+    def __init__(self, rules=(), clock=time.time):
+        self.rules = list(rules)
+        self.clock = clock
+        self._compiled = {}  # item -> rules that cover it
+        self._caches = weakref.WeakKeyDictionary()  # machine -> {item: (price, base cents, low, high, until)}
+        self._versions = weakref.WeakKeyDictionary()  # machine -> [version, earliest `until` cached]
+        self._lock = threading.Lock()
+
+    def rules_for(self, item):
+        rules = self._compiled.get(item)
+        if rules is None:
+            rules = self._compiled[item] = tuple(rule for rule in self.rules if rule.covers(item))
+        return rules
+
+    def _cache(self, machine):
+        cache = self._caches.get(machine)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.setdefault(machine, {})
+        return cache
+
+    def _version(self, machine):
+        version = self._versions.get(machine)
+        if version is None:
+            with self._lock:
+                version = self._versions.setdefault(machine, [0, math.inf])
+        return version
+
+    def version(self, machine):
+        """Token that changes whenever prices of `machine` may have changed other than through its stock."""
+        version = self._version(machine)
+        now = self.clock()
+        if now >= version[1]:
+            with self._lock:
+                if now >= version[1]:
+                    version[0] += 1
+                    version[1] = min((entry[4] for entry in self._cache(machine).values() if entry[4] > now),
+                                     default=math.inf)
+        return self, version[0]
+
+    def price(self, machine, item):
+        """Current price of `item` in `machine`; Money(0) for unknown items, like Machine.get_item_price."""
+        details = machine.inventory.get(item)
+        if details is None:
+            return Money(0)
+        base, stock, now = Money.of(details['price_dollars']).cents, details['quantity'], self.clock()
+        cache = self._cache(machine)
+        entry = cache.get(item)
+        if entry is not None and entry[1] == base and entry[2] <= stock < entry[3] and now < entry[4]:
+            return entry[0]
+        factor, low, high, until = 1.0, -math.inf, math.inf, math.inf
+        for rule in self.rules_for(item):
+            if rule.active(stock, now):
+                factor *= rule.factor
+            threshold = rule.stock_threshold()
+            if threshold is not None:
+                if stock < threshold:
+                    high = min(high, threshold)
+                else:
+                    low = max(low, threshold)
+            until = min(until, rule.next_change(now))
+        price = Money(math.floor(base * factor + 0.5))
+        cache[item] = (price, base, low, high, until)
+        version = self._version(machine)
+        if until < version[1]:
+            version[1] = until
+        return price
+
+    def reprice(self, machines, now=None):
+        """Recompute every item of every machine in one vectorized pass; returns the number of prices set."""
+        if np is None:
+            raise RuntimeError("Batch repricing requires NumPy")
+        now = self.clock() if now is None else now
+        owners, items, bases, stocks = [], [], [], []
+        for machine in machines:
+            for item, details in list(machine.inventory.items()):
+                owners.append(machine)
+                items.append(item)
+                bases.append(Money.of(details['price_dollars']).cents)
+                stocks.append(details['quantity'])
+        count = len(items)
+        base = np.array(bases, dtype=np.int64)
+        stock = np.array(stocks, dtype=np.int64)
+        names = sorted(set(items))
+        positions = {name: position for position, name in enumerate(names)}
+        codes = np.fromiter((positions[item] for item in items), dtype=np.int64, count=count)
+        factor = np.ones(count)
+        low = np.full(count, -np.inf)
+        high = np.full(count, np.inf)
+        until = math.inf
+        for rule in self.rules:
+            if rule.items is None:
+                covered = np.ones(count, dtype=bool)
+            else:
+                covered = np.zeros(len(names), dtype=bool)
+                covered[[position for position, name in enumerate(names) if name in rule.items]] = True
+                covered = covered[codes]
+            factor = np.where(covered & rule.active_mask(stock, now), factor * rule.factor, factor)
+            threshold = rule.stock_threshold()
+            if threshold is not None:
+                high = np.where(covered & (stock < threshold), np.minimum(high, threshold), high)
+                low = np.where(covered & (stock >= threshold), np.maximum(low, threshold), low)
+            until = min(until, rule.next_change(now))
+        cents = np.floor(base * factor + 0.5).astype(np.int64)
+        caches = {}
+        for machine, item, price, base_cents, floor, ceiling in zip(owners, items, cents.tolist(), bases,
+                                                                    low.tolist(), high.tolist()):
+            cache = caches.get(machine)
+            if cache is None:
+                cache = caches[machine] = {}
+            cache[item] = (Money(price), base_cents, floor, ceiling, until)
+        with self._lock:
+            for machine, cache in caches.items():
+                self._caches[machine] = cache  # Readers see the old cache or the new one, never a mix
+                version = self._versions.setdefault(machine, [0, math.inf])
+                version[0] += 1
+                version[1] = until
+        return count
@@ -0,0 +1,259 @@
+import argparse
+import builtins
+import multiprocessing
+import os
+import sys
+import time
+
+import VendingMachine
+from Planogram import load_inventory
+from VendingMachine import Machine
+
+# A session script is a recorded console session, one step per line:
+#
+#   # Buy a sprite with shekels          comment
+#   flow customer                        which menu to drive: main (default), customer or admin
+#   > shekels                            a line the customer types
+#   < Inserted $5.80 Dollars             text expected in the output since the previous input
+#
+# Replaying swaps the `input` and `print` globals of the VendingMachine module for a feeder and
+# a collector, so the real menu code runs unchanged against a fresh Machine with no console and
+# no mock library.  Expected lines must appear in order; a script that runs out of input before
+# the flow exits fails instead of hanging.  Scripts run in parallel worker processes, each
+# replaying its share one after another since the swapped globals are per process.
+
+FLOWS = {
+    'main': VendingMachine.main,
+    'customer': VendingMachine.run_customer,
+    'admin': VendingMachine.run_administrator_menu,
+}
+SCRIPT_SUFFIX = '.session'
+
+
+class ScriptError(ValueError):
+    pass
+
+
+class OutOfInput(BaseException):
+    """Raised by the feeder; a BaseException so the menus' `except Exception` handlers let it through."""
+
+
+class SessionScript:
+    def __init__(self, name, flow='main', steps=()):
+        if flow not in FLOWS:
+            raise ScriptError(f"{name}: unknown flow {flow!r}, expected one of {', '.join(FLOWS)}")
+        self.name = name
+        self.flow = flow
+        self.steps = list(steps)  # ('>', typed text) or ('<', expected text)
+
+    @property
+    def inputs(self):
+        return [text for kind, text in self.steps if kind == '>']
+
+    @classmethod
+    def parse(cls, text, name='<script>'):
+        flow, steps = 'main', []
+        for number, line in enumerate(text.splitlines(), 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            if stripped.startswith('flow '):
+                flow = stripped[5:].strip()
+            elif line.startswith('> ') or line.rstrip() == '>':
+                steps.append(('>', line[2:]))  # Typed text keeps its spaces
+            elif line.startswith('< '):
+                steps.append(('<', line[2:].strip()))
+            else:
+                raise ScriptError(f"{name}, line {number}: expected '> input', '< output' or 'flow NAME'")
+        return cls(name, flow, steps)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.parse(f.read(), os.path.basename(path))
+
+    def dump(self):
+        lines = [f"flow {self.flow}"]
+        lines.extend(f"{kind} {text}" for kind, text in self.steps)
+        return '\n'.join(lines) + '\n'
+
+
+class ReplayResult:
+    __slots__ = ('name', 'failure', 'inputs', 'elapsed', 'output')
+
+    def __init__(self, name, failure, inputs, elapsed, output):
+        self.name = name
+        self.failure = failure  # None if the script passed
+        self.inputs = inputs
+        self.elapsed = elapsed
+        self.output = output
+
+    @property
+    def passed(self):
+        return self.failure is None
+
+
+def replay(script, machine=None):
+    """Run one script headlessly through its menu flow and check its expected output."""
+    machine = Machine() if machine is None else machine
+    inputs = script.inputs
+    output = []  # Prompts and printed lines
+    marks = []  # len(output) when each input was read
+
+    def feed(prompt=''):
+        output.append(str(prompt))
+        if len(marks) == len(inputs):
+            raise OutOfInput()
+        marks.append(len(output))
+        return inputs[len(marks) - 1]
+
+    def collect(*values, sep=' ', end='\n', file=None, flush=False):
+        output.append(sep.join(str(value) for value in values))
+
+    failure = None
+    VendingMachine.input, VendingMachine.print = feed, collect
+    started = time.perf_counter()
+    try:
+        FLOWS[script.flow](machine)
+    except OutOfInput:
+        failure = f"ran out of input after {len(inputs)} lines; last output: {output[-1]!r}"
+    except Exception as e:
+        failure = f"{type(e).__name__}: {str(e)}"
+    finally:
+        elapsed = time.perf_counter() - started
+        del VendingMachine.input, VendingMachine.print
+    if failure is None and len(marks) < len(inputs):
+        failure = f"flow exited with {len(inputs) - len(marks)} input lines unread"
+    if failure is None:
+        failure = check_expectations(script.steps, output, marks)
+    return ReplayResult(script.name, failure, len(marks), elapsed, output)
+
+
+def check_expectations(steps, output, marks):
+    cursor, typed = 0, 0
+    for kind, text in steps:
+        if kind == '>':
+            cursor = max(cursor, marks[typed])
+            typed += 1
+            continue
+        end = marks[typed] if typed < len(marks) else len(output)  # Output before the next input
+        for position in range(cursor, end):
+            if text in output[position]:
+                cursor = position + 1
+                break
+        else:
+            return f"expected {text!r} after input {typed}; got {output[cursor:end]!r}"
+    return None
+
+
+def record(flow='main', machine=None):
+    """Run a flow on the console and return a script of what was typed and printed."""
+    machine = Machine() if machine is None else machine
+    steps = []
+
+    def feed(prompt=''):
+        try:
+            text = builtins.input(prompt)
+        except EOFError:
+            raise OutOfInput() from None
+        steps.append(('>', text))
+        return text
+
+    def collect(*values, sep=' ', end='\n', file=None, flush=False):
+        builtins.print(*values, sep=sep, end=end, file=file, flush=flush)
+        for line in sep.join(str(value) for value in values).splitlines():
+            if line.strip() and not set(line.strip()) <= {'-'}:  # Rules between menus are not worth checking
+                steps.append(('<', line.strip()))
+
+    VendingMachine.input, VendingMachine.print = feed, collect
+    try:
+        FLOWS[flow](machine)
+    except OutOfInput:
+        pass
+    finally:
+        del VendingMachine.input, VendingMachine.print
+    return SessionScript('recorded', flow, steps)
+
+
+_template = None
+
+
+def _replay_in_worker(script):
+    global _template
+    if _template is None:
+        _template = load_inventory()
+    machine = Machine({name: dict(details) for name, details in _template.items()}, stripes=1)
+    result = replay(script, machine)
+    result.output = None  # Not worth pickling back to the parent
+    return result
+
+
+def run_suite(scripts, workers=None, repeat=1):
+    """Replay every script `repeat` times over `workers` processes; returns a report dict."""
+    tasks = [script for script in scripts for _ in range(repeat)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_replay_in_worker(script) for script in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_replay_in_worker, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+    elapsed = time.perf_counter() - started
+    failures = {}
+    for result in results:
+        if not result.passed:
+            failures.setdefault(result.name, result.failure)
+    inputs = sum(result.inputs for result in results)
+    return {
+        'scripts': len(tasks),
+        'workers': workers,
+        'elapsed': elapsed,
+        'scripts_per_sec': len(tasks) / elapsed if elapsed else 0.0,
+        'inputs_per_sec': inputs / elapsed if elapsed else 0.0,
+        'failures': failures,
+    }
+
+
+def find_scripts(paths):
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.endswith(SCRIPT_SUFFIX))
+            scripts.extend(SessionScript.load(os.path.join(path, name)) for name in names)
+        else:
+            scripts.append(SessionScript.load(path))
+    return scripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded console sessions against the menu flows.")
+    parser.add_argument('paths', nargs='*', default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions')],
+                        help=f"{SCRIPT_SUFFIX} files or directories of them (default: sessions/)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=1, help="Replay each script this many times (load test)")
+    parser.add_argument('--record', metavar='PATH', help="Record a console session to PATH instead of replaying")
+    parser.add_argument('--flow', choices=sorted(FLOWS), default='main', help="Flow to record")
+    args = parser.parse_args()
+    if args.record:
+        script = record(args.flow)
+        with open(args.record, 'w') as f:
+            f.write(script.dump())
+        print(f"Recorded {len(script.inputs)} inputs to {args.record}")
+        return
+    try:
+        scripts = find_scripts(args.paths)
+    except (OSError, ScriptError) as e:
+        print(f"Cannot load scripts: {str(e)}")
+        sys.exit(2)
+    report = run_suite(scripts, args.workers, args.repeat)
+    print(f"{report['scripts']} sessions on {report['workers']} workers in {report['elapsed']:.2f}s: "
+          f"{report['scripts_per_sec']:,.0f} sessions/sec, {report['inputs_per_sec']:,.0f} inputs/sec")
+    for name, failure in sorted(report['failures'].items()):
+        print(f"FAIL {name}: {failure}")
+    if report['failures']:
+        sys.exit(1)
+    print(f"All {len(scripts)} scripts passed")
+
+
+if __name__ == "__main__":
+    main()
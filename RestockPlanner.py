@@ -0,0 +1,112 @@
+import math
+import time
+
+import numpy as np
+
+# Depletion rates are exponentially decayed sale counters: each (machine, item) pair keeps one
+# rate, its last update time and its current stock, so memory per SKU is constant however many
+# sales are observed.  A rate decays by half every `half_life` seconds without sales and grows by
+# quantity / tau on each sale, which makes it an estimate of units sold per second.  Forecasts and
+# the refill plan are computed for every SKU of the fleet at once with NumPy.
+
+
+class RestockPlanner:
+    def __init__(self, half_life=6 * 3600.0, clock=time.time, capacity=64):
+        self.half_life = half_life
+        self.tau = half_life / math.log(2)
+        self.clock = clock
+        self.keys = []  # (machine id, item) of every row
+        self._rows = {}
+        self._rates = np.zeros(capacity)
+        self._updated = np.zeros(capacity)
+        self._stock = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self._rates):
+                self._rates = np.concatenate([self._rates, np.zeros(row)])
+                self._updated = np.concatenate([self._updated, np.zeros(row)])
+                self._stock = np.concatenate([self._stock, np.zeros(row, dtype=np.int64)])
+            self._updated[row] = self.clock()
+            self._rows[key] = row
+            self.keys.append(key)
+        return row
+
+    def record_sale(self, key, quantity, stock):
+        row = self._row(key)
+        now = self.clock()
+        decay = math.exp(-(now - self._updated[row]) / self.tau)
+        self._rates[row] = self._rates[row] * decay + quantity / self.tau
+        self._updated[row] = now
+        self._stock[row] = stock
+
+    def observe_stock(self, key, stock):
+        row = self._row(key)  # May grow the arrays, so index them only afterwards
+        self._stock[row] = stock
+
+    def attach(self, machine, machine_id=0):
+        """Follow the sales and stock changes of `machine` from now on."""
+        def listener(event, details):
+            if event == 'reset':
+                for item, row in details['inventory'].items():
+                    self.observe_stock((machine_id, item), row['quantity'])
+            elif 'item' in details:
+                row = machine.inventory.get(details['item'])
+                stock = 0 if row is None else row['quantity']
+                if event == 'vend':
+                    self.record_sale((machine_id, details['item']), details['quantity'], stock)
+                else:
+                    self.observe_stock((machine_id, details['item']), stock)
+
+        for item, row in machine.inventory.items():
+            self.observe_stock((machine_id, item), row['quantity'])
+        machine.subscribe(listener)
+        return listener
+
+    def state(self):
+        """Picklable copy of the counters, for merging planners from several processes."""
+        count = len(self.keys)
+        return list(self.keys), self._rates[:count].copy(), self._updated[:count].copy(), self._stock[:count].copy()
+
+    @classmethod
+    def combine(cls, states, half_life=6 * 3600.0, clock=time.time):
+        planner = cls(half_life, clock, capacity=1)
+        keys = [key for state in states for key in state[0]]
+        if keys:
+            planner.keys = keys
+            planner._rows = {key: row for row, key in enumerate(keys)}
+            planner._rates = np.concatenate([state[1] for state in states])
+            planner._updated = np.concatenate([state[2] for state in states])
+            planner._stock = np.concatenate([state[3] for state in states])
+        return planner
+
+    def forecast(self, now=None):
+        """Return (units/second now, seconds until stock-out) for every row, as arrays."""
+        now = self.clock() if now is None else now
+        count = len(self.keys)
+        rates = self._rates[:count] * np.exp(-(now - self._updated[:count]) / self.tau)
+        stock = self._stock[:count]
+        with np.errstate(divide='ignore'):
+            seconds = np.where(rates > 0, stock / np.where(rates > 0, rates, 1), np.inf)
+        return rates, np.where(stock <= 0, 0.0, seconds)
+
+    def plan(self, horizon=24 * 3600.0, cover=3 * 24 * 3600.0, par_level=None, now=None):
+        """Refill list for SKUs expected to sell out within `horizon` seconds, most urgent first.
+
+        Each entry is ((machine id, item), units to add, seconds until stock-out); the quantity tops the
+        slot up to `cover` seconds of forecast demand, capped at `par_level` units if given.
+        """
+        rates, seconds = self.forecast(now)
+        stock = self._stock[:len(self.keys)]
+        target = np.ceil(rates * cover)
+        if par_level is not None:
+            target = np.minimum(target, par_level)
+        quantities = np.maximum(target - stock, 0).astype(np.int64)
+        rows = np.flatnonzero((seconds < horizon) & (quantities > 0))
+        rows = rows[np.argsort(seconds[rows], kind='stable')]
+        return [(self.keys[row], int(quantities[row]), float(seconds[row])) for row in rows]
@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import Journal
+from Money import Money
+
+# Every vend becomes one row of a columnar buffer: parallel NumPy arrays for the time, item code,
+# currency code, units and revenue in cents, grown by doubling.  Item and currency names are stored
+# once and referenced by code.  Rollups fold only the rows appended since their last refresh into a
+# small (time bucket, item, currency) table, and every report is a NumPy group-by over that table
+# or over the raw columns, so no Python loop runs per sale.
+
+COLUMNS = (('time', np.float64), ('item', np.int32), ('currency', np.int16),
+           ('quantity', np.int32), ('cents', np.int64))
+DIMENSIONS = ('bucket', 'item', 'currency')
+
+
+class SalesLog:
+    """Append-only sales history; attach() it to a machine or feed it a journal."""
+
+    def __init__(self, capacity=1 << 16, clock=time.time):
+        self.clock = clock
+        self.size = 0
+        self.items = []
+        self.currencies = []
+        self._item_codes = {}
+        self._currency_codes = {}
+        self._columns = {name: np.zeros(capacity, dtype) for name, dtype in COLUMNS}
+        self._rollups = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _code(self, names, codes, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def append(self, item, quantity, price, currency='dollars', when=None):
+        with self._lock:
+            row = self.size
+            columns = self._columns
+            if row == len(columns['time']):
+                self._columns = columns = {name: np.concatenate([values, np.zeros_like(values)])
+                                           for name, values in columns.items()}
+            columns['time'][row] = self.clock() if when is None else when
+            columns['item'][row] = self._code(self.items, self._item_codes, item)
+            columns['currency'][row] = self._code(self.currencies, self._currency_codes, currency)
+            columns['quantity'][row] = quantity
+            columns['cents'][row] = Money.of(price).cents * quantity
+            self.size = row + 1
+
+    def record(self, event, details):
+        """Machine listener; subscribe it with attach()."""
+        if event == 'vend':
+            self.append(details['item'], details['quantity'], details['price'], details.get('currency', 'dollars'))
+
+    def attach(self, machine):
+        machine.subscribe(self.record)
+        return self
+
+    @classmethod
+    def from_journal(cls, path):
+        """Load the vend records of a Journal file and its archived segments (see Journal.py)."""
+        log = cls()
+        for segment in Journal.segments(path):
+            with open(segment, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Torn final write
+                    record = json.loads(line)
+                    if record['event'] == 'vend':
+                        log.append(record['item'], record['quantity'], record['price'],
+                                   record.get('currency', 'dollars'), record['ts'])
+        return log
+
+    def columns(self):
+        """{column name: read-only array} of the rows recorded so far."""
+        with self._lock:
+            size, columns = self.size, self._columns
+        views = {}
+        for name, values in columns.items():
+            view = values[:size]
+            view.flags.writeable = False
+            views[name] = view
+        return views
+
+    def rollup(self, bucket_seconds=3600):
+        """The (bucket, item, currency) aggregate for `bucket_seconds`, brought up to date incrementally."""
+        rollup = self._rollups.get(bucket_seconds)
+        if rollup is None:
+            rollup = self._rollups[bucket_seconds] = Rollup(self, bucket_seconds)
+        return rollup.refresh()
+
+    def currency_share(self):
+        """{currency: share of revenue}, straight from the raw columns."""
+        columns = self.columns()
+        revenue = np.bincount(columns['currency'], weights=columns['cents'], minlength=len(self.currencies))
+        total = revenue.sum()
+        return {currency: float(revenue[code] / total) if total else 0.0
+                for code, currency in enumerate(self.currencies)}
+
+
+class Rollup:
+    def __init__(self, log, bucket_seconds):
+        self.log = log
+        self.bucket_seconds = bucket_seconds
+        self.folded = 0  # Rows of the log already included
+        self.keys = np.zeros((len(DIMENSIONS), 0), dtype=np.int64)
+        self.quantity = np.zeros(0, dtype=np.int64)
+        self.cents = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            columns = self.log.columns()
+            end = len(columns['time'])
+            if end > self.folded:
+                new = slice(self.folded, end)
+                keys = np.stack([(columns['time'][new] // self.bucket_seconds).astype(np.int64),
+                                 columns['item'][new], columns['currency'][new]])
+                self.keys, self.quantity, self.cents = group(np.concatenate([self.keys, keys], axis=1),
+                                                             np.concatenate([self.quantity, columns['quantity'][new]]),
+                                                             np.concatenate([self.cents, columns['cents'][new]]))
+                self.folded = end
+        return self
+
+    def report(self, by=('bucket', 'item'), start=None, end=None):
+        """Rows of (*labels, units, revenue) grouped by the `by` dimensions, optionally limited to
+        buckets starting in [start, end).  Buckets are labelled with their start time in epoch seconds.
+        """
+        keys, quantity, cents = self.keys, self.quantity, self.cents
+        if start is not None or end is not None:
+            starts = keys[0] * self.bucket_seconds
+            mask = np.ones(len(quantity), dtype=bool)
+            if start is not None:
+                mask &= starts >= start
+            if end is not None:
+                mask &= starts < end
+            keys, quantity, cents = keys[:, mask], quantity[mask], cents[mask]
+        dimensions = [DIMENSIONS.index(name) for name in by]
+        keys, quantity, cents = group(keys[dimensions], quantity, cents)
+        decoders = {'bucket': lambda bucket: int(bucket) * self.bucket_seconds,
+                    'item': self.log.items.__getitem__, 'currency': self.log.currencies.__getitem__}
+        labels = [[decoders[name](value) for value in row] for name, row in zip(by, keys.tolist())]
+        return [(*row_labels, units, Money(revenue))
+                for *row_labels, units, revenue in zip(*labels, quantity.tolist(), cents.tolist())]
+
+
+def group(keys, quantity, cents):
+    """Sum quantity and cents over identical key columns; returns (unique keys, quantity, cents)."""
+    if keys.shape[1] == 0:
+        return keys, quantity, cents
+    # Pack each key column into one int64 so the group-by is a 1-D sort rather than a row sort
+    lows = keys.min(axis=1)
+    spans = keys.max(axis=1) - lows + 1
+    packed = np.zeros(keys.shape[1], dtype=np.int64)
+    for row, low, span in zip(keys, lows, spans):
+        packed = packed * span + (row - low)
+    unique, inverse = np.unique(packed, return_inverse=True)
+    groups = len(unique)
+    columns = np.zeros((len(keys), groups), dtype=np.int64)
+    for row in range(len(keys) - 1, -1, -1):
+        unique, columns[row] = np.divmod(unique, spans[row])
+        columns[row] += lows[row]
+    summed_quantity = np.bincount(inverse, weights=quantity, minlength=groups).astype(np.int64)
+    summed_cents = np.bincount(inverse, weights=cents, minlength=groups).astype(np.int64)
+    return columns, summed_quantity, summed_cents
+
+
+def write_csv(path, by, rows):
+    """Write report rows with a header; bucket start times become UTC ISO-8601 timestamps."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([*by, 'units', 'revenue_dollars'])
+        for row in rows:
+            labels = [datetime.fromtimestamp(value, timezone.utc).isoformat() if name == 'bucket' else value
+                      for name, value in zip(by, row)]
+            writer.writerow([*labels, row[-2], str(row[-1])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report sales from a vending journal.")
+    parser.add_argument('journal', help="Journal file written by VendingServer --journal")
+    parser.add_argument('--bucket', type=int, default=3600, help="Bucket width in seconds")
+    parser.add_argument('--by', default='bucket,item', help="Comma-separated dimensions: bucket, item, currency")
+    parser.add_argument('--csv', help="Write the report to this CSV file instead of printing it")
+    args = parser.parse_args()
+    by = tuple(name.strip() for name in args.by.split(','))
+    unknown = [name for name in by if name not in DIMENSIONS]
+    if unknown:
+        parser.error(f"unknown dimension(s): {', '.join(unknown)}")
+    log = SalesLog.from_journal(args.journal)
+    rows = log.rollup(args.bucket).report(by)
+    if args.csv:
+        write_csv(args.csv, by, rows)
+        print(f"Wrote {len(rows)} rows for {len(log)} sales to {args.csv}")
+        return
+    for row in rows:
+        print(', '.join(str(value) for value in row[:-1]) + f", ${row[-1]:.2f}")
+    for currency, share in log.currency_share().items():
+        print(f"{currency}: {share:.1%} of revenue")
+
+
+if __name__ == "__main__":
+    main()
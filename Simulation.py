@@ -0,0 +1,184 @@
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from LoadGenerator import percentile
+from Money import Money
+from VendingMachine import Machine, Client, Administrator, PurchaseResult
+
+
+class TrafficProfile:
+    """Knobs of the synthetic customer population."""
+
+    def __init__(self, arrival_rate=None, popularity_skew=1.1, currency_mix=None,
+                 insufficient_funds_rate=0.1, cancel_rate=0.05, restock_quantity=50):
+        self.arrival_rate = arrival_rate  # Customers per second, or None to run flat out
+        self.popularity_skew = popularity_skew  # Zipf exponent; 0 means every item is equally popular
+        self.currency_mix = currency_mix or {'dollars': 0.6, 'shekels': 0.3, 'euros': 0.1}
+        self.insufficient_funds_rate = insufficient_funds_rate
+        self.cancel_rate = cancel_rate
+        self.restock_quantity = restock_quantity
+
+
+class Simulation:
+    """Replays synthetic customer sessions against Machine/Client/Administrator and times each one."""
+
+    def __init__(self, profile=None, seed=0, machine=Machine):
+        self.profile = profile or TrafficProfile()
+        self.random = random.Random(seed)
+        self.machine = machine
+        self.administrator = Administrator(machine)
+        items = list(machine.inventory.keys())
+        weights = [1 / (rank + 1) ** self.profile.popularity_skew for rank in range(len(items))]
+        self.items = items
+        self.item_weights = list(_cumulative(weights))
+        self.currencies = list(self.profile.currency_mix)
+        self.currency_weights = list(_cumulative(self.profile.currency_mix.values()))
+
+    def plan(self, sessions):
+        """Pre-draw every random decision so the timed loop only exercises the vending code."""
+        choices = self.random.choices
+        items = choices(self.items, cum_weights=self.item_weights, k=sessions)
+        currencies = choices(self.currencies, cum_weights=self.currency_weights, k=sessions)
+        plans = []
+        for item, currency in zip(items, currencies):
+            roll = self.random.random()
+            if roll < self.profile.cancel_rate:
+                behaviour = 'cancel'
+            elif roll < self.profile.cancel_rate + self.profile.insufficient_funds_rate:
+                behaviour = 'short'
+            else:
+                behaviour = 'pay'
+            plans.append((item, currency, behaviour))
+        return plans
+
+    def run_session(self, item, currency, behaviour):
+        """One customer visit; returns the final PurchaseResult status or 'cancel'."""
+        machine = self.machine
+        client = Client(machine)
+        client.currency = currency
+        price = machine.get_item_price(item)
+        if not machine.is_available(item):
+            self.administrator.restock(item, self.profile.restock_quantity, price)
+        full_payment = machine.rates.from_money(price + Money(100), currency)  # Overpay a dollar
+        if behaviour == 'cancel':
+            client.deposit(full_payment)
+            client.refund()
+            return 'cancel'
+        if not client.choose_item(item):
+            return PurchaseResult.UNAVAILABLE
+        if behaviour == 'short':
+            client.deposit(machine.rates.from_money(Money(1), currency) or 1)
+            result = client.checkout()
+            if result.status != PurchaseResult.INSUFFICIENT_FUNDS:
+                return result.status
+        client.deposit(full_payment)
+        return client.checkout().status
+
+    def run(self, sessions, threads=1, trace_allocations=False):
+        plans = self.plan(sessions)
+        arrival_rate = self.profile.arrival_rate
+        arrivals = []
+        clock = 0.0
+        for _ in plans:
+            if arrival_rate:
+                clock += self.random.expovariate(arrival_rate)
+            arrivals.append(clock)
+        latencies = array('d', [0.0]) * sessions  # Unboxed, so storing samples does not allocate
+        outcomes = [None] * sessions
+
+        def serve(index):
+            item, currency, behaviour = plans[index]
+            scheduled = start + arrivals[index]
+            now = time.perf_counter()
+            if arrival_rate and now < scheduled:
+                time.sleep(scheduled - now)
+            outcomes[index] = self.run_session(item, currency, behaviour)
+            # Measured from the scheduled arrival, so a backlog shows up as latency
+            latencies[index] = time.perf_counter() - (scheduled if arrival_rate else now)
+
+        if trace_allocations:
+            tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(serve, range(sessions)))
+        else:
+            for index in range(sessions):
+                serve(index)
+        elapsed = time.perf_counter() - start
+        blocks_after = sys.getallocatedblocks()
+        peak_bytes = None
+        if trace_allocations:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        counts = {}
+        for outcome in outcomes:
+            counts[outcome] = counts.get(outcome, 0) + 1
+        latencies = sorted(latencies)
+        return {
+            'sessions': sessions,
+            'elapsed': elapsed,
+            'sessions_per_sec': sessions / elapsed if elapsed else 0.0,
+            'vends_per_sec': counts.get(PurchaseResult.OK, 0) / elapsed if elapsed else 0.0,
+            'p50_us': percentile(latencies, 0.50) * 1e6,
+            'p90_us': percentile(latencies, 0.90) * 1e6,
+            'p99_us': percentile(latencies, 0.99) * 1e6,
+            'max_us': latencies[-1] * 1e6 if latencies else 0.0,
+            'retained_blocks': blocks_after - blocks_before,
+            'peak_traced_bytes': peak_bytes,
+            'outcomes': counts,
+        }
+
+
+def _cumulative(weights):
+    total = 0.0
+    for weight in weights:
+        total += weight
+        yield total
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions in {report['elapsed']:.3f}s: "
+          f"{report['sessions_per_sec']:,.0f} sessions/sec, {report['vends_per_sec']:,.0f} vends/sec")
+    print(f"Session latency: p50 {report['p50_us']:.1f} us, p90 {report['p90_us']:.1f} us, "
+          f"p99 {report['p99_us']:.1f} us, max {report['max_us']:.1f} us")
+    print(f"Allocated blocks retained: {report['retained_blocks']:+d}")
+    if report['peak_traced_bytes'] is not None:
+        print(f"Peak traced memory: {report['peak_traced_bytes'] / 1024:.1f} KiB")
+    print(f"Outcomes: {report['outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate customer traffic against the vending engine.")
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--rate', type=float, help="Poisson arrival rate in customers/sec (default: flat out)")
+    parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of item popularity")
+    parser.add_argument('--insufficient', type=float, default=0.1, help="Share of customers who underpay first")
+    parser.add_argument('--cancel', type=float, default=0.05, help="Share of customers who cancel")
+    parser.add_argument('--currency', action='append', metavar='NAME=WEIGHT',
+                        help="Currency mix entry, repeatable (default dollars=0.6 shekels=0.3 euros=0.1)")
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-allocations', action='store_true', help="Track peak memory with tracemalloc")
+    parser.add_argument('--min-rate', type=float, help="Exit with status 1 if sessions/sec falls below this")
+    args = parser.parse_args()
+    mix = None
+    if args.currency:
+        mix = {name: float(weight) for name, weight in (entry.split('=', 1) for entry in args.currency)}
+    profile = TrafficProfile(args.rate, args.skew, mix, args.insufficient, args.cancel)
+    report = Simulation(profile, args.seed).run(args.sessions, args.threads, args.trace_allocations)
+    print_report(report)
+    if args.min_rate is not None and report['sessions_per_sec'] < args.min_rate:
+        print(f"Regression: {report['sessions_per_sec']:,.0f} sessions/sec is below {args.min_rate:,.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from CashCassette import CashCassette
+from Money import Money, RateTable
+
+# Binary snapshot of one or many machines.  All integers are little-endian.
+#
+#   header   8-byte magic, u32 machine count, u64 offset of the rate tables
+#   index    per machine: i64 machine id, u64 offset, u64 length   (sorted by machine id)
+#   records  per machine, at its offset:
+#              u32 rate table number
+#              u32 items,  per item:  str name, i64 quantity, i64 price cents
+#              u32 cassette denominations or NO_CASSETTE, i64 max change cents,
+#                          per denomination: i64 cents, i64 count
+#              u32 balances, per balance: str key, i64 cents      (money inserted but not yet spent)
+#   rate tables  u32 tables, per table: u32 byte length,
+#                            u32 rates, per rate: str currency, i64 numerator, i64 denominator, u8 digits
+#
+# where str is a u16 byte length followed by UTF-8.  Machines of a fleet nearly always share their
+# exchange rates, so each distinct rate table is stored once and records refer to it by number.
+# Opening a snapshot reads only the header, index and rate tables; a machine's record is decoded
+# the first time it is restored, so a controller for thousands of machines starts without touching
+# most of the file.  Files are written to a temporary name, fsynced and renamed over the old
+# snapshot, so a crash leaves either the old or the new one.
+
+MAGIC = b'VMSNAP2\n'
+HEADER = struct.Struct('<8sIQ')
+NO_CASSETTE = 0xFFFFFFFF
+_COUNT = struct.Struct('<I')
+_LENGTH = struct.Struct('<H')
+_ITEM = struct.Struct('<qq')
+_RATE = struct.Struct('<qqB')
+_CENTS = struct.Struct('<q')
+_SWAP = sys.byteorder != 'little'  # The index is written as a raw array('q')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _pack_str(parts, text):
+    data = text.encode()
+    parts.append(_LENGTH.pack(len(data)))
+    parts.append(data)
+
+
+class RateTables:
+    """The distinct rate tables of one snapshot, numbered in the order they were first added."""
+
+    def __init__(self, tables=()):
+        self.tables = []  # Encoded tables
+        self._numbers = {}  # Encoded table -> number
+        for table in tables:
+            self.number(table)
+
+    def number(self, table):
+        """Number of an encoded table, adding it if it is new."""
+        number = self._numbers.get(table)
+        if number is None:
+            number = self._numbers[table] = len(self.tables)
+            self.tables.append(table)
+        return number
+
+    def add(self, rates):
+        """Number of a RateTable, adding it if no equal table was added before."""
+        factors = rates.factors()
+        parts = [_COUNT.pack(len(factors))]
+        for currency, (numerator, denominator, digits) in factors.items():
+            _pack_str(parts, currency)
+            parts.append(_RATE.pack(numerator, denominator, digits))
+        return self.number(b''.join(parts))
+
+    def adopt(self, record, tables):
+        """`record`, which refers to the encoded `tables` of another snapshot, renumbered into these."""
+        number, = _COUNT.unpack_from(record, 0)
+        return _COUNT.pack(self.number(tables[number])) + bytes(record[_COUNT.size:])
+
+    def encode(self):
+        parts = [_COUNT.pack(len(self.tables))]
+        for table in self.tables:
+            parts.append(_COUNT.pack(len(table)))
+            parts.append(table)
+        return b''.join(parts)
+
+
+def encode_machine(machine, tables, balances=None):
+    """Serialize `machine` (and {key: Money} balances held by its clients) into one record.
+
+    Its rate table is added to `tables` (RateTables), which must be written with the record.
+    """
+    parts = [_COUNT.pack(tables.add(machine.rates))]
+    with machine.locks.all():  # A consistent view of the shelf, not one taken mid-purchase
+        held = machine.holds.held()  # Units held for customers are saved as stock; the holds themselves are not
+        inventory = [(name, details['quantity'] + held.get(name, 0), Money.of(details['price_dollars']).cents)
+                     for name, details in machine.inventory.items()]
+    parts.append(_COUNT.pack(len(inventory)))
+    for name, quantity, cents in inventory:
+        _pack_str(parts, name)
+        parts.append(_ITEM.pack(quantity, cents))
+    cassette = machine.cassette
+    if cassette is None:
+        parts.append(_COUNT.pack(NO_CASSETTE))
+        parts.append(_CENTS.pack(0))
+    else:
+        contents = cassette.contents()
+        parts.append(_COUNT.pack(len(contents)))
+        parts.append(_CENTS.pack(cassette.max_change.cents))
+        for denomination, count in contents.items():
+            parts.append(_ITEM.pack(denomination.cents, count))
+    balances = balances or {}
+    parts.append(_COUNT.pack(len(balances)))
+    for key, balance in balances.items():
+        _pack_str(parts, str(key))
+        parts.append(_CENTS.pack(Money.of(balance).cents))
+    return b''.join(parts)
+
+
+def decode_machine(data, tables):
+    """Parse a record into (inventory, RateTable, CashCassette or None, {key: Money}).
+
+    `tables` are the encoded rate tables of the snapshot the record came from.
+    """
+    view = memoryview(data)
+    position = 0
+
+    def unpack(layout):
+        nonlocal position
+        values = layout.unpack_from(view, position)
+        position += layout.size
+        return values
+
+    def unpack_str():
+        nonlocal position
+        length, = unpack(_LENGTH)
+        text = bytes(view[position:position + length]).decode()
+        position += length
+        return text
+
+    try:
+        table, = unpack(_COUNT)
+        inventory = {}
+        for _ in range(unpack(_COUNT)[0]):
+            name = unpack_str()
+            quantity, cents = unpack(_ITEM)
+            inventory[name] = {'quantity': quantity, 'price_dollars': Money(cents)}
+        rates = _decode_rates(tables[table])  # A RateTable of its own, so reloading rates changes one machine
+        denominations, = unpack(_COUNT)
+        max_change, = unpack(_CENTS)
+        cassette = None
+        if denominations != NO_CASSETTE:
+            counts = {}
+            for _ in range(denominations):
+                cents, count = unpack(_ITEM)
+                counts[Money(cents)] = count
+            cassette = CashCassette(counts, Money(max_change))
+        balances = {}
+        for _ in range(unpack(_COUNT)[0]):
+            key = unpack_str()
+            balances[key] = Money(unpack(_CENTS)[0])
+    except (struct.error, UnicodeDecodeError, IndexError) as e:
+        raise SnapshotError(f"Corrupt machine record: {str(e)}") from None
+    return inventory, rates, cassette, balances
+
+
+def _decode_rates(table):
+    rates = RateTable()
+    count, = _COUNT.unpack_from(table, 0)
+    position = _COUNT.size
+    for _ in range(count):
+        length, = _LENGTH.unpack_from(table, position)
+        position += _LENGTH.size
+        currency = bytes(table[position:position + length]).decode()
+        position += length
+        rates.set_factor(currency, *_RATE.unpack_from(table, position))
+        position += _RATE.size
+    return rates
+
+
+def write_snapshot(path, records, tables):
+    """Atomically write {machine id: encoded record} and the RateTables they refer to to `path`."""
+    ids = sorted(records)
+    index = array('q')
+    offset = HEADER.size + len(ids) * 3 * 8
+    for machine_id in ids:
+        length = len(records[machine_id])
+        index.extend((machine_id, offset, length))
+        offset += length
+    if _SWAP:
+        index.byteswap()
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ids), offset))
+        f.write(index.tobytes())
+        for machine_id in ids:
+            f.write(records[machine_id])
+        f.write(tables.encode())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def save(path, machines, balances=None):
+    """Snapshot {machine id: machine}; `balances` maps machine ids to {key: Money} in flight."""
+    balances = balances or {}
+    tables = RateTables()
+    write_snapshot(path, {machine_id: encode_machine(machine, tables, balances.get(machine_id))
+                          for machine_id, machine in machines.items()}, tables)
+
+
+class SnapshotFile:
+    """A snapshot opened for lazy restores; only the index and rate tables are read up front."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                raise SnapshotError(f"{path} is not a machine snapshot") from None
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise SnapshotError(f"{path} is not a machine snapshot")
+        magic, count, tables_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) < HEADER.size + count * 24:
+            self.close()
+            raise SnapshotError(f"{path} is not a machine snapshot")
+        try:
+            self.tables = self._read_tables(tables_offset)
+        except struct.error:
+            self.close()
+            raise SnapshotError(f"{path} has corrupt rate tables") from None
+        index = array('q')
+        index.frombytes(self._map[HEADER.size:HEADER.size + count * 24])
+        if _SWAP:
+            index.byteswap()
+        self._index = index
+        self._ids = index[0::3]
+        self.path = path
+
+    def _read_tables(self, position):
+        count, = _COUNT.unpack_from(self._map, position)
+        position += _COUNT.size
+        tables = []
+        for _ in range(count):
+            length, = _COUNT.unpack_from(self._map, position)
+            position += _COUNT.size
+            if position + length > len(self._map):
+                raise struct.error("rate table runs past the end of the file")
+            tables.append(self._map[position:position + length])
+            position += length
+        return tables
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, machine_id):
+        return self._find(machine_id) is not None
+
+    def ids(self):
+        return list(self._ids)
+
+    def _find(self, machine_id):
+        position = bisect.bisect_left(self._ids, machine_id)  # The index is sorted by machine id
+        return position if position < len(self._ids) and self._ids[position] == machine_id else None
+
+    def record(self, machine_id):
+        position = self._find(machine_id)
+        if position is None:
+            raise KeyError(machine_id)
+        offset, length = self._index[3 * position + 1], self._index[3 * position + 2]
+        return self._map[offset:offset + length]
+
+    def restore(self, machine_id, machine):
+        """Load the saved state of `machine_id` into `machine`; returns the saved {key: Money} balances."""
+        inventory, rates, cassette, balances = decode_machine(self.record(machine_id), self.tables)
+        if balances:
+            logging.warning(f"Machine {machine_id} was snapshotted holding unspent balances: "
+                            + ', '.join(f"{key} ${balance:.2f}" for key, balance in balances.items()))
+        machine.rates = rates
+        machine.cassette = cassette
+        machine.holds.discard_all()
+        machine.inventory = inventory
+        machine.notify('reset', inventory=inventory)
+        return balances
+
+    def close(self):
+        self._map.close()
+
+
+def snapshot_every(path, machines, interval=60.0, balances=None):
+    """Save `machines` to `path` every `interval` seconds from a daemon thread; set the returned event to stop.
+
+    `balances`, if given, is called before each snapshot and returns {machine id: {key: Money}}.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                save(path, machines, balances() if balances else None)
+            except OSError as e:
+                logging.error(f"Error in writing snapshot: {str(e)}")
+
+    threading.Thread(target=loop, daemon=True).start()
+    return stop
@@ -1,20 +1,46 @@
+import asyncio
+import itertools
+import math
+import random
+import json
+import os
+import tempfile
+import time
 import unittest
-from unittest.mock import patch
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import call, patch
 from io import StringIO
 
+import Catalog
+import ColumnarInventory
+import Fleet
+import Journal
+import ExchangeRates
+import Holds
+import Metrics
+import Pricing
+import Replay
+import Snapshot
+from CashCassette import CashCassette
+try:
+    import RestockPlanner
+    import SalesAnalytics
+except ImportError:  # NumPy is not installed
+    RestockPlanner = SalesAnalytics = None
+import LoadGenerator
 import VendingMachine
-from VendingMachine import Machine, Client, Administrator
+import Simulation
+import VendingServer
+from Money import Money, RateTable, DEFAULT_RATES
+from Planogram import load_inventory, load_planogram, PlanogramError
+from VendingMachine import Machine, Client, Administrator, PurchaseResult, Reservation
 
 class TestVendingMachine(unittest.TestCase):
 
     def setUp(self):
         # Reset the machine inventory before each test
-        Machine.inventory = {
-            'sprite': {'quantity': 10, 'price_dollars': 3.5},
-            'coca-cola': {'quantity': 15, 'price_dollars': 5.0},
-            'doritos': {'quantity': 1, 'price_dollars': 2.5},
-            'snickers': {'quantity': 12, 'price_dollars': 2.0}
-        }
+        Machine.inventory = load_inventory()
 
     def test_display_items(self):
         with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
@@ -60,7 +86,7 @@ Available Items:
         with patch('builtins.input', side_effect=['10']):
             result = client.insert_cash(False)
         self.assertTrue(result)  # Successful cash insertion
-        self.assertEqual(client.balance, 0.29 * 10)  # Balance updated correctly based on exchange rate
+        self.assertEqual(client.balance, Money.of('2.90'))  # Exact conversion at the exchange rate
 
     def test_insert_invalid_cash(self):
         client = Client()
@@ -237,7 +263,7 @@ Available Items:
         with patch('builtins.input', side_effect=['admin123', 'invalid', '3']):
             with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
                 VendingMachine.run_administrator_menu()
-        self.assertIn("Invalid choice. Please enter 1, 2, or 3.", mock_stdout.getvalue())
+        self.assertIn("Invalid choice. Please enter 1, 2, 3, or 4.", mock_stdout.getvalue())
         self.assertIn("Exiting the administrator menu. Returning to the main menu.", mock_stdout.getvalue())
 
     def test_run_administrator_menu_refill_stock_invalid_password_then_exit(self):
@@ -253,5 +279,1462 @@ Available Items:
                 Administrator.reset_machine()
                 mock_print.assert_called_with("-->Machine has been reset.")
 
+class TestTransactionEngine(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+
+    def test_purchase_success(self):
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            result = Machine.purchase('Sprite', 5, 'dollars')
+        self.assertEqual(mock_stdout.getvalue(), "")  # No console I/O on the hot path
+        self.assertTrue(result.success)
+        self.assertEqual(result.item, 'sprite')
+        self.assertEqual(result.change, 1.5)
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 9)
+
+    def test_purchase_insufficient_funds(self):
+        result = Machine.purchase('coca-cola', 10, 'shekels')
+        self.assertEqual(result.status, PurchaseResult.INSUFFICIENT_FUNDS)
+        self.assertEqual(Machine.inventory['coca-cola']['quantity'], 15)
+
+    def test_purchase_sold_out(self):
+        self.assertTrue(Machine.purchase('doritos', 5).success)
+        result = Machine.purchase('doritos', 5)
+        self.assertEqual(result.status, PurchaseResult.UNAVAILABLE)
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 0)
+
+    def test_purchase_unsupported_currency(self):
+        with self.assertRaises(ValueError):
+            Machine.purchase('sprite', 5, 'doubloons')
+
+    def test_client_programmatic_session(self):
+        client = Client()
+        client.currency = 'dollars'
+        client.deposit(2)
+        self.assertTrue(client.choose_item('snickers'))
+        result = client.checkout()
+        self.assertTrue(result.success)
+        self.assertEqual(client.balance, 0)
+        self.assertFalse(client.choose_item('no-such-item'))
+
+    def test_restock_requires_price_for_new_item(self):
+        with self.assertRaises(ValueError):
+            Administrator.restock('water', 3)
+        self.assertTrue(Administrator.restock('water', 3, 1.0))
+        self.assertFalse(Administrator.restock('water', 2))
+        self.assertEqual(Machine.inventory['water'], {'quantity': 5, 'price_dollars': 1.0})
+        for price in (0, '-1.25'):
+            with self.assertRaises(ValueError):
+                Administrator.restock('tea', 3, price)
+        self.assertNotIn('tea', Machine.inventory)
+
+
+class TestConcurrentInventory(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+
+    def test_reserve_commit_release(self):
+        reservation = Machine.reserve('sprite', 3)
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 7)
+        self.assertTrue(Machine.release(reservation))
+        self.assertFalse(Machine.release(reservation))  # Releasing twice must not restock twice
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 10)
+        reservation = Machine.reserve('doritos')
+        self.assertIsNone(Machine.reserve('doritos'))
+        self.assertTrue(Machine.commit(reservation))
+        self.assertEqual(reservation.state, Reservation.COMMITTED)
+        self.assertFalse(Machine.release(reservation))
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 0)
+
+    def test_no_overselling_under_contention(self):
+        Machine.inventory['sprite']['quantity'] = 50
+
+        def buy(item):
+            return Machine.purchase(item, 10).success
+
+        attempts = ['doritos', 'sprite', 'snickers', 'coca-cola'] * 500
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            outcomes = list(pool.map(buy, attempts))
+        sold = {}
+        for item, success in zip(attempts, outcomes):
+            sold[item] = sold.get(item, 0) + success
+        self.assertEqual(sold, {'doritos': 1, 'sprite': 50, 'snickers': 12, 'coca-cola': 15})
+        for details in Machine.inventory.values():
+            self.assertEqual(details['quantity'], 0)
+
+    def test_concurrent_refill_and_purchase(self):
+        def refill(_):
+            Administrator.restock('snickers', 1, 2.0)
+
+        def buy(_):
+            return Machine.purchase('snickers', 10).success
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            refills = pool.map(refill, range(200))
+            bought = sum(pool.map(buy, range(100)))
+            list(refills)
+        self.assertEqual(Machine.inventory['snickers']['quantity'], 12 + 200 - bought)
+
+
+class TestVendingServer(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+
+    def test_session_protocol(self):
+        session = VendingServer.Session()
+        self.assertFalse(session.handle({'op': 'select', 'item': 'water'})['ok'])
+        self.assertEqual(session.handle({'op': 'insert', 'amount': 5})['balance'], '5.00')
+        self.assertTrue(session.handle({'op': 'select', 'item': 'sprite'})['ok'])
+        response = session.handle({'op': 'buy'})
+        self.assertEqual(response['status'], PurchaseResult.OK)
+        self.assertEqual(response['change'], '1.50')
+        self.assertFalse(session.handle({'op': 'reset'})['ok'])  # Administrator login required
+        self.assertFalse(session.handle({'op': 'bogus'})['ok'])
+        self.assertFalse(session.handle({'op': 'insert'})['ok'])  # Missing amount is reported, not raised
+
+    def test_malformed_fields_are_reported(self):
+        session = VendingServer.Session()
+        self.assertEqual(session.handle({'op': 'select', 'item': 5}), {'ok': False, 'error': "item must be a string, got 5"})
+        self.assertFalse(session.handle({'op': 'purchase', 'item': None, 'amount': 5})['ok'])
+        self.assertTrue(session.handle({'op': 'login', 'password': Administrator.PASSWORD})['ok'])
+        self.assertFalse(session.handle({'op': 'refill', 'item': None, 'quantity': 5})['ok'])
+        response = session.handle({'op': 'refill', 'item': 'sprite', 'quantity': -100})
+        self.assertIn('positive', response['error'])
+        self.assertFalse(session.handle({'op': 'refill', 'item': 'sprite', 'quantity': 0})['ok'])
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 10)
+        self.assertTrue(session.handle({'op': 'refill', 'item': 'sprite', 'quantity': '2'})['ok'])
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 12)
+        for quantity in (2.9, True, '2.9', None):
+            response = session.handle({'op': 'refill', 'item': 'sprite', 'quantity': quantity})
+            self.assertEqual(response, {'ok': False, 'error': f"quantity must be a whole number, got {quantity!r}"})
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 12)
+
+    def test_server_and_load_generator(self):
+        async def scenario():
+            server = await VendingServer.start_server(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b'not json\n' + json.dumps({'op': 'catalog'}).encode() + b'\n')
+                malformed = json.loads(await reader.readline())
+                catalog = json.loads(await reader.readline())
+                writer.close()
+                stats = await LoadGenerator.run_load(port=port, sessions=40, concurrency=10, item='doritos')
+            return malformed, catalog, stats
+
+        malformed, catalog, stats = asyncio.run(scenario())
+        self.assertFalse(malformed['ok'])
+        self.assertEqual([item['name'] for item in catalog['items']], ['sprite', 'coca-cola', 'doritos', 'snickers'])
+        self.assertEqual(stats['outcomes'], {PurchaseResult.OK: 40})
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 1)
+        self.assertGreater(stats['p99_ms'], 0)
+
+
+class TestMoney(unittest.TestCase):
+
+    def test_parse_and_format(self):
+        self.assertEqual(Money.of('3.505').cents, 351)  # Rounds half-up to the cent
+        self.assertEqual(Money.of(2).cents, 200)
+        self.assertEqual(f"{Money.of(0.1) + Money.of(0.2):.2f}", "0.30")
+        self.assertEqual(str(Money(-5)), "-0.05")
+        for invalid in ['abc', 'nan', 'inf', '', True, '1e999999', '1e9999', '9' * 20, 10 ** 30]:
+            with self.assertRaises(ValueError):
+                Money.of(invalid)
+        with self.assertRaises(ValueError):
+            RateTable(DEFAULT_RATES).to_money('1e999999', 'shekels')
+        self.assertEqual(Money.of('1e-999999'), Money(0))
+        session = VendingServer.Session()
+        self.assertFalse(session.handle({'op': 'insert', 'amount': '1e999999'})['ok'])
+
+    def test_exact_comparisons_with_numbers(self):
+        self.assertEqual(Money.of('3.50'), 3.5)
+        self.assertNotEqual(Money.of('0.30'), 0.1 + 0.2)  # Float drift is not silently absorbed
+        self.assertEqual(Money.of(2.9), 2.9)  # Floats compare as Money.of reads them
+        self.assertEqual(Money.of(0.1), 0.1)
+        self.assertLess(Money.of('0.10'), 0.11)
+        self.assertLess(Money.of('1.99'), 2)
+        self.assertEqual(hash(Money.of('2.50')), hash(2.5))
+        self.assertEqual(sum([Money.of('0.10')] * 10), Money.of(1))
+
+    def test_rate_table(self):
+        rates = RateTable({'dollars': ('1', 2), 'shekels': ('0.29', 2), 'yen': ('0.0067', 0)})
+        self.assertEqual(rates.to_money('10', 'shekels'), Money.of('2.90'))
+        self.assertEqual(rates.to_money('0.05', 'shekels'), Money(1))  # 1.45 cents rounds to 1
+        self.assertEqual(rates.to_money(1000, 'yen'), Money.of('6.70'))
+        self.assertEqual(rates.from_money(Money.of('2.90'), 'shekels'), Decimal('10.00'))
+        self.assertEqual(rates.from_money(Money.of('6.70'), 'yen'), Decimal('1000'))
+        self.assertIn('yen', rates)
+        with self.assertRaises(ValueError):
+            rates.to_money(1, 'doubloons')
+
+    def test_change_has_no_drift(self):
+        client = Client()
+        client.currency = 'shekels'
+        total_change = Money(0)
+        for _ in range(10000):
+            client.deposit('10')
+            total_change += client.balance - Money.of('2.50')
+            client.refund()
+        self.assertEqual(total_change, Money.of('4.00') * 1000)
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'machine.journal')
+
+    def run_sales(self):
+        journal = Journal.open_journal(self.path, batch_size=8)
+        try:
+            Machine.purchase('sprite', 5)
+            Machine.purchase('doritos', 5)
+            Administrator.restock('water', 4, '1.25')
+            client = Client()
+            client.currency = 'dollars'
+            client.deposit(3)
+            client.refund()
+        finally:
+            Journal.close_journal(journal)
+        return journal
+
+    def test_recover_replays_events(self):
+        self.run_sales()
+        expected = Journal.encode_inventory(Machine.inventory)
+        Administrator.reset_inventory()
+        journal = Journal.open_journal(self.path)
+        Journal.close_journal(journal)
+        self.assertEqual(Journal.encode_inventory(Machine.inventory), expected)
+        self.assertEqual(Machine.inventory['water'], {'quantity': 4, 'price_dollars': Money.of('1.25')})
+        with open(self.path) as f:
+            events = [json.loads(line)['event'] for line in f]
+        self.assertEqual(events, ['reset', 'vend', 'vend', 'refill', 'refund'])
+
+    def test_append_returns_once_fsynced(self):
+        journal = Journal.Journal(self.path)
+        with patch('os.fsync') as mock_fsync:
+            journal.append({'event': 'refund', 'amount': '1.00'})
+            self.assertEqual(mock_fsync.call_count, 1)
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        journal.close()
+
+    def test_group_commit_batches_fsync(self):
+        journal = Journal.Journal(self.path)
+        fsync = os.fsync
+
+        def slow_fsync(descriptor):
+            time.sleep(0.002)  # A disk flush, long enough for other appends to queue up
+            fsync(descriptor)
+
+        with patch('os.fsync', side_effect=slow_fsync) as mock_fsync:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda i: journal.append({'event': 'refund', 'amount': '1.00'}), range(200)))
+            self.assertLess(mock_fsync.call_count, 100)
+        journal.close()
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 200)
+
+    def test_group_commit_waits_for_batch(self):
+        journal = Journal.Journal(self.path, batch_size=4, flush_interval=60)
+        with patch('os.fsync') as mock_fsync:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(lambda i: journal.append({'event': 'refund', 'amount': '1.00'}), range(4)))
+            self.assertEqual(mock_fsync.call_count, 1)
+        journal.close()
+
+    def test_snapshot_and_torn_tail(self):
+        journal = Journal.open_journal(self.path)
+        Machine.purchase('sprite', 5)
+        journal.snapshot()
+        Machine.purchase('sprite', 5)
+        Journal.close_journal(journal)
+        with open(self.path, 'ab') as f:
+            f.write(b'{"event":"vend","item":"spr')  # Crash in the middle of a write
+        Administrator.reset_inventory()
+        inventory, length = Journal.recover(self.path)
+        self.assertEqual(inventory['sprite']['quantity'], 8)
+        self.assertLess(length, os.path.getsize(self.path))
+        journal = Journal.open_journal(self.path)
+        Machine.purchase('snickers', 5)
+        Journal.close_journal(journal)
+        self.assertEqual(Journal.recover(self.path)[0]['snickers']['quantity'], 11)
+
+
+    def test_snapshot_keeps_held_units(self):
+        journal = Journal.open_journal(self.path)
+        try:
+            client = Client()
+            self.assertTrue(client.choose_item('snickers'))
+            journal.snapshot()
+            client.refund()
+        finally:
+            Journal.close_journal(journal)
+        inventory, _ = Journal.recover(self.path)
+        self.assertEqual(inventory['snickers']['quantity'], 12)
+
+    def test_snapshot_between_sale_and_its_record(self):
+        journal = Journal.open_journal(self.path)
+        try:
+            Machine.inventory['sprite']['quantity'] -= 1  # The sale has landed on the shelf...
+            journal.snapshot()
+            journal('vend', {'item': 'sprite', 'quantity': 1, 'price': Money(350)})  # ...before its record
+        finally:
+            Journal.close_journal(journal)
+        self.assertEqual(Journal.recover(self.path)[0]['sprite']['quantity'], 9)
+
+    def test_snapshots_are_scheduled(self):
+        journal = Journal.open_journal(self.path, snapshot_every=3)
+        try:
+            for _ in range(7):
+                Machine.purchase('sprite', 5)
+        finally:
+            Journal.close_journal(journal)
+        self.assertEqual(Journal.segments(self.path),
+                         [self.path + '.0', self.path + '.1', self.path])  # Reset + 2 sales, 3 sales, 2 sales
+        with open(self.path) as f:
+            self.assertEqual([json.loads(line)['event'] for line in f], ['begin', 'vend', 'vend'])
+        self.assertEqual(Journal.recover(self.path)[0]['sprite']['quantity'], 3)
+        sales = 0
+        for segment in Journal.segments(self.path):
+            with open(segment) as f:
+                sales += sum(json.loads(line)['event'] == 'vend' for line in f)
+        self.assertEqual(sales, 7)
+
+    def test_interrupted_rotation(self):
+        journal = Journal.open_journal(self.path)
+        Machine.purchase('sprite', 5)
+        replace, calls = os.replace, []
+
+        def crash_after_snapshot(source, destination):
+            calls.append(source)
+            if len(calls) > 2:  # New segment and snapshot are in place; the journal swap never happens
+                raise OSError("crash")
+            replace(source, destination)
+
+        with patch('os.replace', side_effect=crash_after_snapshot):
+            with self.assertRaises(OSError):
+                journal.snapshot()
+        Journal.close_journal(journal)
+        self.assertEqual(Journal.recover(self.path)[0]['sprite']['quantity'], 9)
+        journal = Journal.open_journal(self.path)
+        Machine.purchase('sprite', 5)
+        Journal.close_journal(journal)
+        self.assertEqual(Journal.recover(self.path)[0]['sprite']['quantity'], 8)
+        self.assertTrue(os.path.exists(self.path + '.0'))
+
+class TestColumnarInventory(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'inventory.cols')
+        self.store = ColumnarInventory.ColumnarInventory.from_mapping(Machine.inventory, capacity=8, path=self.path)
+        self.addCleanup(self.store.close)
+        Machine.inventory = self.store
+        self.addCleanup(setattr, Machine, 'inventory', load_inventory())
+
+    def test_machine_interface(self):
+        self.assertTrue(Machine.purchase('sprite', 5).success)
+        self.assertEqual(Machine.inventory['sprite'], {'quantity': 9, 'price_dollars': 3.5})
+        self.assertEqual(Machine.get_item_price('snickers'), Money.of('2.00'))
+        self.assertEqual(Machine.get_item_price('non-existent-item'), 0)
+        self.assertTrue(Administrator.restock('water', 4, '1.25'))
+        self.assertEqual(len(self.store), 5)
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            Machine.display_items()
+        self.assertIn("- Coca-Cola: $5.00\n- Doritos: $2.50\n- Snickers: $2.00\n- Water: $1.25", mock_stdout.getvalue())
+
+    def test_read_only_mapping_shares_writes(self):
+        reader = ColumnarInventory.ColumnarInventory.open(self.path, readonly=True)
+        self.addCleanup(reader.close)
+        Machine.purchase('doritos', 5)
+        Administrator.restock('water', 4, '1.25')
+        self.assertEqual(reader['doritos']['quantity'], 0)
+        self.assertEqual(reader.keys(), ['sprite', 'coca-cola', 'doritos', 'snickers', 'water'])
+        with self.assertRaises(TypeError):
+            reader['doritos']['quantity'] = 5
+        with self.assertRaises(TypeError):
+            reader['tea'] = {'quantity': 1, 'price_dollars': 1}
+
+    def test_capacity_and_name_limits(self):
+        for i in range(4):
+            self.store[f'item-{i}'] = {'quantity': 1, 'price_dollars': 1}
+        with self.assertRaises(ValueError):
+            self.store['one-too-many'] = {'quantity': 1, 'price_dollars': 1}
+        with self.assertRaises(ValueError):
+            self.store['x' * 40] = {'quantity': 1, 'price_dollars': 1}
+        self.assertNotIn('x' * 40, self.store)
+
+    def test_planogram_is_all_or_nothing(self):
+        events = []
+        listener = lambda event, details: events.append(event)
+        Machine.subscribe(listener)
+        self.addCleanup(Machine.unsubscribe, listener)
+        too_many = [('sprite', 5, None)] + [(f'item-{i}', 1, Money(100)) for i in range(5)]
+        too_long = [('sprite', 5, None), ('x' * 40, 1, Money(100))]
+        for rows in (too_many, too_long):
+            with self.assertRaises(PlanogramError):
+                Administrator.apply_planogram(rows)
+        self.assertEqual(self.store['sprite']['quantity'], 10)
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(events, [])
+        self.assertEqual(Administrator.apply_planogram(too_many[:5]), (1, 4))
+        self.assertEqual(events, ['refill'] * 5)
+
+    def test_concurrent_new_items(self):
+        store = ColumnarInventory.ColumnarInventory.create(4000)
+        machine = Machine(store)
+
+        def add(worker):
+            for i in range(1000):
+                Administrator(machine).restock(f'item-{worker}-{i}', 1, '1.00')
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(add, range(4)))
+        self.assertEqual(len(store), 4000)
+        self.assertEqual(sorted(store), sorted(f'item-{worker}-{i}' for worker in range(4) for i in range(1000)))
+        self.assertTrue(all(store[name]['quantity'] == 1 for name in store))
+
+    def test_reset_keeps_the_store(self):
+        Machine.purchase('sprite', 5)
+        Administrator.restock('water', 4, '1.25')
+        Administrator.reset_inventory()
+        self.assertIs(Machine.inventory, self.store)
+        self.assertEqual(self.store.keys(), ['sprite', 'coca-cola', 'doritos', 'snickers'])
+        self.assertEqual(self.store['sprite']['quantity'], 10)
+        self.assertNotIn('water', self.store)
+        reader = ColumnarInventory.ColumnarInventory.open(self.path, readonly=True)
+        self.addCleanup(reader.close)
+        self.assertEqual(len(reader), 4)
+
+    def test_reset_holds_every_stripe(self):
+        reset = self.store.reset
+        locked = []
+
+        def checked_reset(inventory):
+            locked.append(all(lock.locked() for lock in Machine.locks._locks))
+            reset(inventory)
+
+        with patch.object(self.store, 'reset', side_effect=checked_reset):
+            Administrator.reset_inventory()
+        self.assertEqual(locked, [True])
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+
+    def test_sorted_pages(self):
+        by_price = Machine.catalog.page(Machine.inventory, sort='price')
+        self.assertEqual([item for item, name, price in by_price], ['snickers', 'doritos', 'sprite', 'coca-cola'])
+        by_name = Machine.catalog.page(Machine.inventory, page=1, size=3, sort='name', descending=True)
+        self.assertEqual(by_name, [('coca-cola', 'Coca-Cola', Money.of('5.00'))])
+        with self.assertRaises(ValueError):
+            Machine.catalog.page(Machine.inventory, sort='colour')
+
+    def test_rebuild_matches_incremental_index(self):
+        generator = random.Random(3)
+        inventory = {f'item {generator.randrange(10 ** 6)}': {'quantity': generator.randrange(3),
+                                                              'price_dollars': Money(generator.randrange(1, 500))}
+                     for _ in range(500)}
+        rebuilt = Catalog.Catalog()
+        rebuilt.count(inventory)
+        incremental = Catalog.Catalog()
+        incremental._rebuild({})
+        incremental._inventory = inventory
+        for item in inventory:
+            incremental._update(item)
+        self.assertEqual(rebuilt._orders, incremental._orders)
+        self.assertEqual(rebuilt._sorted_names, incremental._sorted_names)
+        self.assertEqual((rebuilt._by_code, rebuilt._keys), (incremental._by_code, incremental._keys))
+
+    def test_display_items_paginated(self):
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            Machine.display_items(page=1, page_size=2, sort='price')
+        self.assertIn("- Sprite: $3.50\n- Coca-Cola: $5.00\nPage 2 of 2", mock_stdout.getvalue())
+
+    def test_index_follows_events_without_rebuild(self):
+        Machine.catalog.page(Machine.inventory)
+        with patch.object(Catalog.Catalog, '_rebuild') as mock_rebuild:
+            Machine.purchase('doritos', 5)
+            Administrator.restock('water', 2, '0.75')
+            Administrator.restock('sprite', 1, '4.00')
+            items = Machine.catalog.page(Machine.inventory, sort='price')
+        mock_rebuild.assert_not_called()
+        self.assertEqual([item for item, name, price in items], ['water', 'snickers', 'sprite', 'coca-cola'])
+        self.assertEqual(Machine.catalog.count(Machine.inventory), 4)
+
+    def test_unsignalled_sell_out_is_dropped(self):
+        Machine.catalog.page(Machine.inventory)
+        Machine.inventory['sprite']['quantity'] = 0
+        items = Machine.catalog.page(Machine.inventory, size=2)
+        self.assertEqual([item for item, name, price in items], ['coca-cola', 'doritos'])
+
+    def test_lookup_normalization_aliases_and_slot_codes(self):
+        self.assertEqual(Machine.lookup('Coca Cola'), 'coca-cola')
+        self.assertEqual(Machine.lookup('COCA_COLA'), 'coca-cola')
+        self.assertEqual(Machine.lookup('coke'), 'coca-cola')
+        self.assertEqual(Machine.lookup('a3'), 'doritos')
+        self.assertIsNone(Machine.lookup('pepsi'))
+        self.assertEqual(Catalog.slot_code(9), 'A10')
+        self.assertEqual(Catalog.slot_code(10), 'B1')
+        self.assertEqual(Catalog.slot_code(26 * 10), 'AA1')
+        Administrator.restock('water', 2, '0.75')
+        self.assertEqual(Machine.catalog.slot_code_of(Machine.inventory, 'water'), 'A5')
+        client = Client()
+        self.assertTrue(client.choose_item('A5'))
+        self.assertEqual(client.selected_item, 'water')
+
+    def test_suggestions(self):
+        self.assertEqual(Machine.suggest('sn'), ['snickers'])
+        self.assertEqual(Machine.suggest('dorito'), ['doritos'])
+        self.assertEqual(Machine.suggest('spirte'), ['sprite'])
+        Machine.purchase('doritos', 5)
+        self.assertEqual(Machine.suggest('dor'), [])  # Sold out items are not suggested
+        client = Client()
+        with patch('builtins.input', side_effect=['snikers', 'cancel']):
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                client.select_item()
+        self.assertIn("-->Did you mean: Snickers?", mock_stdout.getvalue())
+
+    def test_display_name_cached(self):
+        self.assertEqual(Catalog.display_name('coca-cola'), 'Coca-Cola')
+        self.assertEqual(Catalog.display_name('peanut butter cups'), 'Peanut Butter Cups')
+        hits = Catalog.display_name.cache_info().hits
+        Catalog.display_name('coca-cola')
+        self.assertEqual(Catalog.display_name.cache_info().hits, hits + 1)
+
+
+class TestPlanogram(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_csv_import(self):
+        path = self.write('route.csv', "item,quantity,price\nSprite,5,\nwater,20,1.25\nwater,5,\nsnickers,3,2.25\n")
+        self.assertEqual(Administrator.apply_planogram(load_planogram(path)), (3, 1))
+        self.assertEqual(Machine.inventory['sprite'], {'quantity': 15, 'price_dollars': 3.5})
+        self.assertEqual(Machine.inventory['water'], {'quantity': 25, 'price_dollars': 1.25})
+        self.assertEqual(Machine.inventory['snickers'], {'quantity': 15, 'price_dollars': 2.25})
+        self.assertEqual(Machine.lookup('WATER'), 'water')
+
+    def test_json_formats(self):
+        path = self.write('route.json', json.dumps({'tea': {'quantity': 4, 'price_dollars': '1.10'}}))
+        Administrator.apply_planogram(load_planogram(path))
+        path = self.write('route.jsonl', '{"item": "tea", "quantity": 1}\n\n{"item": "doritos", "quantity": 2}\n')
+        Administrator.apply_planogram(load_planogram(path))
+        self.assertEqual(Machine.inventory['tea'], {'quantity': 5, 'price_dollars': Money.of('1.10')})
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 3)
+
+    def test_invalid_rows_change_nothing(self):
+        path = self.write('route.csv', "item,quantity,price\nsprite,5,\n,1,1\nwater,-1,1\ntea,1,free\n")
+        with self.assertRaises(PlanogramError) as context:
+            load_planogram(path)
+        self.assertEqual(len(context.exception.errors), 3)
+        self.assertIn("row 3: missing item name", context.exception.errors[0])
+        path = self.write('route.csv', "item,quantity,price\nsprite,5,\nwater,2,\n")
+        with self.assertRaises(PlanogramError):
+            Administrator.apply_planogram(load_planogram(path))
+        self.assertEqual(Machine.inventory, load_inventory())
+        with self.assertRaises(PlanogramError):
+            load_planogram(self.write('route.xml', '<planogram/>'))
+
+    def test_menu_import(self):
+        path = self.write('route.csv', "item,quantity,price\nsprite,5,\n")
+        with patch('builtins.input', side_effect=['admin123', '4', path, '4', 'missing.csv', '3']):
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                VendingMachine.run_administrator_menu()
+        output = mock_stdout.getvalue()
+        self.assertIn("-->Planogram applied: 1 items refilled, 0 new items added.", output)
+        self.assertIn("-->Planogram rejected, no changes were made:", output)
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 15)
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+        self.addCleanup(Administrator.reset_inventory)
+
+    def test_simulation_report(self):
+        profile = Simulation.TrafficProfile(currency_mix={'dollars': 1, 'shekels': 1, 'yen': 1},
+                                            insufficient_funds_rate=0.3, cancel_rate=0.2, restock_quantity=5)
+        refilled = []
+        listener = lambda event, details: refilled.append(details['quantity']) if event == 'refill' else None
+        Machine.subscribe(listener)
+        self.addCleanup(Machine.unsubscribe, listener)
+        before = sum(details['quantity'] for details in Machine.inventory.values())
+        report = Simulation.Simulation(profile, seed=3).run(500)
+        self.assertEqual(sum(report['outcomes'].values()), 500)
+        self.assertEqual(set(report['outcomes']), {PurchaseResult.OK, 'cancel'})
+        self.assertLessEqual(report['p50_us'], report['p99_us'])
+        after = sum(details['quantity'] for details in Machine.inventory.values())
+        self.assertEqual(before + sum(refilled) - after, report['outcomes'][PurchaseResult.OK])
+
+    def test_plan_is_reproducible(self):
+        self.assertEqual(Simulation.Simulation(seed=1).plan(50), Simulation.Simulation(seed=1).plan(50))
+        plans = Simulation.Simulation(Simulation.TrafficProfile(popularity_skew=3), seed=1).plan(1000)
+        self.assertGreater(sum(1 for item, _, _ in plans if item == 'sprite'), 700)
+
+    def test_paced_threaded_run(self):
+        report = Simulation.Simulation(Simulation.TrafficProfile(arrival_rate=20000), seed=2).run(100, threads=4)
+        self.assertEqual(sum(report['outcomes'].values()), 100)
+
+
+class TestMachineInstances(unittest.TestCase):
+
+    def setUp(self):
+        Administrator.reset_inventory()
+
+    def test_instances_are_independent(self):
+        first, second = Machine(), Machine()
+        self.assertTrue(first.purchase('doritos', 5).success)
+        self.assertEqual(first.inventory['doritos']['quantity'], 0)
+        self.assertEqual(second.inventory['doritos']['quantity'], 1)
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 1)  # The default machine is untouched
+        Administrator(second).restock('water', 2, '1.00')
+        self.assertNotIn('water', first.inventory)
+        self.assertNotIn('water', Machine.inventory)
+        self.assertEqual(second.lookup('WATER'), 'water')
+
+    def test_client_and_menus_on_an_instance(self):
+        machine = Machine()
+        client = Client(machine)
+        client.currency = 'dollars'
+        client.deposit(5)
+        self.assertTrue(client.choose_item('sprite'))
+        self.assertTrue(client.checkout().success)
+        self.assertEqual(machine.inventory['sprite']['quantity'], 9)
+        self.assertEqual(Machine.inventory['sprite']['quantity'], 10)
+        with patch('builtins.input', side_effect=['admin123', '2', 'snickers', '3', '3']):
+            with patch('sys.stdout', new_callable=StringIO):
+                VendingMachine.run_administrator_menu(machine)
+        self.assertEqual(machine.inventory['snickers']['quantity'], 15)
+        self.assertEqual(Machine.inventory['snickers']['quantity'], 12)
+
+
+class TestFleet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fleet = Fleet.Fleet(machines=10, workers=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fleet.close()
+
+    def test_routing_and_aggregation(self):
+        self.assertTrue(self.fleet.purchase(4, 'doritos', '5').success)
+        self.assertEqual(self.fleet.purchase(4, 'doritos', '5').status, PurchaseResult.UNAVAILABLE)
+        self.assertTrue(self.fleet.restock(4, 'doritos', 3, '2.50'))  # Sold out, so it is re-added
+        results = self.fleet.run_sessions([(machine_id, 'sprite', '10', 'dollars') for machine_id in range(10)] +
+                                          [(7, 'snickers', '1', 'dollars')])
+        self.assertEqual([result.status for result in results], [PurchaseResult.OK] * 10 + [PurchaseResult.INSUFFICIENT_FUNDS])
+        self.assertEqual(results[0].change, Money.of('6.50'))
+        machines, totals = self.fleet.stock_view()
+        self.assertEqual(len(machines), 10)
+        self.assertEqual(machines[3]['doritos'], 1)
+        self.assertEqual(machines[4]['doritos'], 3)
+        self.assertEqual(totals['sprite'], 90)
+        sales = self.fleet.sales_view()
+        self.assertEqual(sales['sprite'], (10, Money.of('35.00')))
+        self.assertEqual(sales['doritos'], (1, Money.of('2.50')))
+
+    def test_errors_are_reported(self):
+        with self.assertRaises(ValueError):
+            self.fleet.purchase(10, 'sprite', '5')
+        with self.assertRaises(ValueError):
+            self.fleet.restock(2, 'tea', 1)  # New items need a price
+        with self.assertRaises(ValueError):
+            self.fleet.purchase(2, 'sprite', '5', 'doubloons')
+
+
+@unittest.skipIf(RestockPlanner is None, "NumPy is not installed")
+class TestRestockPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.planner = RestockPlanner.RestockPlanner(half_life=600, clock=lambda: self.now)
+        self.machine = Machine()
+        self.machine.inventory['sprite']['quantity'] = 1000
+        self.planner.attach(self.machine, machine_id=7)
+
+    def sell(self, item, count, interval):
+        for _ in range(count):
+            self.now += interval
+            self.machine.purchase(item, 10)
+
+    def test_rate_tracks_sales_and_decays(self):
+        self.sell('sprite', 600, 6.0)  # One sale every 6 seconds for an hour
+        rates, seconds = self.planner.forecast()
+        row = self.planner.keys.index((7, 'sprite'))
+        self.assertAlmostEqual(rates[row], 1 / 6, delta=0.05 / 6)
+        self.assertAlmostEqual(seconds[row], 400 / rates[row])
+        self.assertEqual(seconds[self.planner.keys.index((7, 'doritos'))], float('inf'))
+        later_rates, _ = self.planner.forecast(now=self.now + 600)
+        self.assertAlmostEqual(later_rates[row], rates[row] / 2)
+
+    def test_plan_orders_by_urgency(self):
+        self.sell('snickers', 11, 60.0)  # One left, selling once a minute
+        self.sell('sprite', 20, 6.0)
+        plan = self.planner.plan(horizon=3600, cover=24 * 3600, par_level=40)
+        self.assertEqual([key for key, _, _ in plan], [(7, 'snickers')])
+        (key, quantity, seconds), = plan
+        self.assertLess(seconds, 600)
+        self.assertEqual(quantity, 40 - 1)  # Capped at the par level
+        self.assertEqual(len(self.planner), 4)
+
+    def test_combine_and_reset(self):
+        other = RestockPlanner.RestockPlanner(half_life=600, clock=lambda: self.now)
+        other.observe_stock((8, 'sprite'), 5)
+        self.sell('coca-cola', 15, 30.0)
+        combined = RestockPlanner.RestockPlanner.combine([self.planner.state(), other.state()],
+                                                         half_life=600, clock=lambda: self.now)
+        self.assertEqual(len(combined), 5)
+        self.assertEqual(combined.plan(horizon=3600, cover=3600)[0][0], (7, 'coca-cola'))
+        self.assertEqual(self.planner.plan(horizon=3600)[0][2], 0.0)  # Sold out
+        Administrator(self.machine).reset_inventory()
+        rates, seconds = self.planner.forecast()
+        row = self.planner.keys.index((7, 'coca-cola'))
+        self.assertAlmostEqual(seconds[row], 15 / rates[row])
+
+    def test_fleet_restock_plan(self):
+        with Fleet.Fleet(machines=4, workers=2) as fleet:
+            fleet.run_sessions([(machine_id, 'snickers', '5', 'dollars') for machine_id in (1, 2) for _ in range(12)])
+            plan = fleet.restock_plan(horizon=3600, cover=3600)
+        self.assertEqual(sorted(key for key, _, _ in plan), [(1, 'snickers'), (2, 'snickers')])
+
+    def test_grows_past_capacity(self):
+        planner = RestockPlanner.RestockPlanner(half_life=600, clock=lambda: self.now, capacity=4)
+        for machine_id in range(10):
+            planner.attach(Machine(), machine_id)
+        self.assertEqual(len(planner), 40)
+        self.assertEqual(planner.state()[3].tolist(), [10, 15, 1, 12] * 10)
+
+
+class TestCashCassette(unittest.TestCase):
+
+    def test_fewest_pieces_within_counts(self):
+        cassette = CashCassette({'0.25': 1, '0.10': 3, '0.05': 0})
+        self.assertEqual(cassette.solve('0.30'), [0, 3, 0])  # Greedy would take the quarter and get stuck
+        self.assertIsNone(cassette.solve('0.05'))
+        self.assertIsNone(cassette.solve('0.03'))
+        self.assertEqual(cassette.solve(0), [0, 0, 0])
+        cassette = CashCassette({'0.25': 4, '0.20': 3, '0.01': 10})
+        self.assertEqual(cassette.solve('0.40'), [0, 2, 0])  # Not 25 + 15 pennies
+
+    def test_matches_brute_force(self):
+        counts = {'1.00': 2, '0.25': 3, '0.10': 2, '0.05': 4}
+        cassette = CashCassette(counts)
+        values = [100, 25, 10, 5]
+        limits = list(counts.values())
+        for cents in range(0, 400, 5):
+            fewest = None
+            for combination in itertools.product(*(range(limit + 1) for limit in limits)):
+                if sum(v * n for v, n in zip(values, combination)) == cents:
+                    if fewest is None or sum(combination) < fewest:
+                        fewest = sum(combination)
+            pieces = cassette.solve(Money(cents))
+            self.assertEqual(None if pieces is None else sum(pieces), fewest, cents)
+
+    def test_dispense_and_load(self):
+        cassette = CashCassette({'1.00': 1, '0.25': 4})
+        self.assertEqual(cassette.dispense('1.50'), {Money.of('1.00'): 1, Money.of('0.25'): 2})
+        self.assertIsNone(cassette.dispense('1.00'))
+        self.assertEqual(cassette.total(), Money.of('0.50'))
+        cassette.load('0.50', 1)
+        self.assertEqual(cassette.dispense('1.00'), {Money.of('0.50'): 1, Money.of('0.25'): 2})
+        self.assertEqual(cassette.contents(), {Money.of('1.00'): 0, Money.of('0.50'): 0, Money.of('0.25'): 0})
+        with self.assertRaises(ValueError):
+            cassette.load('0.10', -1)
+
+    def test_machine_refuses_sale_without_change(self):
+        machine = Machine(cassette=CashCassette({'1.00': 1, '0.50': 0}))
+        result = machine.purchase('doritos', 5)
+        self.assertEqual(result.status, PurchaseResult.NO_CHANGE)
+        self.assertEqual(machine.inventory['doritos']['quantity'], 1)  # Reservation released
+        result = machine.purchase('snickers', 3)
+        self.assertTrue(result.success)
+        self.assertEqual(result.pieces, {Money.of('1.00'): 1})
+        self.assertTrue(machine.purchase('sprite', '3.50').success)  # Exact payment needs no change
+        self.assertIsNone(Machine.cassette)  # The default machine does not track change
+
+    def test_payments_refill_the_cassette(self):
+        machine = Machine(cassette=CashCassette({'1.00': 0, '0.25': 2}))
+        machine.inventory['sprite']['quantity'] = 100
+        for _ in range(5):  # Each $5 leaves four singles behind and pays $1.50 from them
+            result = machine.purchase('sprite', 5)
+            self.assertTrue(result.success)
+            self.assertEqual(result.pieces, {Money.of('1.00'): 1, Money.of('0.25'): 2})
+            machine.cassette.load('0.25', 2)
+        self.assertEqual(machine.cassette.contents(), {Money.of('1.00'): 20, Money.of('0.25'): 2})
+        failed = Machine(cassette=CashCassette({'1.00': 0, '0.25': 0}))
+        self.assertEqual(failed.purchase('sprite', 5).status, PurchaseResult.NO_CHANGE)
+        self.assertEqual(failed.cassette.total(), Money(0))  # The refused payment is not kept
+
+    def test_foreign_change_is_rounded_down(self):
+        counts = {denomination: 50 for denomination in ('20.00', '10.00', '5.00', '1.00', '0.25', '0.10', '0.05')}
+        machine = Machine(cassette=CashCassette(counts))
+        machine.inventory['sprite']['quantity'] = 100
+        for shekels in range(13, 22):
+            result = machine.purchase('sprite', shekels, 'shekels')
+            self.assertTrue(result.success, shekels)
+            self.assertEqual(result.change + result.remainder, machine.to_dollars(shekels, 'shekels') - Money(350))
+            self.assertLess(result.remainder, Money(5))
+        self.assertTrue(machine.purchase('sprite', 4, 'euros').success)
+        with patch('sys.stdout', new_callable=StringIO) as output:
+            machine.confirm_purchase(machine.to_dollars(13, 'shekels'), 'sprite', 'shekels')
+        self.assertIn("Your change is $0.25.\n-->$0.02 is below the smallest coin", output.getvalue())
+
+    def test_dollar_change_below_the_smallest_coin_is_refused(self):
+        machine = Machine(cassette=CashCassette({'1.00': 10, '0.05': 10}))
+        result = machine.purchase('sprite', '3.52')
+        self.assertEqual(result.status, PurchaseResult.NO_CHANGE)
+        self.assertEqual(machine.inventory['sprite']['quantity'], 10)
+        self.assertEqual(machine.cassette.total(), Money.of('10.50'))
+        self.assertTrue(machine.purchase('sprite', '3.55').success)
+
+    def test_only_dollar_cash_is_credited(self):
+        machine = Machine(cassette=CashCassette({'1.00': 10, '0.25': 10}))
+        client = Client(machine)
+        client.currency = 'euros'
+        client.deposit(2)
+        client.deposit(2, 'dollars')
+        self.assertEqual(client.paid, Money.of('2.00'))
+        self.assertTrue(client.choose_item('sprite'))
+        result = client.checkout()
+        self.assertTrue(result.success)
+        self.assertEqual(client.paid, Money(0))
+        self.assertEqual(machine.cassette.total(), Money.of('14.50') - result.change)  # $12.50 + the $2 in dollars
+
+    def test_infeasible_amounts_are_rejected(self):  # Timed in benchmarks/bench_change.py
+        cassette = CashCassette({'1.00': 100, '0.10': 1000, '0.05': 0})
+        self.assertIsNone(cassette.solve('99.95'))
+        self.assertEqual(cassette.solve('99.90'), [99, 9, 0])
+        cassette = CashCassette({'20.00': 1, '10.00': 0, '5.00': 2, '1.00': 3, '0.25': 1, '0.10': 4, '0.05': 0})
+        self.assertIsNone(cassette.solve('54.15'))
+        self.assertEqual(cassette.solve('33.65'), [1, 0, 2, 3, 1, 4, 0])
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        Machine.inventory = load_inventory()
+
+    def test_disabled_mode_leaves_methods_untouched(self):
+        originals = {name: owner.__dict__[name] for owner, name in Metrics.INSTRUMENTED}
+        with Metrics.Instrumentation():
+            self.assertIsNot(Machine.__dict__['vend'], originals['vend'])
+            with self.assertRaises(RuntimeError):
+                Metrics.Instrumentation().install()
+        for owner, name in Metrics.INSTRUMENTED:
+            self.assertIs(owner.__dict__[name], originals[name])
+        self.assertEqual(Machine.listeners, [Machine.catalog])
+
+    def test_counts_latency_and_stock(self):
+        machine = Machine()
+        with Metrics.Instrumentation(machine) as instrumentation:
+            machine.purchase('sprite', 5)
+            machine.purchase('sprite', 1)
+            Administrator(machine).restock('sprite', 3)
+            client = Client(machine)
+            client.deposit(2, 'dollars')
+            client.refund()
+        text = instrumentation.registry.render()
+        self.assertIn('vending_vends_total{item="sprite"} 1', text)
+        self.assertIn('vending_revenue_dollars_total{item="sprite"} 3.5', text)
+        self.assertIn('vending_refills_total{item="sprite"} 3', text)
+        self.assertIn('vending_refunds_total 1', text)
+        self.assertIn('vending_stock_units{item="sprite"} 12', text)
+        self.assertIn('vending_operation_seconds_count{operation="vend"} 2', text)
+        self.assertIn('vending_operation_seconds_bucket{operation="vend",le="+Inf"} 2', text)
+        self.assertIn('# TYPE vending_operation_seconds histogram', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Metrics.Histogram('latency', "Test.", ('op',), buckets=(1, 2))
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value, 'x')
+        samples = {values: value for name, labels, values, value in histogram.samples() if name == 'latency_bucket'}
+        self.assertEqual(samples, {('x', 1): 1, ('x', 2): 3, ('x', '+Inf'): 4})
+
+    def test_exporters(self):
+        registry = Metrics.Registry()
+        registry.register(Metrics.Counter('things_total', "Things.")).inc(2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'vending.prom')
+            registry.write(path)
+            with open(path) as f:
+                self.assertIn('things_total 2', f.read())
+        server = registry.serve(port=0)
+        try:
+            from urllib.request import urlopen
+            with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+                self.assertIn(b'# TYPE things_total counter', response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'vending.pstats')
+            with Metrics.profiled(path):
+                Machine().purchase('sprite', 5)
+            self.assertGreater(os.path.getsize(path), 0)
+
+
+@unittest.skipIf(SalesAnalytics is None, "NumPy is not installed")
+class TestSalesAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 7200.0
+        self.log = SalesAnalytics.SalesLog(capacity=2, clock=lambda: self.now)
+
+    def test_records_vends_with_currency(self):
+        machine = Machine()
+        self.log.attach(machine)
+        machine.purchase('sprite', 20, 'shekels')
+        machine.purchase('sprite', 5)
+        client = Client(machine)
+        client.currency = 'euros'
+        client.deposit(5)
+        client.choose_item('snickers')
+        client.checkout()
+        machine.purchase('doritos', 1)  # Insufficient funds, not recorded
+        self.assertEqual(len(self.log), 3)
+        self.assertEqual(self.log.currencies, ['shekels', 'dollars', 'euros'])
+        self.assertEqual(self.log.columns()['cents'].tolist(), [350, 350, 200])
+        self.assertEqual(self.log.currency_share(), {'shekels': 350 / 900, 'dollars': 350 / 900, 'euros': 200 / 900})
+
+    def test_rollup_is_incremental(self):
+        self.log.append('sprite', 1, '3.50', 'dollars', when=100)
+        self.log.append('coca-cola', 2, '5.00', 'shekels', when=200)
+        hourly = self.log.rollup(3600)
+        self.assertEqual(hourly.report(('item',)), [('sprite', 1, Money(350)), ('coca-cola', 2, Money(1000))])
+        self.log.append('sprite', 1, '3.50', 'dollars', when=3700)
+        self.log.append('sprite', 1, '3.50', 'euros', when=3800)
+        self.assertIs(self.log.rollup(3600), hourly)
+        self.assertEqual(hourly.folded, 4)
+        self.assertEqual(hourly.report(), [(0, 'sprite', 1, Money(350)), (0, 'coca-cola', 2, Money(1000)),
+                                           (3600, 'sprite', 2, Money(700))])
+        self.assertEqual(hourly.report(('currency',), start=3600), [('dollars', 1, Money(350)), ('euros', 1, Money(350))])
+        self.assertEqual(self.log.rollup(60).report(('bucket',)), [(60, 1, Money(350)), (180, 2, Money(1000)),
+                                                                   (3660, 1, Money(350)), (3780, 1, Money(350))])
+
+    def test_matches_python_totals(self):
+        generator = random.Random(1)
+        expected = {}
+        for _ in range(5000):
+            item = generator.choice(['sprite', 'coca-cola', 'doritos'])
+            quantity = generator.randint(1, 3)
+            self.log.append(item, quantity, '2.25', when=generator.uniform(0, 86400))
+            expected[item] = expected.get(item, 0) + quantity
+        self.assertEqual({row[0]: row[1] for row in self.log.rollup(900).report(('item',))}, expected)
+
+    def test_journal_and_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sales.log')
+            machine = Machine()
+            journal = Journal.open_journal(path, machine=machine)
+            machine.purchase('sprite', 4, 'dollars')
+            Journal.close_journal(journal)
+            log = SalesAnalytics.SalesLog.from_journal(path)
+            rows = log.rollup(3600).report(('bucket', 'item', 'currency'))
+            self.assertEqual([row[1:] for row in rows], [('sprite', 'dollars', 1, Money(350))])
+            csv_path = os.path.join(directory, 'sales.csv')
+            SalesAnalytics.write_csv(csv_path, ('bucket', 'item', 'currency'), rows)
+            with open(csv_path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'bucket,item,currency,units,revenue_dollars')
+        self.assertTrue(lines[1].endswith('+00:00,sprite,dollars,1,3.50'))
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'machines.snapshot')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip_full_state(self):
+        machine = Machine(cassette=CashCassette({'1.00': 2, '0.25': 4}))
+        machine.rates = RateTable(DEFAULT_RATES)
+        machine.rates.set_rate('francs', '1.13')
+        machine.purchase('sprite', 5)
+        Administrator(machine).restock('gum', 7, '0.75')
+        Snapshot.save(self.path, {4: machine, 2: Machine()}, {4: {'client-1': Money.of('1.25')}})
+        restored = Machine()
+        events = []
+        restored.subscribe(lambda event, details: events.append(event))
+        with Snapshot.SnapshotFile(self.path) as snapshot:
+            self.assertEqual(snapshot.ids(), [2, 4])
+            self.assertNotIn(3, snapshot)
+            with self.assertLogs(level='WARNING'):
+                balances = snapshot.restore(4, restored)
+            with self.assertRaises(KeyError):
+                snapshot.restore(3, Machine())
+        self.assertEqual(balances, {'client-1': Money.of('1.25')})
+        self.assertEqual(restored.inventory, machine.inventory)
+        self.assertEqual(restored.cassette.contents(), {Money.of('1.00'): 6, Money.of('0.25'): 2})  # $5 paid in
+        self.assertEqual(restored.to_dollars(10, 'francs'), Money.of('11.30'))
+        self.assertEqual(restored.to_dollars(10, 'shekels'), Money.of('2.90'))
+        self.assertEqual(events, ['reset'])
+        self.assertEqual(restored.lookup('gum'), 'gum')  # The catalog follows the new inventory
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"not": "a snapshot"}')
+        with self.assertRaises(Snapshot.SnapshotError):
+            Snapshot.SnapshotFile(self.path)
+        with self.assertRaises(Snapshot.SnapshotError):
+            tables = Snapshot.RateTables()
+            Snapshot.decode_machine(Snapshot.encode_machine(Machine(), tables)[:-3], tables.tables)
+
+    def test_rate_tables_are_stored_once(self):
+        machines = {machine_id: Machine() for machine_id in range(3)}
+        machines[2].rates = RateTable(DEFAULT_RATES)
+        machines[2].rates.set_rate('francs', '1.13')
+        Snapshot.save(self.path, machines)
+        with Snapshot.SnapshotFile(self.path) as snapshot:
+            self.assertEqual(len(snapshot.tables), 2)
+            restored = [Machine() for _ in range(3)]
+            for machine_id, machine in enumerate(restored):
+                snapshot.restore(machine_id, machine)
+        self.assertIsNot(restored[0].rates, restored[1].rates)
+        self.assertEqual(restored[1].to_dollars(10, 'euros'), Machine.to_dollars(10, 'euros'))
+        self.assertEqual(restored[2].to_dollars(10, 'francs'), Money.of('11.30'))
+
+    def test_write_is_atomic(self):
+        Snapshot.save(self.path, {0: Machine()})
+        with patch('os.replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                Snapshot.save(self.path, {0: Machine(), 1: Machine()})
+        with Snapshot.SnapshotFile(self.path) as snapshot:
+            self.assertEqual(snapshot.ids(), [0])
+
+    def test_snapshot_every(self):
+        machine = Machine()
+        stop = Snapshot.snapshot_every(self.path, {0: machine}, interval=0.01)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stop.set()
+        with Snapshot.SnapshotFile(self.path) as snapshot:
+            self.assertEqual(snapshot.ids(), [0])
+
+    def test_fleet_warm_start(self):
+        with Fleet.Fleet(machines=6, workers=2) as fleet:
+            fleet.purchase(3, 'doritos', 5)
+            fleet.restock(5, 'gum', 4, '0.75')
+            fleet.save_snapshot(self.path)
+        with Fleet.Fleet(machines=6, workers=3, snapshot_path=self.path) as fleet:
+            machines, totals = fleet.stock_view()
+            self.assertEqual(machines[3]['doritos'], 0)
+            self.assertEqual(machines[5]['gum'], 4)
+            self.assertEqual(totals['doritos'], 5)
+            self.assertEqual(fleet.purchase(3, 'doritos', 5).status, PurchaseResult.UNAVAILABLE)
+            fleet.save_snapshot(self.path)  # Unchanged machines are copied from the old snapshot
+        with Snapshot.SnapshotFile(self.path) as snapshot:
+            restored = Machine()
+            snapshot.restore(5, restored)
+            self.assertEqual(restored.inventory['gum']['quantity'], 4)
+
+
+class TestPricing(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.mktime((2026, 1, 5, 17, 30, 0, 0, 0, -1))  # 17:30 local time
+        self.happy_hour = Pricing.TimeOfDayRule(16, 18, 0.8, items=['sprite', 'coca-cola'])
+        self.scarcity = Pricing.StockRule(5, 1.25)
+        self.engine = Pricing.PricingEngine([self.happy_hour, self.scarcity], clock=lambda: self.now)
+        self.machine = Machine(pricing=self.engine)
+
+    def test_rules_combine(self):
+        self.assertEqual(self.machine.get_item_price('sprite'), Money.of('2.80'))
+        self.assertEqual(self.machine.get_item_price('doritos'), Money.of('3.13'))  # One left: 2.50 * 1.25
+        self.assertEqual(self.machine.get_item_price('snickers'), Money.of('2.00'))
+        self.assertEqual(self.machine.get_item_price('gum'), Money(0))
+        self.now += 3600  # 18:30, happy hour is over
+        self.assertEqual(self.machine.get_item_price('sprite'), Money.of('3.50'))
+        self.assertEqual(Machine.get_item_price('sprite'), Money.of('3.50'))  # The default machine has fixed prices
+
+    def test_wrapping_window_and_promotion(self):
+        night = Pricing.TimeOfDayRule(22, 6, 0.5)
+        self.assertFalse(night.active(0, self.now))
+        self.assertTrue(night.active(0, self.now + 6 * 3600))
+        self.assertEqual(night.next_change(self.now), self.now + 4.5 * 3600)
+        promotion = Pricing.Promotion(0.9, ['snickers'], starts=self.now + 60, ends=self.now + 120)
+        engine = Pricing.PricingEngine([promotion], clock=lambda: self.now)
+        self.assertEqual(engine.price(self.machine, 'snickers'), Money.of('2.00'))
+        self.now += 60
+        self.assertEqual(engine.price(self.machine, 'snickers'), Money.of('1.80'))
+        self.now += 60
+        self.assertEqual(engine.price(self.machine, 'snickers'), Money.of('2.00'))
+        with self.assertRaises(ValueError):
+            Pricing.Rule(0)
+
+    def test_cache_follows_inputs(self):
+        with patch.object(Pricing.StockRule, 'active', wraps=self.scarcity.active) as evaluations:
+            self.assertEqual(self.machine.get_item_price('snickers'), Money.of('2.00'))
+            for _ in range(7):
+                self.assertTrue(self.machine.purchase('snickers', 5).success)  # 12 -> 5 units, still >= 5
+            self.assertEqual(evaluations.call_count, 1)
+            self.assertEqual(self.machine.purchase('snickers', 5).price, Money.of('2.00'))
+            self.assertEqual(self.machine.get_item_price('snickers'), Money.of('2.50'))  # 4 left
+            self.assertEqual(evaluations.call_count, 2)
+            self.machine.inventory['snickers']['price_dollars'] = Money.of('2.40')
+            self.assertEqual(self.machine.get_item_price('snickers'), Money.of('3.00'))
+
+    def test_vend_charges_dynamic_price(self):
+        result = self.machine.purchase('coca-cola', 5)
+        self.assertEqual((result.price, result.change), (Money.of('4.00'), Money.of('1.00')))
+        with patch('builtins.print') as printed:
+            self.machine.display_items()
+        self.assertIn(call('- Sprite: $2.80'), printed.call_args_list)
+
+    def test_price_order_uses_dynamic_prices(self):
+        with patch('builtins.print') as printed:
+            self.machine.display_items(sort='price')
+        lines = [args[0] for args, _ in printed.call_args_list if args[0].startswith('- ')]
+        self.assertEqual(lines, ['- Snickers: $2.00', '- Sprite: $2.80', '- Doritos: $3.13', '- Coca-Cola: $4.00'])
+        with patch('builtins.print') as printed:
+            self.machine.display_items(page=0, page_size=2, sort='price', descending=True)
+        self.assertIn(call('- Coca-Cola: $4.00'), printed.call_args_list)
+        self.assertIn(call('- Doritos: $3.13'), printed.call_args_list)
+
+    def test_price_order_is_kept_between_pages(self):
+        def listed(**options):
+            with patch('builtins.print') as printed:
+                self.machine.display_items(sort='price', **options)
+            return [args[0] for args, _ in printed.call_args_list if args[0].startswith('- ')]
+
+        listed()
+        with patch.object(self.engine, 'price', wraps=self.engine.price) as priced:
+            self.assertEqual(listed(page_size=2), ['- Snickers: $2.00', '- Sprite: $2.80'])
+            self.assertEqual(priced.call_count, 2)  # Only the rows shown; nothing was re-sorted
+        for _ in range(8):
+            self.machine.purchase('snickers', 5)  # 4 left, so scarcity pricing applies
+        self.assertEqual(listed(), ['- Snickers: $2.50', '- Sprite: $2.80', '- Doritos: $3.13', '- Coca-Cola: $4.00'])
+        self.now += 3600  # Happy hour ends
+        self.assertEqual(listed(), ['- Snickers: $2.50', '- Doritos: $3.13', '- Sprite: $3.50', '- Coca-Cola: $5.00'])
+
+    @unittest.skipIf(Pricing.np is None, "NumPy is not installed")
+    def test_batch_reprice_matches_single_prices(self):
+        generator = random.Random(3)
+        machines = [Machine() for _ in range(50)]
+        for machine in machines:
+            for details in machine.inventory.values():
+                details['quantity'] = generator.randrange(10)
+                details['price_dollars'] = Money(generator.randrange(50, 500))
+        rules = [self.happy_hour, self.scarcity, Pricing.StockRule(8, 0.9, ['snickers'], below=False),
+                 Pricing.Promotion(0.95, ['doritos'], ends=self.now + 10)]
+        expected = [{item: Pricing.PricingEngine(rules, clock=lambda: self.now).price(machine, item)
+                     for item in machine.inventory} for machine in machines]
+        engine = Pricing.PricingEngine(rules, clock=lambda: self.now)
+        self.assertEqual(engine.reprice(machines), 200)
+        with patch.object(Pricing.PricingEngine, 'rules_for') as compiled:
+            prices = [{item: engine.price(machine, item) for item in machine.inventory} for machine in machines]
+            compiled.assert_not_called()  # Every price came from the batch
+        self.assertEqual(prices, expected)
+        self.now += 10
+        self.assertNotEqual(engine.price(machines[0], 'doritos'), expected[0]['doritos'])
+
+    def test_fleet_pricing(self):
+        with Fleet.Fleet(machines=4, workers=2) as fleet:
+            fleet.purchase(1, 'sprite', 5)
+            fleet.set_pricing([Pricing.Promotion(0.5)])
+            if Pricing.np is not None:
+                self.assertEqual(fleet.reprice(), 4)
+            self.assertEqual(fleet.purchase(2, 'sprite', 5).price, Money.of('1.75'))
+            fleet.set_pricing([])
+            self.assertEqual(fleet.purchase(1, 'sprite', 5).price, Money.of('3.50'))
+
+
+class TestExchangeRates(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'rates.json')
+        self.write({'dollars': '1', 'shekels': {'rate': '0.29'}, 'yen': {'rate': '0.0067', 'digits': 0}})
+        self.machine = Machine()
+        self.watcher = ExchangeRates.RateWatcher(self.machine, self.path, interval=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, rates):
+        with open(self.path, 'w') as f:
+            json.dump(rates, f)
+        self.version = getattr(self, 'version', 0) + 1
+        os.utime(self.path, (self.version, self.version))  # Rewrites within one clock tick still look changed
+
+    def test_default_file_matches_built_in_rates(self):
+        self.assertEqual(ExchangeRates.load_rates().factors(), RateTable(DEFAULT_RATES).factors())
+
+    def test_load_errors(self):
+        self.write({'shekels': {'digits': 2}, 'euros': '-1', 'pounds': '1.27'})
+        with self.assertRaises(ValueError) as raised:
+            ExchangeRates.load_rates(self.path)
+        self.assertIn('shekels', str(raised.exception))
+        self.assertIn('euros', str(raised.exception))
+        with self.assertRaises(ValueError):
+            ExchangeRates.load_rates(os.path.join(self.directory.name, 'missing.json'))
+
+    def test_hot_reload_keeps_old_rates_on_bad_file(self):
+        self.assertTrue(self.watcher.check())
+        self.assertFalse(self.watcher.check())  # Unchanged
+        self.assertEqual(list(self.machine.rates), ['dollars', 'shekels', 'yen'])
+        self.write({'dollars': '1', 'shekels': '0.30'})
+        self.assertTrue(self.watcher.check())
+        self.assertEqual(self.machine.to_dollars(10, 'shekels'), Money.of('3.00'))
+        self.write({'dollars': '1', 'shekels': 'lots'})
+        with self.assertLogs(level='ERROR'):
+            self.assertFalse(self.watcher.check())
+        self.assertEqual(self.machine.to_dollars(10, 'shekels'), Money.of('3.00'))
+        self.assertEqual(Machine.to_dollars(10, 'shekels'), Money.of('2.90'))  # Other machines are unaffected
+
+    def test_rates_are_pinned_per_transaction(self):
+        self.watcher.check()
+        client = Client(self.machine)
+        client.currency = 'shekels'
+        client.deposit(10)
+        self.write({'dollars': '1', 'shekels': '0.10'})
+        self.watcher.check()
+        self.assertEqual(client.deposit(10), Money.of('5.80'))  # Both deposits at 0.29
+        client.refund()
+        self.assertEqual(client.deposit(10), Money.of('1.00'))  # The next transaction uses the new rate
+
+    def test_price_list_in_customer_currency(self):
+        self.watcher.check()
+        with patch.object(RateTable, 'from_money', wraps=self.machine.rates.from_money) as conversions:
+            for _ in range(3):
+                with patch('builtins.print') as printed:
+                    self.machine.display_items(currency='yen')
+            self.assertEqual(conversions.call_count, 4)  # One per item, then served from the cache
+        self.assertIn(call('- Sprite: 522 Yen'), printed.call_args_list)
+        rates = RateTable(DEFAULT_RATES)
+        self.assertEqual(rates.convert(Money.of('3.50'), 'euros'), Decimal('3.24'))
+        rates.set_rate('euros', '1.00')
+        self.assertEqual(rates.convert(Money.of('3.50'), 'euros'), Decimal('3.50'))
+
+    def test_watcher_thread(self):
+        watcher = ExchangeRates.RateWatcher(self.machine, self.path, interval=0.01).start()
+        try:
+            self.write({'dollars': '1', 'euros': '1.10'})
+            deadline = time.monotonic() + 5
+            while 'euros' not in self.machine.rates and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+        self.assertEqual(list(self.machine.rates), ['dollars', 'euros'])
+
+
+class TestHolds(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.machine = Machine({'sprite': {'quantity': 1, 'price_dollars': Money(350)},
+                                'gum': {'quantity': 5, 'price_dollars': Money(75)}})
+        self.machine.holds.clock = lambda: self.now
+
+    def client(self, amount=0):
+        client = Client(self.machine)
+        client.currency = 'dollars'
+        if amount:
+            client.deposit(amount)
+        return client
+
+    def test_held_unit_cannot_be_bought_by_another_customer(self):
+        slow = self.client(1)
+        self.assertTrue(slow.choose_item('sprite'))
+        self.assertEqual(slow.checkout().status, PurchaseResult.INSUFFICIENT_FUNDS)
+        self.assertFalse(self.client(5).choose_item('sprite'))
+        self.assertEqual(self.machine.purchase('sprite', 5).status, PurchaseResult.UNAVAILABLE)
+        slow.deposit(5)
+        result = slow.checkout()
+        self.assertTrue(result.success)
+        self.assertEqual((result.change, self.machine.inventory['sprite']['quantity'], len(self.machine.holds)),
+                         (Money.of('2.50'), 0, 0))
+
+    def test_expired_hold_returns_to_the_shelf(self):
+        client = self.client()
+        client.choose_item('sprite')
+        self.now = self.machine.holds.ttl - 1
+        self.assertEqual(self.machine.holds.expire(), 0)
+        self.assertEqual(self.machine.holds.next_deadline(), self.machine.holds.ttl)
+        self.now += 1
+        events = []
+        self.machine.subscribe(lambda event, details: events.append(event))
+        self.assertEqual(self.machine.holds.expire(), 1)
+        self.assertEqual((events, self.machine.inventory['sprite']['quantity']), (['release'], 1))
+        self.assertIsNone(self.machine.holds.next_deadline())
+        # The customer can still buy if the unit is on the shelf when they pay
+        client.deposit(5)
+        self.assertTrue(client.checkout().success)
+        self.assertEqual(self.machine.inventory['sprite']['quantity'], 0)
+
+    def test_topping_up_renews_the_hold(self):
+        client = self.client(1)
+        client.choose_item('sprite')
+        self.assertEqual(client.checkout().status, PurchaseResult.INSUFFICIENT_FUNDS)
+        self.now = self.machine.holds.ttl - 1
+        with patch('builtins.input', return_value='5'), patch('sys.stdout', new_callable=StringIO):
+            client.insert_cash(True)
+        self.now += 10
+        self.assertEqual(self.machine.holds.expire(), 0)
+        self.assertTrue(client.checkout().success)
+
+    def test_expired_hold_is_sold_without_the_sweeper(self):
+        self.assertTrue(self.client().choose_item('sprite'))
+        self.now = self.machine.holds.ttl
+        self.assertTrue(self.machine.is_available('sprite'))
+        self.assertTrue(self.client().choose_item('sprite'))
+        self.now *= 2
+        with patch('sys.stdout', new_callable=StringIO) as output:
+            self.machine.display_items()
+        self.assertIn("- Sprite: $3.50", output.getvalue())
+        self.now *= 2
+        self.assertTrue(self.machine.purchase('sprite', 5).success)
+
+    def test_deposit_renews_the_hold(self):
+        client = self.client()
+        client.choose_item('sprite')
+        self.now = self.machine.holds.ttl - 1
+        client.deposit(5)
+        self.now += 10
+        self.assertEqual(self.machine.holds.expire(), 0)
+        self.assertTrue(client.checkout().success)
+
+    def test_cancel_and_reselect_release_the_hold(self):
+        client = self.client(1)
+        client.choose_item('sprite')
+        self.assertTrue(client.choose_item('gum'))  # Picking another item frees the sprite
+        self.assertEqual(self.machine.inventory['sprite']['quantity'], 1)
+        self.assertEqual(self.machine.inventory['gum']['quantity'], 4)
+        self.assertTrue(client.choose_item('gum'))  # Re-selecting keeps the same unit
+        self.assertEqual(self.machine.inventory['gum']['quantity'], 4)
+        with patch('sys.stdout', new_callable=StringIO):
+            client.cancel_request()
+        self.assertEqual((self.machine.inventory['gum']['quantity'], len(self.machine.holds)), (5, 0))
+        self.assertEqual(self.machine.holds.expire(math.inf), 0)
+
+    def test_console_flow_sells_the_held_unit(self):
+        inputs = ['dollars', '1', 'sprite', 'cash', 'dollars', '5', 'sprite', 'exit']
+        with patch('builtins.input', side_effect=inputs), patch('sys.stdout', new_callable=StringIO) as output:
+            VendingMachine.run_customer(self.machine)
+        self.assertIn("You bought Sprite for $3.50", output.getvalue())
+        self.assertEqual((self.machine.inventory['sprite']['quantity'], len(self.machine.holds)), (0, 0))
+
+    def test_reset_and_snapshot_do_not_lose_held_units(self):
+        client = self.client()
+        client.choose_item('gum')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'machines.snapshot')
+            Snapshot.save(path, {0: self.machine})
+            with Snapshot.SnapshotFile(path) as snapshot:
+                restored = Machine()
+                snapshot.restore(0, restored)
+        self.assertEqual(restored.inventory['gum']['quantity'], 5)
+        Administrator(self.machine).reset_inventory()
+        self.assertEqual(len(self.machine.holds), 0)
+        stocked = self.machine.inventory['sprite']['quantity']
+        client.refund()  # The old hold does not add to the fresh shelf
+        self.assertEqual(self.machine.inventory['sprite']['quantity'], stocked)
+        self.assertIs(client.hold, None)
+
+    def test_many_holds_expire_in_deadline_order(self):
+        machine = Machine({'gum': {'quantity': 1000, 'price_dollars': Money(75)}})
+        book = Holds.HoldBook(machine, ttl=1000, clock=lambda: self.now)
+        holds = []
+        for second in range(100):
+            self.now = second
+            holds.append(book.hold('gum'))
+        for reservation in holds[::2]:
+            book.release(reservation)
+        self.assertLessEqual(len(book._heap), 2 * len(book) + 64)
+        self.now = 1049.5
+        self.assertEqual(book.expire(), 25)  # Held at odd seconds 1..49, so past their deadlines
+        self.assertEqual(machine.inventory['gum']['quantity'], 1000 - 25)
+        self.assertEqual(book.held(), {'gum': 25})
+
+    def test_sweeper_thread(self):
+        book = Holds.HoldBook(self.machine, ttl=0).start(interval=0.01)
+        try:
+            book.hold('gum')
+            deadline = time.monotonic() + 5
+            while len(book) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            book.stop()
+        self.assertEqual((len(book), self.machine.inventory['gum']['quantity']), (0, 5))
+
+
+class TestReplay(unittest.TestCase):
+    SESSIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions')
+
+    def test_recorded_sessions_pass(self):
+        report = Replay.run_suite(Replay.find_scripts([self.SESSIONS]), workers=1)
+        self.assertEqual(report['failures'], {})
+        self.assertGreaterEqual(report['scripts'], 6)
+
+    def test_parallel_workers(self):
+        scripts = Replay.find_scripts([self.SESSIONS])
+        report = Replay.run_suite(scripts, workers=2, repeat=3)
+        self.assertEqual((report['scripts'], report['failures']), (3 * len(scripts), {}))
+        self.assertGreater(report['inputs_per_sec'], 0)
+
+    def test_failures_are_reported(self):
+        wrong = Replay.SessionScript.parse("flow customer\n> dollars\n> 5\n< Inserted $6.00\n> sprite\n> exit\n", 'wrong')
+        result = Replay.replay(wrong)
+        self.assertFalse(result.passed)
+        self.assertIn("expected 'Inserted $6.00' after input 2", result.failure)
+        short = Replay.replay(Replay.SessionScript.parse("flow customer\n> dollars\n", 'short'))
+        self.assertIn('ran out of input', short.failure)
+        extra = Replay.replay(Replay.SessionScript.parse("flow admin\n> nope\n> 1\n", 'extra'))
+        self.assertIn('1 input lines unread', extra.failure)
+        self.assertFalse(hasattr(VendingMachine, 'input'))
+        self.assertFalse(hasattr(VendingMachine, 'print'))
+
+    def test_expectations_are_ordered_between_inputs(self):
+        text = "flow customer\n> dollars\n< Inserted $5.00\n> 5\n> sprite\n> exit\n"
+        self.assertIn("expected 'Inserted $5.00' after input 1", Replay.replay(Replay.SessionScript.parse(text)).failure)
+
+    def test_parse_and_dump(self):
+        script = Replay.SessionScript.parse("# comment\nflow admin\n\n> admin123\n>  spaced \n< Done\n", 'x')
+        self.assertEqual(script.steps, [('>', 'admin123'), ('>', ' spaced '), ('<', 'Done')])
+        self.assertEqual(Replay.SessionScript.parse(script.dump()).steps, script.steps)
+        with self.assertRaises(Replay.ScriptError):
+            Replay.SessionScript.parse("flow nowhere\n")
+        with self.assertRaises(Replay.ScriptError):
+            Replay.SessionScript.parse("flow admin\nadmin123\n")
+
+    def test_record_then_replay(self):
+        with patch('builtins.input', side_effect=['dollars', '5', 'doritos', 'exit']):
+            with patch('sys.stdout', new_callable=StringIO):
+                script = Replay.record('customer')
+        self.assertEqual(script.inputs, ['dollars', '5', 'doritos', 'exit'])
+        self.assertIn(('<', '-->Purchase confirmed! You bought Doritos for $2.50. Your change is $2.50.'), script.steps)
+        self.assertTrue(Replay.replay(Replay.SessionScript.parse(script.dump())).passed)
+        self.assertEqual(Machine.inventory['doritos']['quantity'], 1)  # Ran against a fresh machine
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
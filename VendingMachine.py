@@ -1,42 +1,163 @@
+import contextlib
+import functools
 import logging
+import numbers
+import threading
+import types
+
+from Catalog import Catalog
+from ExchangeRates import load_rates
+from Holds import HoldBook
+from Money import Money
+from Planogram import load_inventory, load_planogram, PlanogramError
+
+class hybridmethod:
+    """Method that binds to the instance when called on one, and to the class otherwise."""
+
+    def __init__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner):
+        return types.MethodType(self.function, owner if instance is None else instance)
+
 
 class Administrator:
     PASSWORD = "admin123"  # Change this to your desired password
+    machine = None  # The default Machine, set below once it is defined
 
-    @staticmethod
-    def authenticate():
+    def __init__(self, machine):
+        self.machine = machine
+
+    @hybridmethod
+    def authenticate(self):
         password_attempt = input("Enter the administrator password: ")
-        return password_attempt == Administrator.PASSWORD
+        return password_attempt == self.PASSWORD
+
+    @hybridmethod
+    def reset_inventory(self):
+        # Non-interactive reset used by the menu and by programmatic callers
+        inventory = load_inventory()
+        with self.machine.locks.all():  # No purchase may see the shelf half rewritten
+            self.machine.holds.discard_all()  # Held units belong to the old shelf
+            if isinstance(self.machine.inventory, dict):
+                self.machine.inventory = inventory
+            else:
+                self.machine.inventory.reset(inventory)  # Keep an array-backed store and its mapping
+        self.machine.notify('reset', inventory=self.machine.inventory)
+
+    @hybridmethod
+    def restock(self, item_name, quantity, price=None):
+        """Add `quantity` units of `item_name`; returns True if the item was newly added.
+
+        A price is required when the item is not currently stocked.
+        """
+        if not isinstance(item_name, str) or not item_name.strip():
+            raise ValueError(f"Item name must be a non-empty string, got {item_name!r}")
+        if isinstance(quantity, bool) or not isinstance(quantity, numbers.Integral) or quantity <= 0:
+            raise ValueError(f"Quantity to add must be a positive whole number, got {quantity!r}")
+        item_name, quantity = item_name.lower(), int(quantity)
+        price = None if price is None else Money.of(price)
+        if price is not None and price <= 0:
+            raise ValueError(f"Price must be positive, got {price}")
+        with self.machine.locks.for_item(item_name):
+            added, price = self._apply_refill(item_name, quantity, price, False)
+        self.machine.notify('refill', item=item_name, quantity=quantity, price=price)
+        return added
 
-    @staticmethod
+    @hybridmethod
+    def _apply_refill(self, item_name, quantity, price, reprice):
+        # Caller holds the item's lock. Returns (newly added, price that was applied or None).
+        details = self.machine.inventory.get(item_name)
+        if details is not None and details['quantity'] > 0:
+            details['quantity'] += quantity
+            if reprice and price is not None:
+                details['price_dollars'] = price
+                return False, price
+            return False, None
+        if price is None:
+            raise ValueError(f"A price is required to add {item_name}")
+        if details is None:
+            self.machine.inventory[item_name] = {'quantity': quantity, 'price_dollars': price}
+        else:
+            # Update a sold-out entry in place so units still reserved elsewhere return to it
+            details['quantity'] += quantity
+            details['price_dollars'] = price
+        return True, price
+
+    @hybridmethod
+    def apply_planogram(self, rows):
+        """Apply validated (item, quantity, price) rows all-or-nothing; returns (refilled, added) counts.
+
+        Every row is checked before anything changes, and purchases are held off while the rows are
+        applied so no session sees a half-applied planogram.
+        """
+        rows = list(rows)
+        applied = []
+        self.machine.holds.expire()  # Not under the locks below: expiring takes item locks
+        try:
+            with self.machine.locks.all():
+                priced, missing = set(), []
+                for item, _, price in rows:
+                    if price is not None or item in priced or self.machine._in_stock(item):
+                        priced.add(item)
+                    else:
+                        missing.append(item)
+                if missing:
+                    raise PlanogramError([f"{item}: a price is required for an item that is not stocked"
+                                          for item in dict.fromkeys(missing)])
+                # A bounded store such as ColumnarInventory says up front which new items it cannot take
+                check_additions = getattr(self.machine.inventory, 'check_additions', None)
+                if check_additions is not None:
+                    inventory = self.machine.inventory
+                    errors = check_additions([item for item in dict.fromkeys(item for item, _, _ in rows)
+                                              if item not in inventory])
+                    if errors:
+                        raise PlanogramError(errors)
+                for item, quantity, price in rows:
+                    applied.append((item, quantity) + self._apply_refill(item, quantity, price, True))
+        finally:
+            for item, quantity, added, price in applied:  # Even if a row failed, report the ones that changed
+                self.machine.notify('refill', item=item, quantity=quantity, price=price)
+        added = sum(1 for row in applied if row[2])
+        return len(applied) - added, added
+
+    @hybridmethod
+    def import_planogram(self):
+        try:
+            print("-->Administrator importing a planogram.")
+            path = input("Enter the path of the planogram file (.csv/.json/.jsonl): ").strip()
+            refilled, added = self.apply_planogram(load_planogram(path))
+            print(f"-->Planogram applied: {refilled} items refilled, {added} new items added.")
+        except PlanogramError as e:
+            print("-->Planogram rejected, no changes were made:")
+            for message in e.errors:
+                print(f"   {message}")
+        except Exception as e:
+            logging.error(f"Error in importing planogram: {str(e)}")
+
+    @hybridmethod
     #set inventory to default
-    def reset_machine():
+    def reset_machine(self):
         try:
             print("-->Administrator resetting the machine.")
-            # Resetting the machine logic remains the same
-            Machine.inventory = {
-                'sprite': {'quantity': 10, 'price_dollars': 3.5},
-                'coca-cola': {'quantity': 15, 'price_dollars': 5.0},
-                'doritos': {'quantity': 1, 'price_dollars': 2.5},
-                'snickers': {'quantity': 12, 'price_dollars': 2.0}
-            }
+            self.reset_inventory()
             print("-->Machine has been reset.")
         except Exception as e:
             logging.error(f"Error in resetting machine: {str(e)}")
 
-    @staticmethod
-    def refill_stock():
+    @hybridmethod
+    def refill_stock(self):
         try:
             print("-->Administrator refilling stock.")
-            # Refilling stock logic remains the same
             item_name = input("Enter the name of the item to refill: ").lower()
             quantity = int(input("Enter the quantity to add: "))
-            if item_name in Machine.inventory and Machine.inventory[item_name]['quantity'] > 0:
-                Machine.inventory[item_name]['quantity'] += quantity
+            if self.machine.is_available(item_name):
+                self.restock(item_name, quantity)
                 print(f"-->Stock for {item_name.capitalize()} has been refilled (+{quantity} units).")
             else:
-                price = float(input("Enter the price of the item: "))
-                Machine.inventory[item_name] = {'quantity': quantity, 'price_dollars': price}
+                price = Money.of(input("Enter the price of the item: "))
+                self.restock(item_name, quantity, price)
                 print(f"-->New item {item_name.capitalize()} has been added to the inventory "
                       f"with a quantity of {quantity} and a price of ${price:.2f}.")
         except ValueError:
@@ -44,123 +165,370 @@ class Administrator:
         except Exception as e:
             logging.error(f"Error in refilling stock: {str(e)}")
 
+class StripedLock:
+    """A fixed pool of locks; every item name maps to one stripe so unrelated items never contend."""
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def for_item(self, item_name):
+        return self._locks[hash(item_name) % len(self._locks)]
+
+    @contextlib.contextmanager
+    def all(self):
+        """Hold every stripe, in a fixed order so two bulk operations cannot deadlock."""
+        with contextlib.ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+
+class Reservation:
+    """Units taken off the shelf by Machine.reserve, waiting to be committed or released."""
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+
+    __slots__ = ('item', 'quantity', 'state')
+
+    def __init__(self, item, quantity):
+        self.item = item
+        self.quantity = quantity
+        self.state = Reservation.HELD
+
+
+class PurchaseResult:
+    """Structured outcome of a programmatic purchase; amounts are Money in dollars."""
+    OK = 'ok'
+    INSUFFICIENT_FUNDS = 'insufficient_funds'
+    UNAVAILABLE = 'unavailable'
+    NO_CHANGE = 'no_change'  # The cassette cannot pay out the exact change
+
+    __slots__ = ('status', 'item', 'price', 'balance', 'change', 'pieces', 'remainder')
+
+    def __init__(self, status, item, price=Money(0), balance=Money(0), change=Money(0), pieces=None,
+                 remainder=Money(0)):
+        self.status = status
+        self.item = item
+        self.price = price
+        self.balance = balance
+        self.change = change
+        self.pieces = pieces  # {denomination: count} paid out of the cassette, if the machine has one
+        self.remainder = remainder  # Change below the cassette's smallest denomination, not paid out
+
+    @property
+    def success(self):
+        return self.status == PurchaseResult.OK
+
+    def __repr__(self):
+        return (f"PurchaseResult(status={self.status!r}, item={self.item!r}, price={self.price!r}, "
+                f"balance={self.balance!r}, change={self.change!r})")
+
+
 class Machine:
-    inventory = {
-        'sprite': {'quantity': 10, 'price_dollars': 3.5},
-        'coca-cola': {'quantity': 15, 'price_dollars': 5.0},
-        'doritos': {'quantity': 1, 'price_dollars': 2.5},
-        'snickers': {'quantity': 12, 'price_dollars': 2.0}
-    }
-    exchange_rate = 0.29  # 1 shekel = 0.29 dollars
-
-    @staticmethod
-    def display_items():
+    """A vending machine.
+
+    The class itself is the default machine used by the interactive program, so Machine.vend(...)
+    works on the class attributes below.  Machine() creates an independent machine with its own
+    inventory, locks, catalog and listeners; the same methods then act on that instance.
+    """
+    inventory = load_inventory()  # Defaults live in default_inventory.json
+    rates = load_rates()  # Dollar value of every accepted currency; defaults live in default_rates.json
+    locks = StripedLock()
+    catalog = Catalog()
+    listeners = [catalog]  # Callables receiving (event, details) for every stock or money movement
+    cassette = None  # CashCassette paying out change; None means change is not tracked
+    pricing = None  # PricingEngine for dynamic prices; None means the inventory price is charged
+    holds = None  # HoldBook of units set aside for customers still paying, set below once the class exists
+
+    def __init__(self, inventory=None, stripes=64, cassette=None, pricing=None):
+        self.inventory = load_inventory() if inventory is None else inventory
+        self.locks = StripedLock(stripes)
+        self.catalog = Catalog()
+        self.listeners = [self.catalog]
+        self.cassette = cassette
+        self.pricing = pricing
+        self.holds = HoldBook(self)
+
+    @hybridmethod
+    def display_items(self, page=0, page_size=None, sort='slot', descending=False, currency='dollars', rates=None):
+        """Print the in-stock items, priced in `currency` at `rates` (default: the machine's current rates)."""
+        rates = self.rates if rates is None else rates
+        self.holds.expire()  # List units whose customers walked away
         print("------------------------------------------------------")
         print("Available Items:")
-        for item, details in Machine.inventory.items():
-            if details['quantity'] > 0:  # Check if the item exists or not
-                # Modify item name for correct capitalization
-                if '-' in item:
-                    modified_item = item.replace('-', ' ').title().replace(' ', '-')
-                else:
-                    modified_item = ' '.join(word.capitalize() for word in item.split())
-                print(f"- {modified_item}: ${details['price_dollars']:.2f}")
+        dynamic = version = None
+        if self.pricing is not None:
+            dynamic, version = functools.partial(self.pricing.price, self), self.pricing.version(self)
+        for item, name, price in self.catalog.page(self.inventory, page, page_size, sort, descending, dynamic, version):
+            if currency == 'dollars':
+                print(f"- {name}: ${price:.2f}")
+            else:
+                print(f"- {name}: {rates.convert(price, currency)} {currency.capitalize()}")
+        if page_size is not None:
+            pages = max(1, -(-self.catalog.count(self.inventory) // page_size))
+            print(f"Page {page + 1} of {pages}")
         print("------------------------------------------------------")
 
-    @staticmethod
-    def get_item_price(item_name):
-        return Machine.inventory.get(item_name, {}).get('price_dollars', 0)
-
-    @staticmethod
-    def confirm_purchase(balance, selected_item):
-        item_price = Machine.get_item_price(selected_item)
-        if item_price > 0:
-            while True:
-                if balance >= item_price:
-                    Machine.inventory[selected_item.lower()]['quantity'] -= 1  # Access inventory in lowercase
-                    change = balance - item_price
-                    print(f"-->Purchase confirmed! You bought {selected_item.capitalize()} "
-                          f"for ${item_price:.2f}. Your change is ${change:.2f}.")
-                    return True
-                else:
-                    choose = input(f"-->Insufficient funds. Do you want to insert more cash, select another item, "
-                                   f"or cancel the transaction? (Type 'cash'/'another'/ 'cancel'): ").replace(" ", "").lower()
-                    if choose == "cancel":
-                        return "cancel"
-                    elif choose == "another":
-                        return "another"
-                    elif choose == "cash":
-                        return "cash"
-                    else:
-                        print("-->Invalid choice. Please enter 'cash', 'another', or 'cancel'.")
-        else:
+    @hybridmethod
+    def get_item_price(self, item_name):
+        if self.pricing is not None:
+            return self.pricing.price(self, item_name)
+        return Money.of(self.inventory.get(item_name, {}).get('price_dollars', 0))
+
+    @hybridmethod
+    def lookup(self, text):
+        """Resolve customer input (any case/spacing, an alias or a slot code like 'A3') to an item name."""
+        return self.catalog.resolve(self.inventory, text)
+
+    @hybridmethod
+    def suggest(self, text, limit=3):
+        return [item for item in self.catalog.suggest(self.inventory, text, limit) if self.is_available(item)]
+
+    @hybridmethod
+    def is_available(self, item_name):
+        """True if a unit is on the shelf, counting held units whose hold has expired.
+
+        Expiring puts units back through Machine.release, so callers holding item locks use _in_stock.
+        """
+        return self._in_stock(item_name) or (self.holds.expire() > 0 and self._in_stock(item_name))
+
+    @hybridmethod
+    def _in_stock(self, item_name):
+        details = self.inventory.get(item_name)
+        return details is not None and details['quantity'] > 0
+
+    @hybridmethod
+    def to_dollars(self, amount, currency):
+        return self.rates.to_money(amount, currency)
+
+    @hybridmethod
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    @hybridmethod
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    @hybridmethod
+    def notify(self, event, **details):
+        """Tell every listener about `event` ('reserve', 'release', 'vend', 'refund', 'refill' or 'reset')."""
+        for listener in self.listeners:
+            listener(event, details)
+
+    @hybridmethod
+    def reserve(self, item_name, quantity=1):
+        """Atomically take `quantity` units off the shelf; returns a Reservation, or None if out of stock."""
+        with self.locks.for_item(item_name):
+            details = self.inventory.get(item_name)
+            if details is None or details['quantity'] < quantity:
+                return None
+            details['quantity'] -= quantity
+        self.notify('reserve', item=item_name, quantity=quantity)
+        return Reservation(item_name, quantity)
+
+    @hybridmethod
+    def commit(self, reservation):
+        """Turn a held reservation into a sale; returns False if it was already released."""
+        with self.locks.for_item(reservation.item):
+            if reservation.state != Reservation.HELD:
+                return False
+            reservation.state = Reservation.COMMITTED
+            return True
+
+    @hybridmethod
+    def release(self, reservation):
+        """Put the units of a held reservation back on the shelf; returns False if it was not held."""
+        with self.locks.for_item(reservation.item):
+            if reservation.state != Reservation.HELD:
+                return False
+            reservation.state = Reservation.RELEASED
+            details = self.inventory.get(reservation.item)
+            if details is not None:
+                details['quantity'] += reservation.quantity
+        self.notify('release', item=reservation.item, quantity=reservation.quantity)
+        return True
+
+    @hybridmethod
+    def hold(self, item_name, quantity=1):
+        """Set `quantity` units aside for a customer who is still paying; returns a Reservation, or None.
+
+        The units go back on the shelf when the hold expires (see Holds.py) unless they are sold first.
+        """
+        return self.holds.hold(item_name, quantity)
+
+    @hybridmethod
+    def vend(self, selected_item, balance, currency='dollars', reservation=None, paid=None):
+        """Sell one unit of `selected_item` against `balance` dollars without any console I/O.
+
+        `currency` is what the customer paid in; it is only passed on to listeners for sales reporting.
+        `reservation` is a hold from Machine.hold to sell from; it is kept if the balance falls short and
+        used up otherwise.  An expired hold is not an error: the sale then takes any unit still on the shelf.
+        `paid` is the part of the balance inserted as dollar cash, which the cassette keeps to pay change from.
+        """
+        item_name = selected_item.lower()
+        balance = Money.of(balance)
+        item_price = self.get_item_price(item_name)
+        held = reservation is not None and reservation.item == item_name and reservation in self.holds
+        if item_price <= 0 or not (held or self.is_available(item_name)):
+            return PurchaseResult(PurchaseResult.UNAVAILABLE, item_name, item_price, balance)
+        if balance < item_price:
+            return PurchaseResult(PurchaseResult.INSUFFICIENT_FUNDS, item_name, item_price, balance)
+        if not (held and self.holds.take(reservation)):
+            reservation = self.reserve(item_name)
+        if reservation is None:  # Another session took the last unit in the meantime
+            return PurchaseResult(PurchaseResult.UNAVAILABLE, item_name, item_price, balance)
+        change, pieces, remainder = balance - item_price, None, Money(0)
+        if self.cassette is not None:
+            # Foreign balances convert to arbitrary cents; pay what the coins allow and report the rest.
+            # Dollars were inserted as coins and bills, so change below the smallest coin is refused.
+            change, remainder = self.cassette.round_down(change)
+            pieces = None if remainder and currency == 'dollars' else self.cassette.dispense(change, paid)
+            if pieces is None:  # Refuse the sale rather than short-change the customer
+                self.release(reservation)
+                return PurchaseResult(PurchaseResult.NO_CHANGE, item_name, item_price, balance)
+        self.commit(reservation)
+        self.notify('vend', item=item_name, quantity=reservation.quantity, price=item_price, currency=currency)
+        return PurchaseResult(PurchaseResult.OK, item_name, item_price, balance, change, pieces, remainder)
+
+    @hybridmethod
+    def purchase(self, item_name, amount, currency='dollars'):
+        """Programmatic entry point: pay `amount` in `currency` for one `item_name`."""
+        balance = self.to_dollars(amount, currency)
+        return self.vend(item_name, balance, currency, paid=balance if currency == 'dollars' else None)
+
+    @hybridmethod
+    def confirm_purchase(self, balance, selected_item, currency='dollars', reservation=None, paid=None):
+        result = self.vend(selected_item, balance, currency, reservation, paid)
+        if result.status == PurchaseResult.OK:
+            print(f"-->Purchase confirmed! You bought {selected_item.capitalize()} "
+                  f"for ${result.price:.2f}. Your change is ${result.change:.2f}.")
+            if result.remainder:
+                print(f"-->${result.remainder:.2f} is below the smallest coin and could not be paid out.")
+            return True
+        if result.status == PurchaseResult.UNAVAILABLE:
             return "-->Selected item not available."
+        if result.status == PurchaseResult.NO_CHANGE:
+            print(f"-->Sorry, the machine cannot give ${balance - result.price:.2f} in change right now.")
+            return 'cancel'
+        while True:
+            choose = input(f"-->Insufficient funds. Do you want to insert more cash, select another item, "
+                           f"or cancel the transaction? (Type 'cash'/'another'/ 'cancel'): ").replace(" ", "").lower()
+            if choose in ("cancel", "another", "cash"):
+                return choose
+            print("-->Invalid choice. Please enter 'cash', 'another', or 'cancel'.")
+
+
+Administrator.machine = Machine
+Machine.holds = HoldBook(Machine)
 
 
 class Client:
-    def __init__(self):
-        self.balance = 0
+    def __init__(self, machine=None):
+        self.machine = Machine if machine is None else machine
+        self.balance = Money(0)
+        self.paid = Money(0)  # Part of the balance inserted as dollar cash (see Machine.vend)
         self.currency = ""
         self.selected_item = ""
+        self.rates = None  # RateTable pinned for the current transaction
+        self.hold = None  # Reservation keeping the selected unit off the shelf until checkout
+
+    def pinned_rates(self):
+        """The rates this transaction converts at: the machine's rates when it began, even if reloaded since."""
+        if self.rates is None:
+            self.rates = self.machine.rates
+        return self.rates
+
+    def deposit(self, amount, currency=None):
+        """Credit `amount` (in `currency`, default the selected one) and return the new dollar balance."""
+        currency = currency or self.currency
+        credit = self.pinned_rates().to_money(amount, currency)
+        if credit <= 0:
+            raise ValueError("Inserted amount must be positive")
+        self.balance = Money.of(self.balance) + credit
+        if currency == 'dollars':
+            self.paid += credit
+        if self.hold is not None:
+            self.machine.holds.renew(self.hold)  # Still paying, so keep the unit a while longer
+        return self.balance
+
+    def choose_item(self, item_name):
+        """Select an item and hold one unit of it; any earlier hold goes back on the shelf."""
+        item_name = self.machine.lookup(item_name)
+        if item_name is None:
+            return False
+        if self.hold is not None and self.hold.item == item_name and self.machine.holds.renew(self.hold):
+            self.selected_item = item_name
+            return True
+        self.release_hold()
+        self.hold = self.machine.hold(item_name)
+        if self.hold is None:
+            return False
+        self.selected_item = item_name
+        return True
+
+    def release_hold(self):
+        if self.hold is not None:
+            self.machine.holds.release(self.hold)  # A no-op if it was sold or has expired
+            self.hold = None
+
+    def checkout(self):
+        """Buy the selected item with the current balance; the balance is spent on success."""
+        result = self.machine.vend(self.selected_item, self.balance, self.currency or 'dollars', self.hold, self.paid)
+        if result.success:
+            self.balance = self.paid = Money(0)
+            self.rates = None
+        if result.status != PurchaseResult.INSUFFICIENT_FUNDS:
+            self.hold = None  # Used up by the sale, or already back on the shelf
+        return result
+
+    def refund(self):
+        refunded, self.balance, self.paid = Money.of(self.balance), Money(0), Money(0)
+        self.rates = None
+        self.release_hold()
+        if refunded:
+            self.machine.notify('refund', amount=refunded)
+        return refunded
 
     def select_currency(self):
-        self.currency = input("Please choose the currency you will pay in (dollars/shekels), or type exit: ").replace(" ", "").lower()
-        while self.currency not in ['dollars', 'shekels']:
+        rates = self.pinned_rates() if self.balance else self.machine.rates
+        options = '/'.join(rates)
+        self.currency = input(f"Please choose the currency you will pay in ({options}), or type exit: ").replace(" ", "").lower()
+        while self.currency not in rates:
             if self.currency == 'exit':
                 return False
-            self.currency = input("-->Invalid input. Please select currency (dollars/shekels): ").replace(" ", "").lower()
+            self.currency = input(f"-->Invalid input. Please select currency ({options}): ").replace(" ", "").lower()
         return True
 
     def insert_cash(self, flag):
+        # flag is False for the first payment of a session and True when topping up
+        if not flag:
+            self.rates = None  # A new transaction converts at the current rates
         while True:
             try:
-                if self.currency == 'dollars':
-                    while True:
-                        if not flag:
-                            self.balance = float(input("Please insert payment amount in dollars: ").replace(" ", ""))
-                            if self.balance == 0:
-                                print("-->Inserted amount cannot be zero. Please enter a valid amount.")
-                            else:
-                                print(f"-->Inserted ${self.balance:.2f} Dollars")
-                                return True  # Return True on successful cash insertion
-                        elif flag:
-                            extra_balance = float(input("Please insert payment amount in dollars: ").replace(" ", ""))
-                            self.balance += extra_balance
-                            print(f"-->Your balance now is ${self.balance:.2f} Dollars")
-                            return True  # Return True on successful cash insertion
-
-                        if not self.balance:
-                            raise ValueError("Empty input")
-                        else:
-                            break  # Break out of the loop if the amount is not zero
-
-                elif self.currency == 'shekels':
-                    while True:
-                        shekel_amount = float(input("Please insert payment amount in shekels: ").replace(" ", ""))
-                        if not shekel_amount:
-                            raise ValueError("Empty input")
-                        shekel_amount = float(shekel_amount)
-                        if shekel_amount == 0:
-                            print("-->Inserted amount cannot be zero. Please enter a valid amount.")
-                        else:
-                            if not flag:
-                                self.balance = shekel_amount * Machine.exchange_rate
-                                print(f"-->Inserted ${self.balance:.2f} Dollars")
-                                return True  # Return True on successful cash insertion
-                            elif flag:
-                                extra_balance = shekel_amount * Machine.exchange_rate
-                                self.balance += extra_balance
-                                print(f"-->Your balance now is ${self.balance:.2f} Dollars")
-                                return True  # Return True on successful cash insertion
-                break
-
+                credit = self.pinned_rates().to_money(input(f"Please insert payment amount in {self.currency}: ").replace(" ", ""),
+                                                      self.currency)
             except ValueError:
                 print("-->Invalid input. Please enter a valid amount.")
                 continue
+            if credit == 0:
+                print("-->Inserted amount cannot be zero. Please enter a valid amount.")
+                continue
+            if credit < 0:
+                print("-->Invalid input. Please enter a valid amount.")
+                continue
+            self.balance = (Money.of(self.balance) if flag else Money(0)) + credit
+            self.paid = (self.paid if flag else Money(0)) + (credit if self.currency == 'dollars' else Money(0))
+            if flag and self.hold is not None:
+                self.machine.holds.renew(self.hold)  # Still paying, so keep the unit a while longer
+            if not flag:
+                print(f"-->Inserted ${self.balance:.2f} Dollars")
+            else:
+                print(f"-->Your balance now is ${self.balance:.2f} Dollars")
+            return True  # Return True on successful cash insertion
 
     def cancel_request(self):
-        print(f"-->Transaction canceled. Refunded amount: ${self.balance:.2f}")
-        self.balance = 0  # Reset the balance to provide a refund
+        print(f"-->Transaction canceled. Refunded amount: ${self.refund():.2f}")
 
     def select_item(self):
         while True:
@@ -168,15 +536,18 @@ class Client:
             if selected_item == 'cancel':
                 self.cancel_request()
                 return False
-            elif selected_item in [item.lower() for item in Machine.inventory.keys()] and Machine.inventory[selected_item]['quantity'] > 0:
-                self.selected_item = selected_item
+            elif self.choose_item(selected_item):
                 print(f"Selected item: {self.selected_item.capitalize()}")
                 return True
             else:
                 print("-->Invalid item. Please select from the displayed inventory or type 'cancel' to abort.")
+                suggestions = self.machine.suggest(selected_item)
+                if suggestions:
+                    print(f"-->Did you mean: {', '.join(item.capitalize() for item in suggestions)}?")
 
-def run_administrator_menu():
-    if not Administrator.authenticate():
+def run_administrator_menu(machine=Machine):
+    administrator = Administrator(machine)
+    if not administrator.authenticate():
         print("Authentication failed. Returning to the main menu.")
         return
 
@@ -186,43 +557,51 @@ def run_administrator_menu():
         print("1. Reset Machine")
         print("2. Refill Stock")
         print("3. Exit")
+        print("4. Import Planogram")
         print("------------------------------------------------------")
-        choice = input("Enter your choice (1/2/3): ")
+        choice = input("Enter your choice (1/2/3/4): ")
         if choice == '1':
-            Administrator.reset_machine()
+            administrator.reset_machine()
         elif choice == '2':
-            Administrator.refill_stock()
+            administrator.refill_stock()
         elif choice == '3':
             print("Exiting the administrator menu. Returning to the main menu.")
             print("------------------------------------------------------")
             break
+        elif choice == '4':
+            administrator.import_planogram()
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter 1, 2, 3, or 4.")
 
 
-def run_customer():
-    client = Client()
+def run_customer(machine=Machine):
+    client = Client(machine)
     while True:
-        Machine().display_items()
+        machine.display_items()
         if client.select_currency() is not False:
             client.insert_cash(False)
+            if client.currency != 'dollars':
+                machine.display_items(currency=client.currency, rates=client.pinned_rates())
         else:
             print("------------------------------------------------------")
             break
         while client.select_item():
-            result = Machine().confirm_purchase(client.balance, client.selected_item)
+            result = machine.confirm_purchase(client.balance, client.selected_item, client.currency, client.hold,
+                                              client.paid)
             if result == 'cancel':
                 client.cancel_request()
                 break
             elif result == 'another':
                 continue
             elif result == 'cash':
-                client.select_currency()
+                if client.select_currency() is False:  # Typed exit instead of a currency
+                    client.cancel_request()
+                    break
                 client.insert_cash(True)
                 continue
             break
 
-def main():
+def main(machine=Machine):
     print("                                    ------------------------------------------------------")
     print("                                    -         Welcome to the Vending Machine!            -")
     print("                                    ------------------------------------------------------")
@@ -234,9 +613,9 @@ def main():
         role = input("Choose your role (1/2/3): ")
 
         if role == '1':
-            run_customer()
+            run_customer(machine)
         elif role == '2':
-            run_administrator_menu()
+            run_administrator_menu(machine)
         elif role == '3':
             print("Exiting the program. Goodbye!")
             break
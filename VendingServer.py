@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+
+import ExchangeRates
+import Metrics
+import Snapshot
+from Journal import SNAPSHOT_EVERY, open_journal, close_journal
+from Money import Money
+from VendingMachine import Machine, Client, Administrator, PurchaseResult
+
+# Line-delimited JSON protocol: every request is one JSON object per line with an "op" field,
+# every response is one JSON object per line with an "ok" field. Money amounts travel as decimal
+# strings in dollars ("3.50") so no precision is lost on the wire.
+#
+#   {"op": "catalog"}
+#   {"op": "currency", "currency": "dollars"}
+#   {"op": "insert", "amount": 5}
+#   {"op": "select", "item": "sprite"}               (holds one unit until buy, cancel, quit or --hold-seconds)
+#   {"op": "buy"}
+#   {"op": "purchase", "item": "sprite", "amount": 5, "currency": "dollars"}
+#   {"op": "cancel"}
+#   {"op": "login", "password": "..."}
+#   {"op": "reset"}                                   (administrator only)
+#   {"op": "refill", "item": "water", "quantity": 5, "price": 1.0}   (administrator only)
+#   {"op": "quit"}
+
+
+class Session:
+    """Protocol state of one connection; independent of the transport so it can be driven directly."""
+
+    def __init__(self, machine=Machine):
+        self.machine = machine
+        self.client = Client(machine)
+        self.client.currency = 'dollars'
+        self.administrator = Administrator(machine)
+        self.is_admin = False
+        self.peer = None  # Remote address, set by the transport
+
+    def handle(self, request):
+        handler = getattr(self, f"op_{request.get('op')}", None)
+        if handler is None:
+            return error(f"Unknown op: {request.get('op')!r}")
+        try:
+            return handler(request)
+        except (KeyError, TypeError, ValueError) as e:
+            return error(str(e))
+
+    def op_catalog(self, request):
+        currency = self.client.currency
+        rates = self.client.pinned_rates() if self.client.balance else self.machine.rates
+        items = []
+        for name, details in list(self.machine.inventory.items()):
+            if details['quantity'] > 0:
+                price = self.machine.get_item_price(name)
+                item = {'name': name, 'price': str(price), 'quantity': details['quantity']}
+                if currency != 'dollars' and currency in rates:
+                    item['local_price'] = str(rates.convert(price, currency))
+                items.append(item)
+        return {'ok': True, 'items': items}
+
+    def op_currency(self, request):
+        if request['currency'] not in self.machine.rates:
+            return error(f"Unsupported currency: {request['currency']}")
+        self.client.currency = request['currency']
+        return {'ok': True, 'currency': self.client.currency}
+
+    def op_insert(self, request):
+        return {'ok': True, 'balance': str(self.client.deposit(request['amount']))}
+
+    def op_select(self, request):
+        if not self.client.choose_item(text_field(request, 'item')):
+            return error(f"Item not available: {request['item']}")
+        return {'ok': True, 'item': self.client.selected_item}
+
+    def op_buy(self, request):
+        return purchase_response(self.client.checkout())
+
+    def op_purchase(self, request):
+        currency = request.get('currency', self.client.currency)
+        return purchase_response(self.machine.purchase(text_field(request, 'item'), request['amount'], currency))
+
+    def op_cancel(self, request):
+        return {'ok': True, 'refunded': str(self.client.refund())}
+
+    def op_login(self, request):
+        self.is_admin = request.get('password') == Administrator.PASSWORD
+        return {'ok': self.is_admin} if self.is_admin else error("Authentication failed")
+
+    def op_reset(self, request):
+        if not self.is_admin:
+            return error("Administrator login required")
+        self.administrator.reset_inventory()
+        return {'ok': True}
+
+    def op_refill(self, request):
+        if not self.is_admin:
+            return error("Administrator login required")
+        price = request.get('price')
+        added = self.administrator.restock(text_field(request, 'item'), whole_field(request, 'quantity'), price)
+        return {'ok': True, 'new_item': added}
+
+    def op_quit(self, request):
+        return {'ok': True, 'refunded': str(self.client.refund())}
+
+
+def error(message):
+    return {'ok': False, 'error': message}
+
+
+def text_field(request, key):
+    """request[key], which must be a string; a KeyError or ValueError otherwise, reported by Session.handle."""
+    value = request[key]
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be a string, got {value!r}")
+    return value
+
+
+def whole_field(request, key):
+    """request[key] as an int, from a JSON integer or a decimal string; floats and booleans are rejected."""
+    value = request[key]
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"{key} must be a whole number, got {value!r}")
+
+
+def purchase_response(result):
+    response = {'ok': result.success, 'status': result.status, 'item': result.item,
+                'price': str(result.price), 'change': str(result.change)}
+    if result.status == PurchaseResult.INSUFFICIENT_FUNDS:
+        response['balance'] = str(result.balance)
+    if result.remainder:
+        response['remainder'] = str(result.remainder)
+    return response
+
+
+OPEN_SESSIONS = set()  # Sessions with a live connection, so snapshots can record unspent balances
+DURABLE = False  # Set while a journal is open: requests then wait for their fsync on worker threads
+
+
+def open_balances():
+    """{peer address: Money} inserted by connected customers but not yet spent or refunded."""
+    return {session.peer: Money.of(session.client.balance) for session in list(OPEN_SESSIONS) if session.client.balance}
+
+
+async def handle_connection(reader, writer):
+    session = Session()
+    session.peer = str(writer.get_extra_info('peername') or writer.get_extra_info('sockname'))
+    OPEN_SESSIONS.add(session)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                request = None
+            if not isinstance(request, dict):
+                response = error("Expected one JSON object per line")
+            elif DURABLE:
+                # Off the event loop, so other sessions keep running and share this one's fsync
+                response = await asyncio.to_thread(session.handle, request)
+            else:
+                response = session.handle(request)
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+            if response.get('ok') and request.get('op') == 'quit':
+                break
+    except ConnectionError as e:
+        logging.error(f"Session dropped: {str(e)}")
+    finally:
+        session.client.release_hold()
+        OPEN_SESSIONS.discard(session)
+        writer.close()
+
+
+async def start_server(host='127.0.0.1', port=8765, path=None):
+    """Start serving on a TCP port, or on a Unix socket when `path` is given."""
+    if path:
+        return await asyncio.start_unix_server(handle_connection, path=path)
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+async def serve_forever(host, port, path):
+    server = await start_server(host, port, path)
+    print(f"Vending server listening on {path or f'{host}:{port}'}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    global DURABLE
+    parser = argparse.ArgumentParser(description="Serve vending sessions over line-delimited JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', dest='path', help="Listen on this Unix socket instead of TCP")
+    parser.add_argument('--journal', help="Restore stock from and record every event to this journal file")
+    parser.add_argument('--journal-batch', type=int, default=64, help="Most events a commit waits for")
+    parser.add_argument('--journal-wait', type=float, default=0.0,
+                        help="Seconds a commit may wait for --journal-batch events before its fsync")
+    parser.add_argument('--journal-snapshot-every', type=int, default=SNAPSHOT_EVERY,
+                        help="Snapshot the journal and start a new segment after this many events")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics at http://host:PORT/metrics")
+    parser.add_argument('--metrics-file', help="Rewrite Prometheus metrics to this file every 15 seconds")
+    parser.add_argument('--profile', metavar='PATH', help="Run under cProfile and dump pstats data to PATH on exit")
+    parser.add_argument('--snapshot', help="Start from this machine snapshot if it exists and keep it up to date")
+    parser.add_argument('--snapshot-interval', type=float, default=60.0, help="Seconds between snapshots")
+    parser.add_argument('--rates', help="Exchange rates file to load and reload whenever it changes")
+    parser.add_argument('--hold-seconds', type=float, default=Machine.holds.ttl,
+                        help="How long a selected item stays reserved for a customer who has not paid yet")
+    args = parser.parse_args()
+    Machine.holds.ttl = args.hold_seconds
+    Machine.holds.start()
+    if args.snapshot and os.path.exists(args.snapshot):
+        with Snapshot.SnapshotFile(args.snapshot) as snapshot:
+            snapshot.restore(0, Machine)
+    # After the restore, so the rates file wins over the rates saved in the snapshot
+    watcher = ExchangeRates.RateWatcher(Machine, args.rates).start() if args.rates else None
+    journal = None
+    if args.journal:  # Journal replay wins
+        journal = open_journal(args.journal, args.journal_batch, args.journal_wait,
+                               snapshot_every=args.journal_snapshot_every)
+        DURABLE = True
+    if args.snapshot:
+        Snapshot.snapshot_every(args.snapshot, {0: Machine}, args.snapshot_interval, lambda: {0: open_balances()})
+    instrumentation = None
+    if args.metrics_port is not None or args.metrics_file:
+        instrumentation = Metrics.Instrumentation().install()
+        if args.metrics_port is not None:
+            instrumentation.registry.serve(args.host, args.metrics_port)
+        if args.metrics_file:
+            instrumentation.registry.write_every(args.metrics_file)
+    try:
+        with Metrics.profiled(args.profile) if args.profile else contextlib.nullcontext():
+            asyncio.run(serve_forever(args.host, args.port, args.path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if instrumentation is not None:
+            if args.metrics_file:
+                instrumentation.registry.write(args.metrics_file)
+            instrumentation.uninstall()
+        if journal is not None:
+            close_journal(journal)
+        if args.snapshot:
+            Snapshot.save(args.snapshot, {0: Machine}, {0: open_balances()})
+        if watcher is not None:
+            watcher.stop()
+        Machine.holds.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Time the bounded change-making solver per transaction.
+
+Run from the repository root:  python -m benchmarks.bench_change [transactions]
+
+Change amounts are random multiples of 5 cents up to $20 and, separately, up to the $100 change
+limit, solved against a well stocked cassette, a nearly empty one where greedy choices often fail,
+and a lopsided one (only singles and dimes) where most amounts are infeasible or far from the
+unbounded optimum.  The 99th percentile of single solves is reported too, since dispense() holds
+the cassette lock while it runs (the maximum is dominated by scheduler noise); infeasible amounts
+must be rejected in under 5 ms.
+"""
+import random
+import sys
+import time
+
+from CashCassette import CashCassette
+from Money import Money
+
+STOCKED = {'20.00': 20, '10.00': 20, '5.00': 40, '1.00': 100, '0.25': 200, '0.10': 200, '0.05': 200}
+SPARSE = {'20.00': 0, '10.00': 1, '5.00': 1, '1.00': 3, '0.25': 1, '0.10': 7, '0.05': 1}
+PARTIAL = {'20.00': 1, '10.00': 0, '5.00': 2, '1.00': 3, '0.25': 1, '0.10': 4, '0.05': 0}
+LOPSIDED = {'20.00': 0, '10.00': 0, '5.00': 0, '1.00': 100, '0.25': 0, '0.10': 1000, '0.05': 0}
+
+
+def time_solves(cassette, amounts):
+    solve = cassette.solve
+    solved, times = 0, []
+    started = time.perf_counter()
+    for amount in amounts:
+        began = time.perf_counter()
+        solved += solve(amount) is not None
+        times.append(time.perf_counter() - began)
+    times.sort()
+    return time.perf_counter() - started, solved, times[len(times) * 99 // 100]
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    generator = random.Random(0)
+    low = [Money(5 * generator.randrange(1, 401)) for _ in range(transactions)]
+    high = [Money(5 * generator.randrange(1, 2001)) for _ in range(transactions)]
+    started = time.perf_counter()
+    CashCassette(STOCKED)
+    print(f"Table build: {(time.perf_counter() - started) * 1e3:.2f} ms")
+    for name, counts in (('stocked', STOCKED), ('sparse', SPARSE), ('partial', PARTIAL), ('lopsided', LOPSIDED)):
+        for label, amounts in (('<= $20', low), ('<= $100', high)):
+            elapsed, solved, p99 = time_solves(CashCassette(counts), amounts)
+            print(f"{name:8} {label:8}: {elapsed / transactions * 1e6:6.2f} us/solve, p99 {p99 * 1e6:6.1f} us, "
+                  f"{solved}/{transactions} payable")
+    for name, counts, amount in (('lopsided', LOPSIDED, '99.95'), ('partial', PARTIAL, '54.15')):
+        elapsed, solved, p99 = time_solves(CashCassette(counts), [Money.of(amount)] * 1000)
+        print(f"{name:8} {amount:>8}: {elapsed / 1000 * 1e6:6.2f} us/solve ({'payable' if solved else 'infeasible'})")
+        assert p99 < 0.005, f"Rejecting {amount} took {p99 * 1e3:.1f} ms"  # The reach bitset answers without searching
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare memory and lookup cost of the dict-of-dicts inventory with ColumnarInventory.
+
+Run from the repository root:  python -m benchmarks.bench_columnar [skus]
+"""
+import random
+import sys
+import timeit
+import tracemalloc
+
+from ColumnarInventory import ColumnarInventory
+from Money import Money
+
+
+def build_dict(skus):
+    return {f'sku-{i:07d}': {'quantity': i % 50, 'price_dollars': Money(100 + i % 900)} for i in range(skus)}
+
+
+def measure(build):
+    tracemalloc.start()
+    inventory = build()
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return inventory, python_bytes
+
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    names = [f'sku-{i:07d}' for i in range(skus)]
+    dict_inventory, dict_bytes = measure(lambda: build_dict(skus))
+    source = build_dict(skus)
+    columnar, columnar_python_bytes = measure(lambda: ColumnarInventory.from_mapping(source))
+    mapped_bytes = ColumnarInventory.layout(columnar.capacity, columnar.name_width)[1]
+
+    probes = random.Random(7).choices(names, k=100000)
+    dict_time = min(timeit.repeat(lambda: [dict_inventory.get(n, {}).get('price_dollars', 0) for n in probes],
+                                  number=1, repeat=3))
+    columnar_time = min(timeit.repeat(lambda: [columnar.get(n, {}).get('price_dollars', 0) for n in probes],
+                                      number=1, repeat=3))
+
+    print(f"{skus} SKUs")
+    print(f"dict     : {dict_bytes / skus:7.1f} bytes/SKU on the Python heap")
+    print(f"columnar : {mapped_bytes / skus:7.1f} bytes/SKU mapped, "
+          f"{columnar_python_bytes / skus:.1f} bytes/SKU on the Python heap")
+    print(f"price lookup: dict {dict_time / len(probes) * 1e9:.0f} ns, "
+          f"columnar {columnar_time / len(probes) * 1e9:.0f} ns")
+    columnar.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Time placing, releasing and expiring holds as the number of concurrent holds grows.
+
+Run from the repository root:  python -m benchmarks.bench_holds [operations]
+
+For each size, the book first holds that many units (one per open session, with staggered
+deadlines).  It then times `operations` of each of: a new hold plus its release (a customer
+selecting then cancelling), a renewal, and the expiry of holds whose deadlines have passed.  With a
+heap the per-operation cost should grow with log n, not with n.
+"""
+import math
+import sys
+import time
+
+from Money import Money
+from VendingMachine import Machine
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fill(sessions):
+    machine = Machine({'sprite': {'quantity': 10 * sessions, 'price_dollars': Money(350)}}, stripes=1)
+    clock = machine.holds.clock = Clock()
+    holds = []
+    for session in range(sessions):
+        clock.now = session / sessions  # Deadlines spread over one second
+        holds.append(machine.hold('sprite'))
+    clock.now = 0.0
+    return machine, clock, holds
+
+
+def time_ops(operations, function):
+    started = time.perf_counter()
+    for _ in range(operations):
+        function()
+    return (time.perf_counter() - started) / operations * 1e6
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'holds':>9} {'log2 n':>6} {'hold+release':>13} {'renew':>8} {'expire':>8}   (us per operation)")
+    for sessions in SIZES:
+        machine, clock, holds = fill(sessions)
+        book = machine.holds
+
+        def hold_and_release():
+            book.release(machine.hold('sprite'))
+
+        renewals = iter(holds * (operations // sessions + 1))
+        renew = time_ops(operations, lambda: book.renew(next(renewals)))
+        cycle = time_ops(operations, hold_and_release)
+
+        # Expire in slices as time moves on, `operations` holds in total
+        machine, clock, holds = fill(sessions)
+        book = machine.holds
+        clock.now = book.ttl
+        step = min(operations, sessions) / sessions / 100
+        started = time.perf_counter()
+        expired = 0
+        while expired < min(operations, sessions):
+            clock.now += step
+            expired += book.expire()
+        expire = (time.perf_counter() - started) / expired * 1e6
+        print(f"{sessions:9,} {math.log2(sessions):6.1f} {cycle:13.2f} {renew:8.2f} {expire:8.2f}")
+        assert machine.inventory['sprite']['quantity'] == 9 * sessions + expired
+
+
+if __name__ == "__main__":
+    main()
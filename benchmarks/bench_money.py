@@ -0,0 +1,52 @@
+"""Compare the float money path with the integer-cents Money path.
+
+Run from the repository root:  python -m benchmarks.bench_money [transactions]
+"""
+import sys
+import timeit
+
+from Money import Money, RateTable, DEFAULT_RATES
+
+PRICES = [3.5, 5.0, 2.5, 2.0]
+PAYMENTS = [('10', 'shekels'), ('5', 'dollars'), ('20', 'shekels'), ('4', 'euros')]
+FLOAT_RATES = {'dollars': 1.0, 'shekels': 0.29, 'euros': 1.08}
+
+
+def float_path(transactions):
+    total_change = 0.0
+    for i in range(transactions):
+        amount, currency = PAYMENTS[i % 4]
+        balance = float(amount) * FLOAT_RATES[currency]
+        price = PRICES[i % 4]
+        if balance >= price:
+            total_change += balance - price
+    return total_change
+
+
+def money_path(transactions, rates):
+    prices = [Money.of(price) for price in PRICES]
+    total_change = Money(0)
+    for i in range(transactions):
+        amount, currency = PAYMENTS[i % 4]
+        balance = rates.to_money(amount, currency)
+        price = prices[i % 4]
+        if balance >= price:
+            total_change += balance - price
+    return total_change
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rates = RateTable(DEFAULT_RATES)
+    float_time = min(timeit.repeat(lambda: float_path(transactions), number=1, repeat=3))
+    money_time = min(timeit.repeat(lambda: money_path(transactions, rates), number=1, repeat=3))
+    float_total = float_path(transactions)
+    money_total = money_path(transactions, rates)
+    print(f"{transactions} transactions")
+    print(f"float : {float_time:.3f}s ({transactions / float_time:,.0f} tx/s)  total change {float_total!r}")
+    print(f"Money : {money_time:.3f}s ({transactions / money_time:,.0f} tx/s)  total change {money_total!r}")
+    print(f"float drift vs exact: {float_total - float(money_total):+.10f} dollars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Startup time of a 10k-machine controller: binary snapshot versus JSON, eager versus lazy.
+
+Run from the repository root:  python -m benchmarks.bench_snapshot [machines]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import Snapshot
+from CashCassette import CashCassette
+from Fleet import Fleet
+from Journal import encode_inventory, decode_inventory
+from Planogram import load_inventory
+from VendingMachine import Machine
+
+
+def timed(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:46}: {(time.perf_counter() - started) * 1e3:9.1f} ms")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    template = load_inventory()
+    machines = {}
+    for machine_id in range(count):
+        machine = Machine({name: dict(details) for name, details in template.items()}, stripes=4,
+                          cassette=CashCassette({'1.00': 20, '0.25': 40, '0.10': 40, '0.05': 40}))
+        machine.inventory['sprite']['quantity'] = machine_id % 11
+        machines[machine_id] = machine
+    with tempfile.TemporaryDirectory() as directory:
+        binary_path = os.path.join(directory, 'fleet.snapshot')
+        json_path = os.path.join(directory, 'fleet.json')
+        print(f"{count} machines")
+        timed("write binary snapshot", lambda: Snapshot.save(binary_path, machines))
+        timed("write JSON (inventory only, no rates or cash)", lambda: _write_json(json_path, machines))
+        print(f"{'binary size / JSON size':46}: {os.path.getsize(binary_path):,} / {os.path.getsize(json_path):,} bytes")
+        timed("load JSON, every machine", lambda: _load_json(json_path))
+        snapshot = timed("open binary snapshot (index + rate tables)", lambda: Snapshot.SnapshotFile(binary_path))
+        timed("restore one machine", lambda: snapshot.restore(count // 2, Machine({}, stripes=4)))
+        timed("restore every machine", lambda: [snapshot.restore(machine_id, Machine({}, stripes=4))
+                                                for machine_id in snapshot.ids()])
+        snapshot.close()
+
+        def first_purchase():
+            with Fleet(count, snapshot_path=binary_path) as fleet:
+                fleet.purchase(count - 1, 'snickers', 5)
+        timed("fleet start + first purchase (lazy)", first_purchase)
+
+
+def _write_json(path, machines):
+    with open(path, 'w') as f:
+        json.dump({machine_id: encode_inventory(machine.inventory) for machine_id, machine in machines.items()}, f)
+
+
+def _load_json(path):
+    with open(path) as f:
+        return {int(machine_id): decode_inventory(data) for machine_id, data in json.load(f).items()}
+
+
+if __name__ == "__main__":
+    main()